@@ -0,0 +1,124 @@
+import argparse
+import os
+import random
+import sys
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import get_spellcheck, settings  # noqa: E402
+from keyword_classifier import KeywordClassifier  # noqa: E402
+from utils import OCR_WORD_LIMIT, classification_words, classify_board, count_words_in_ocr  # noqa: E402
+
+
+@lru_cache(maxsize=None)
+def reference_flags(word: str) -> Optional[List[bool]]:
+    candidates = get_spellcheck().candidates(word)
+    if candidates is None:
+        return None
+    return [not candidates.isdisjoint(words) for words in classification_words]
+
+
+def reference_classify_board(ocr: List[str]) -> Optional[str]:
+    to_return = [False, False, False, False, False, False, False]
+    if count_words_in_ocr(ocr) <= OCR_WORD_LIMIT:
+        for line in ocr:
+            for word in line.split():
+                flag_vec = reference_flags(word.lower())
+                if flag_vec is not None:
+                    to_return = [to_return[i] or flag for i, flag in enumerate(flag_vec)]
+    if to_return == [False, True, True]:
+        return settings.END_EVENT_NAME
+    if to_return == [True, False, True]:
+        return settings.START_EVENT_NAME
+    return None
+
+
+def random_edit(rng: random.Random, word: str, letters: str) -> str:
+    position = rng.randrange(len(word) + 1)
+    operation = rng.choice(["delete", "insert", "replace", "transpose"])
+    if operation == "delete" and position < len(word):
+        return word[:position] + word[position + 1:]
+    if operation == "replace" and position < len(word):
+        return word[:position] + rng.choice(letters) + word[position + 1:]
+    if operation == "transpose" and position < len(word) - 1:
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    return word[:position] + rng.choice(letters) + word[position:]
+
+
+def build_corpus(rng: random.Random, size: int) -> List[str]:
+    keywords = sorted(set().union(*classification_words))
+    dictionary = sorted(get_spellcheck().word_frequency.dictionary)
+    letters = "abcdefghijklmnopqrstuvwxyzáéíóúñ"
+    corpus: List[str] = list(keywords)
+    while len(corpus) < size:
+        kind = rng.random()
+        if kind < 0.4:
+            word = rng.choice(keywords)
+            for _ in range(rng.randint(1, 3)):
+                word = random_edit(rng, word, letters) or word
+            corpus.append(word)
+        elif kind < 0.8:
+            corpus.append(rng.choice(dictionary))
+        elif kind < 0.9:
+            corpus.append("".join(rng.choice(letters) for _ in range(rng.randint(1, 14))))
+        else:
+            corpus.append(rng.choice([str(rng.randint(0, 9999)), "-", "|", "3.5", "hd", "tv", "en", "vivo"]))
+    return corpus
+
+
+def build_boards(rng: random.Random, corpus: List[str], size: int) -> List[List[str]]:
+    boards = [["INICIO ESPACIO PUBLICITARIO"], ["FIN", "ESPACIO PUBLICITARIO"], ["Inicia espacio publicitarlo"]]
+    while len(boards) < size:
+        lines = [" ".join(rng.choice(corpus) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 4))]
+        boards.append(lines)
+    return boards
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Keyword classifier regression + speed benchmark")
+    parser.add_argument("--tokens", type=int, default=600)
+    parser.add_argument("--boards", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    get_spellcheck()
+    corpus = build_corpus(rng, args.tokens)
+    boards = build_boards(rng, corpus, args.boards)
+
+    # la referencia se memoiza igual que el clasificador: se mide solo la primera pasada
+    reference_flags.cache_clear()
+    start = time.perf_counter()
+    expected = [reference_flags(word.lower()) for word in corpus]
+    reference_time = time.perf_counter() - start
+
+    classifier = KeywordClassifier(classification_words)
+    start = time.perf_counter()
+    cold = [classifier.flags(word.lower()) for word in corpus]
+    cold_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for word in corpus:
+        classifier.flags(word.lower())
+    warm_time = time.perf_counter() - start
+
+    no_flags = [False] * len(classification_words)
+    token_mismatches = [
+        word for word, ref, new in zip(corpus, expected, cold) if (ref if ref is not None else no_flags) != new
+    ]
+    board_mismatches = [board for board in boards if reference_classify_board(board) != classify_board(board)]
+
+    n = len(corpus)
+    print(f"tokens: {n}, boards: {len(boards)}")
+    print(f"spellcheck.candidates   : {reference_time * 1e6 / n:10.1f} us/token")
+    print(f"classifier (cold cache) : {cold_time * 1e6 / n:10.1f} us/token  x{reference_time / cold_time:.0f}")
+    print(f"classifier (warm cache) : {warm_time * 1e6 / n:10.1f} us/token  x{reference_time / warm_time:.0f}")
+    print(f"dictionary lookups      : {classifier.spellcheck_calls} of {len(set(w.lower() for w in corpus))} distinct")
+    print(f"token mismatches        : {len(token_mismatches)} {token_mismatches[:10]}")
+    print(f"board mismatches        : {len(board_mismatches)} {board_mismatches[:5]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dhash_engine import compute_dhash  # noqa: E402
+from frame_source import open_frame_source  # noqa: E402
+from tv_ad_detector import DHASH_FREQUENCY, DHASH_THUMB_HEIGHT, DHASH_THUMB_WIDTH  # noqa: E402
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="dHash sampling throughput per decode backend")
+    parser.add_argument("--video_file", type=str, required=True)
+    parser.add_argument("--backends", type=str, nargs="+", default=["opencv", "ffmpeg"])
+    args = parser.parse_args()
+
+    hashes = {}
+    for backend in args.backends:
+        start, cpu_start = time.perf_counter(), cpu_seconds()
+        source = open_frame_source(
+            args.video_file, DHASH_THUMB_WIDTH, DHASH_THUMB_HEIGHT, gray=True, every=DHASH_FREQUENCY, backend=backend
+        )
+        name = type(source).__name__
+        samples = []
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            samples.append(compute_dhash(frame))
+        frames = source.frame_count
+        source.release()
+        elapsed, cpu = time.perf_counter() - start, cpu_seconds() - cpu_start
+        hashes[backend] = samples
+        print(f"{backend:7s} ({name}): {elapsed:6.2f}s wall, {cpu:6.2f}s CPU, {frames / elapsed:7.0f} fps, {len(samples)} samples")
+
+    if len(hashes) == 2:
+        first, second = hashes.values()
+        distances = [bin(a ^ b).count("1") for a, b in zip(first, second)]
+        print(f"dHash distance between backends: mean {sum(distances) / max(1, len(distances)):.2f}, max {max(distances, default=0)}")
+
+
+if __name__ == "__main__":
+    main()
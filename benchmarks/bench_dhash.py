@@ -0,0 +1,141 @@
+import argparse
+import os
+import sys
+import time
+from typing import Any, List, Tuple
+
+import cv2
+import imagehash
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dhash_engine import DHashMatcher, compute_dhash, compute_dhashes, int_to_imagehash  # noqa: E402
+
+
+def reference_dhash(frame: Any) -> imagehash.ImageHash:
+    img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return imagehash.dhash(Image.fromarray(img))
+
+
+def reference_similarity(all_hashes: List[imagehash.ImageHash], found_hash: imagehash.ImageHash, threshold: int) -> bool:
+    for h in all_hashes:
+        if h - found_hash < threshold:
+            return True
+    return False
+
+
+def random_card(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    noise = rng.integers(0, 256, size=(height // 60, width // 60, 3), dtype=np.uint8)
+    card = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(3):
+        x, y = int(rng.integers(0, width - 400)), int(rng.integers(0, height - 100))
+        cv2.putText(card, "INICIO", (x, y + 80), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 6)
+    return card
+
+
+def degrade(rng: np.random.Generator, frame: np.ndarray) -> np.ndarray:
+    noisy = np.clip(frame.astype(np.int16) + rng.integers(-6, 7, size=frame.shape), 0, 255).astype(np.uint8)
+    _, encoded = cv2.imencode(".jpg", noisy, [cv2.IMWRITE_JPEG_QUALITY, 70])
+    return cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+
+
+def build_dataset(
+    n_bumpers: int, n_frames: int, width: int, height: int, seed: int
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    rng = np.random.default_rng(seed)
+    bumpers = [random_card(rng, width, height) for _ in range(n_bumpers)]
+    frames: List[np.ndarray] = []
+    for i in range(n_frames):
+        if i % 4 == 0:
+            frames.append(degrade(rng, bumpers[int(rng.integers(0, n_bumpers))]))
+        else:
+            frames.append(random_card(rng, width, height))
+    return bumpers, frames
+
+
+def video_frames(video_file: str, n_frames: int) -> List[np.ndarray]:
+    # frames repartidos a lo largo de una grabacion real
+    cap = cv2.VideoCapture(video_file)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames: List[np.ndarray] = []
+    for frame_counter in np.linspace(0, max(total - 1, 0), n_frames).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_counter))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def timed(fn, *args) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="dHash engine vs imagehash benchmark")
+    parser.add_argument("--bumpers", type=int, default=300)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--threshold", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--video_file", type=str, help="also check the hash distance on frames of this recording")
+    parser.add_argument("--max_distance", type=int, default=2, help="fail if a hash differs more from imagehash")
+    args = parser.parse_args()
+
+    bumpers, frames = build_dataset(args.bumpers, args.frames, args.width, args.height, args.seed)
+    video_file_frames = video_frames(args.video_file, args.frames) if args.video_file else []
+
+    reference_library = [reference_dhash(b) for b in bumpers]
+    matcher = DHashMatcher(compute_dhash(b) for b in bumpers)
+
+    def run_reference() -> List[bool]:
+        return [reference_similarity(reference_library, reference_dhash(f), args.threshold) for f in frames]
+
+    def run_engine() -> List[bool]:
+        return [matcher.is_match(compute_dhash(f), args.threshold) for f in frames]
+
+    def run_engine_batch() -> List[bool]:
+        return matcher.match_batch(compute_dhashes(frames), args.threshold).tolist()
+
+    reference_frame_hashes = [reference_dhash(f) for f in frames]
+    engine_frame_hashes = compute_dhashes(frames)
+
+    def match_reference() -> List[bool]:
+        return [reference_similarity(reference_library, h, args.threshold) for h in reference_frame_hashes]
+
+    def match_engine() -> List[bool]:
+        return matcher.match_batch(engine_frame_hashes, args.threshold).tolist()
+
+    reference_result, reference_time = timed(run_reference)
+    engine_result, engine_time = timed(run_engine)
+    batch_result, batch_time = timed(run_engine_batch)
+    _, match_reference_time = timed(match_reference)
+    _, match_engine_time = timed(match_engine)
+
+    hash_distances = [
+        reference_dhash(f) - int_to_imagehash(compute_dhash(f)) for f in bumpers + frames + video_file_frames
+    ]
+    agreement = np.mean(np.array(reference_result) == np.array(engine_result))
+
+    n = len(frames)
+    print(f"library: {len(bumpers)} bumpers, frames: {n}, threshold: {args.threshold}")
+    print(f"imagehash path : {reference_time * 1000 / n:8.3f} ms/frame")
+    print(f"engine (single): {engine_time * 1000 / n:8.3f} ms/frame  x{reference_time / engine_time:.1f}")
+    print(f"engine (batch) : {batch_time * 1000 / n:8.3f} ms/frame  x{reference_time / batch_time:.1f}")
+    print(
+        f"matching only  : {match_reference_time * 1000 / n:8.3f} -> {match_engine_time * 1000 / n:.3f} ms/frame"
+        f"  x{match_reference_time / match_engine_time:.0f}"
+    )
+    print(f"match decision agreement: {agreement:.2%}  (batch == single: {batch_result == engine_result})")
+    print(f"per-frame hash distance engine vs imagehash: mean {np.mean(hash_distances):.2f}, max {max(hash_distances)}")
+    if max(hash_distances) > args.max_distance:
+        sys.exit(f"engine hashes drift from imagehash: max distance {max(hash_distances)} > {args.max_distance}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+decoded = {"frames": 0}
+RealVideoCapture = cv2.VideoCapture
+
+
+class CountingVideoCapture:
+    # cuenta los frames que decodifica cualquier modulo que abra el video con cv2 (incluido scenedetect)
+    def __init__(self, *args, **kwargs) -> None:
+        self._cap = RealVideoCapture(*args, **kwargs)
+
+    def read(self, *args):
+        decoded["frames"] += 1
+        return self._cap.read(*args)
+
+    def grab(self):
+        decoded["frames"] += 1
+        return self._cap.grab()
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+cv2.VideoCapture = CountingVideoCapture
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold channel: separate discovery + scan vs fused single decode")
+    parser.add_argument("--video_file", type=str, required=True)
+    parser.add_argument("--start_date", type=str, default="2024-01-01 10:00:00")
+    args = parser.parse_args()
+
+    bumpers_dir = tempfile.mkdtemp(prefix="bench_fused_")
+    os.environ["BUMPER_DETECTION_DIR"] = bumpers_dir + "/"
+    os.environ["OCR_CACHE_PERSIST"] = "false"
+    import tv_ad_detector  # noqa: E402
+
+    cap = RealVideoCapture(args.video_file)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration = frame_count / cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+
+    results = {}
+    for fused in (False, True):
+        shutil.rmtree(bumpers_dir)
+        os.makedirs(bumpers_dir)
+        tv_ad_detector.FUSED_DISCOVERY = fused
+        decoded["frames"] = 0
+        start = time.perf_counter()
+        results[fused] = tv_ad_detector.placa_detector(args.video_file, duration, [], args.start_date, "bench_channel")
+        elapsed = time.perf_counter() - start
+        name = "fused " if fused else "legacy"
+        print(f"{name}: {elapsed:7.2f}s, {decoded['frames'] / frame_count:.2f} decodes of {frame_count} frames")
+    shutil.rmtree(bumpers_dir)
+    print(f"same breaks: {results[False] == results[True]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bumper_index import get_indexed_bumpers_dhashes  # noqa: E402
+from live_detector import LiveBreakDetector  # noqa: E402
+from tv_ad_detector import bumper_dhash_detector, process_events  # noqa: E402
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    # el demuxer de mp4 necesita pedir rangos para llegar al moov; SimpleHTTPRequestHandler no los soporta
+    def send_head(self):
+        range_header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if not range_header or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        first, _, last = range_header.replace("bytes=", "").partition("-")
+        first_byte = int(first) if first else 0
+        last_byte = min(int(last), size - 1) if last else size - 1
+        stream = open(path, "rb")
+        stream.seek(first_byte)
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Range", f"bytes {first_byte}-{last_byte}/{size}")
+        self.send_header("Content-Length", str(last_byte - first_byte + 1))
+        self.end_headers()
+        self.range_remaining = last_byte - first_byte + 1
+        return stream
+
+    def copyfile(self, source, outputfile) -> None:
+        remaining = getattr(self, "range_remaining", None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            try:
+                outputfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                break
+            remaining -= len(chunk)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def serve_directory(directory: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(RangeHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Live mode latency benchmark over a local HTTP server")
+    parser.add_argument("--video_file", type=str, required=True)
+    parser.add_argument("--channel_name", type=str, default="test_channel")
+    parser.add_argument("--start_date", type=str, default="2024-01-01 10:00:00")
+    parser.add_argument("--compare", action="store_true", help="also run the offline detector on the same file")
+    args = parser.parse_args()
+
+    video_file = os.path.abspath(args.video_file)
+    server = serve_directory(os.path.dirname(video_file))
+    url = f"http://127.0.0.1:{server.server_address[1]}/{os.path.basename(video_file)}"
+
+    breaks: List[Dict[str, str]] = []
+    latencies: List[float] = []
+
+    def on_break(commercial_break: Dict[str, str], latency: float) -> None:
+        breaks.append(commercial_break)
+        latencies.append(latency)
+        print(f"  break {commercial_break} emitted {latency * 1000:.0f} ms after its end bumper")
+
+    dhashes = get_indexed_bumpers_dhashes(args.channel_name)
+    detector = LiveBreakDetector(url, args.channel_name, on_break, "stream", args.start_date, dhashes)
+    start = time.perf_counter()
+    stats = detector.run()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"source: {url}")
+    print(f"frames: {stats['frames']} in {elapsed:.1f}s ({stats['frames'] / elapsed:.0f} fps), breaks: {len(breaks)}")
+    if latencies:
+        print(f"latency mean {sum(latencies) / len(latencies) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms")
+
+    if args.compare:
+        cap = cv2.VideoCapture(video_file)
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        offline = process_events(bumper_dhash_detector(video_file, dhashes, args.start_date), args.start_date, duration)
+        # una tanda abierta al final se cierra con el fin de la grabacion offline y con el ultimo frame en vivo
+        same_starts = [b["start"] for b in offline["items"]] == [b["start"] for b in breaks]
+        same_ends = [b["end"] for b in offline["items"]][:-1] == [b["end"] for b in breaks][:-1]
+        print(f"offline breaks: {offline['items']}")
+        print(f"breaks match offline: {same_starts and same_ends}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BACKENDS = ("easyocr", "easyocr_cpu", "easyocr_onnx")
+
+# Precision contra latencia de cada backend de OCR sobre los frames de ocr_frames de bench_suite.
+# Cada combinacion corre en un interprete nuevo: los hilos de torch se fijan una sola vez por proceso
+
+
+def run_backend(backend: str, threads: int, video_args: List[str]) -> Dict[str, Any]:
+    with tempfile.NamedTemporaryFile(suffix=".json") as out:
+        subprocess.run(
+            [sys.executable, os.path.join(BENCH_DIR, "bench_suite.py"), "--stages", "ocr_frames", "--ocr", backend]
+            + video_args
+            + ["--out", out.name],
+            cwd=REPO_DIR,
+            env=dict(os.environ, OCR_THREADS=str(threads)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results = json.load(out)
+    record = results["stages"]["ocr_frames"]
+    record["ocr_load_seconds"] = results["ocr_load_seconds"]
+    return record
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Accuracy vs latency of the OCR backends on the synthetic video")
+    parser.add_argument("--backends", type=str, nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="OCR_THREADS values, 0 is the default")
+    parser.add_argument("--seconds", type=str, default="120")
+    parser.add_argument("--size", type=str, default="1280x720")
+    parser.add_argument("--breaks", type=str, default="2")
+    parser.add_argument("--out", type=str, help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    video_args = ["--seconds", args.seconds, "--size", args.size, "--breaks", args.breaks]
+    print(f"{'backend':14s} {'threads':>7s} {'load s':>7s} {'ms/frame':>9s} {'p95 ms':>8s} {'accuracy':>8s} {'bumpers':>8s}")
+    results: Dict[str, Any] = {}
+    for backend in args.backends:
+        for threads in args.threads:
+            name = f"{backend}/{threads}"
+            try:
+                record = run_backend(backend, threads, video_args)
+            except subprocess.CalledProcessError as e:
+                print(f"{backend:14s} {threads:7d} failed: {e.stderr.strip().splitlines()[-1]}")
+                continue
+            results[name] = record
+            print(
+                f"{backend:14s} {threads:7d} {record['ocr_load_seconds']:7.2f} {record['ms_per_frame']:9.1f} "
+                f"{record['p95_ms']:8.1f} {record['accuracy']:8.3f} {record['bumper_recall']:8.3f}"
+            )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_suite import OracleReader  # noqa: E402
+from synthetic_video import CARD_TEXT, card_path, load_or_generate  # noqa: E402
+
+
+class TimedReader(OracleReader):
+    # lector exacto de las placas sinteticas con un costo fijo por frame (sleep suelta el GIL como torch)
+    def __init__(self, delay: float) -> None:
+        super().__init__()
+        self.delay = delay
+        self.seconds = 0.0
+
+    def readtext(self, image: Any, detail: int = 1, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        time.sleep(self.delay)
+        result = super().readtext(image, detail)
+        self.seconds += time.perf_counter() - start
+        return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serial dense scan vs threaded decode/hash/OCR pipeline")
+    parser.add_argument("--seconds", type=float, default=300, help="length of the synthetic video")
+    parser.add_argument("--size", type=str, default="1280x720")
+    parser.add_argument("--ocr_delay", type=float, default=0.2, help="seconds added to each OCR frame")
+    parser.add_argument("--no_tracking", action="store_true", help="read every matching frame (BUMPER_TRACKING=false)")
+    parser.add_argument("--video_dir", type=str, default=os.path.join(tempfile.gettempdir(), "tv_ad_bench"))
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.split("x"))
+    video_file, truth = load_or_generate(
+        args.video_dir, seconds=args.seconds, fps=25, width=width, height=height, breaks=3, seed=0
+    )
+    os.environ["METRICS_ENABLED"] = "true"
+    os.environ["OCR_CACHE_ENABLED"] = "false"
+    os.environ["BUMPER_TRACKING"] = "false" if args.no_tracking else "true"
+    import config  # noqa: E402
+    import metrics  # noqa: E402
+    from dhash_engine import compute_dhash  # noqa: E402
+    from tv_ad_detector import bumper_dhash_detector, process_events  # noqa: E402
+
+    dhashes = [compute_dhash(cv2.imread(card_path(args.video_dir, label))) for label in CARD_TEXT]
+    frame_count, start_date = truth["frame_count"], truth["start_date"]
+    print(f"{os.path.basename(video_file)}: {frame_count} frames, OCR delay {args.ocr_delay}s per frame")
+    results: Dict[str, Any] = {}
+    for scan_mode in ("dense", "threaded"):
+        reader = config._reader = TimedReader(args.ocr_delay)
+        start = time.perf_counter()
+        with metrics.collect(profile=False) as collected:
+            results[scan_mode] = bumper_dhash_detector(video_file, dhashes, start_date, scan_mode)
+        elapsed = time.perf_counter() - start
+        counters = collected.snapshot["counters"]
+        stages = {"decode": counters.get("decode_seconds", 0), "hash": counters.get("hash_seconds", 0)}
+        stages["ocr"] = reader.seconds
+        print(
+            f"{scan_mode:9s} {elapsed:7.2f}s {frame_count / elapsed:8.1f} fps   "
+            + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stages.items())
+            + f" (sum {sum(stages.values()):.2f}s, slowest {max(stages.values()):.2f}s), {reader.calls} OCR frames"
+        )
+    same = process_events(results["dense"], start_date, truth["seconds"]) == process_events(
+        results["threaded"], start_date, truth["seconds"]
+    )
+    print(f"same breaks: {same}")
+
+
+if __name__ == "__main__":
+    main()
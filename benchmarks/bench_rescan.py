@@ -0,0 +1,67 @@
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dhash_engine import DHashMatcher  # noqa: E402
+from hash_track import TRACK_DTYPE, HashTrackWriter, load_hash_track, match_hash_track  # noqa: E402
+
+
+def write_synthetic_recording(folder: str, index: int, samples: int, bumpers: np.ndarray, rng) -> str:
+    video_file = os.path.join(folder, f"recording_{index:03d}.mp4")
+    with open(video_file, "wb") as f:
+        f.write(b"\0")
+    writer = HashTrackWriter(video_file, "2024-01-01 00:00:00")
+    track = np.empty(samples, dtype=TRACK_DTYPE)
+    track["frame"] = np.arange(1, samples + 1) * 8
+    track["pts_ms"] = track["frame"] * 40.0
+    track["dhash"] = rng.integers(0, 2**63, samples, dtype=np.int64).astype(np.uint64)
+    # algunas placas: un bumper con 1 o 2 bits cambiados
+    positions = rng.choice(samples, 20, replace=False)
+    track["dhash"][positions] = bumpers[rng.integers(0, len(bumpers), 20)] ^ np.uint64(1)
+    writer.frames, writer.positions_msec, writer.hashes = (
+        track["frame"].tolist(),
+        track["pts_ms"].tolist(),
+        track["dhash"].tolist(),
+    )
+    writer.save(25, samples * 8)
+    return video_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Match a day of hash tracks against a bumper set")
+    parser.add_argument("--recordings", type=int, default=24)
+    parser.add_argument("--hours", type=float, default=1, help="length of each recording")
+    parser.add_argument("--bumpers", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    bumpers = rng.integers(0, 2**63, args.bumpers, dtype=np.int64).astype(np.uint64)
+    samples = int(args.hours * 3600 * 25 / 8)
+    folder = tempfile.mkdtemp(prefix="bench_rescan_")
+    video_files = [write_synthetic_recording(folder, i, samples, bumpers, rng) for i in range(args.recordings)]
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    matcher = DHashMatcher(bumpers.tolist())
+    start = time.perf_counter()
+    matched = 0
+    for video_file in video_files:
+        track, _ = load_hash_track(video_file)
+        matched += len(match_hash_track(track, matcher))
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    shutil.rmtree(folder)
+
+    print(f"{args.recordings} recordings x {args.hours}h: {args.recordings * samples} samples, {matched} matches")
+    print(f"match time {elapsed:.2f}s, peak RSS growth {(rss_after - rss_before) / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
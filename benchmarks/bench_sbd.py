@@ -0,0 +1,96 @@
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from scenedetect import ContentDetector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings  # noqa: E402
+from shot_boundary_detection import find_scenes, list_scenes, unique_scene_frames  # noqa: E402
+
+COLUMNS = ["Start_Timecode", "Start_Seconds", "Start_Frames", "End_Timecode", "End_Seconds", "End_Frames"]
+
+
+def reference_build(scene_rows: List[Dict]) -> pd.DataFrame:
+    scenes_df = pd.DataFrame(columns=COLUMNS)
+    for scene_dict in scene_rows:
+        scenes_df = pd.concat([scenes_df, pd.DataFrame(scene_dict, index=[0])], ignore_index=True)
+    return scenes_df
+
+
+def reference_candidates(scenes: pd.DataFrame, fps_second: int, f_skip_factor: int) -> List[int]:
+    scenes_list: List[int] = []
+    time_skip: float = f_skip_factor / fps_second
+    for _, scene in scenes.iterrows():
+        scene_duration = float(scene["End_Seconds"]) - float(scene["Start_Seconds"])
+        if settings.BUMPER_TIME_WINDOW[0] < scene_duration < settings.BUMPER_TIME_WINDOW[1]:
+            n = 1
+            while n * time_skip < scene_duration:
+                scenes_list.append(int(scene["Start_Frames"]) + n * f_skip_factor)
+                n += 1
+    scenes_list.sort()
+    return [num for num in scenes_list if scenes_list.count(num) == 1]
+
+
+def synthetic_scenes(rng: random.Random, count: int, fps: float) -> List[Dict]:
+    rows: List[Dict] = []
+    frame = 0
+    for _ in range(count):
+        length = rng.choice([rng.randint(1, 30), rng.randint(30, 150), rng.randint(150, 3000)])
+        rows.append(
+            {
+                "Start_Timecode": "",
+                "Start_Seconds": frame / fps,
+                "Start_Frames": frame,
+                "End_Timecode": "",
+                "End_Seconds": (frame + length) / fps,
+                "End_Frames": frame + length,
+            }
+        )
+        # escenas solapadas para ejercitar la deduplicacion
+        frame += length if rng.random() > 0.2 else max(1, length // 2)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scene table + candidate frame benchmark")
+    parser.add_argument("--scenes", type=int, default=3000)
+    parser.add_argument("--fps", type=float, default=29.97)
+    parser.add_argument("--video_file", type=str, default=None, help="optionally time find_scenes on a video")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = synthetic_scenes(random.Random(args.seed), args.scenes, args.fps)
+
+    start = time.perf_counter()
+    reference_df = reference_build(rows)
+    expected = reference_candidates(reference_df, int(args.fps), 10)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scenes_df = pd.DataFrame({column: np.array([row[column] for row in rows]) for column in COLUMNS})
+    candidates = unique_scene_frames(list_scenes(scenes_df, int(args.fps), 10)).tolist()
+    columnar_time = time.perf_counter() - start
+
+    print(f"scenes: {args.scenes}, candidate frames: {len(candidates)}")
+    print(f"concat + iterrows + count : {reference_time:8.3f}s")
+    print(f"columnar + np.unique      : {columnar_time:8.3f}s  x{reference_time / columnar_time:.0f}")
+    print(f"identical candidates      : {candidates == expected}")
+
+    if args.video_file:
+        start = time.perf_counter()
+        detected = find_scenes(args.video_file, ContentDetector(threshold=11))
+        print(
+            f"find_scenes {args.video_file}: {len(detected)} scenes in {time.perf_counter() - start:.2f}s "
+            f"(SBD_DOWNSCALE={settings.SBD_DOWNSCALE}, SBD_FRAME_SKIP={settings.SBD_FRAME_SKIP})"
+        )
+
+
+if __name__ == "__main__":
+    main()
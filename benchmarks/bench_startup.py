@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cada escenario corre en un interprete nuevo para medir el costo real de arranque
+SCENARIOS: Dict[str, str] = {
+    "import config (lazy)": "import config",
+    "import config + warm_up (eager, previous behaviour)": "import config; config.warm_up()",
+    "import tv_ad_detector (lazy)": "import tv_ad_detector",
+    "first get_spellcheck()": "import config; t0 = time.perf_counter(); config.get_spellcheck()",
+    "first get_reader()": "import config; t0 = time.perf_counter(); config.get_reader()",
+}
+
+TEMPLATE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - t0
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"seconds": elapsed, "peak_rss_mb": rss_mb}}))
+"""
+
+
+def run_scenario(statement: str) -> Dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", TEMPLATE.format(statement=statement)],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Startup / model loading cost benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for name, statement in SCENARIOS.items():
+        try:
+            runs: List[Dict[str, float]] = [run_scenario(statement) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{name:55s} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        seconds = statistics.median(run["seconds"] for run in runs)
+        rss = max(run["peak_rss_mb"] for run in runs)
+        print(f"{name:55s} {seconds * 1000:10.1f} ms   peak RSS {rss:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_video import CARD_COLORS, CARD_TEXT, DATE_FORMAT, card_design, card_path, load_or_generate  # noqa: E402
+
+WARM_CHANNEL = "bench_warm"
+COLD_CHANNEL = "bench_cold"
+STAGES = (
+    "classify_board",
+    "ocr_frames",
+    "find_scenes",
+    "bumper_dhash_detector",
+    "placa_detector_warm",
+    "placa_detector_cold",
+)
+OCR_CHOICES = ("easyocr", "easyocr_cpu", "easyocr_onnx", "oracle")
+PROGRAMME_SAMPLES = 8  # frames sin placa leidos en ocr_frames
+
+# tableros de texto para classify_board: (lineas de OCR, etiqueta esperada); None es "no es placa"
+BOARDS: List[Tuple[List[str], Optional[str]]] = [
+    (["INICIO", "ESPACIO PUBLICITARIO"], "start"),
+    (["inicio espacio publicitario"], "start"),
+    (["INICI0", "ESPACIO PUBLlCITARIO"], "start"),
+    (["FIN", "ESPACIO PUBLICITARIO"], "end"),
+    (["fin espacio publicitario"], "end"),
+    (["FlN", "ESPAC1O PUBLICITARIO"], "end"),
+    (["NOTICIAS", "EN VIVO"], None),
+    (["PUBLICIDAD"], None),
+    (["21:30", "PRONOSTICO EXTENDIDO"], None),
+    (["ESPACIO PUBLICITARIO"], None),
+    ([], None),
+]
+
+
+class PeakRSS:
+    # muestrea el RSS del proceso en un hilo; ru_maxrss solo sirve como maximo de toda la corrida
+    def __init__(self, interval: float = 0.02) -> None:
+        self.interval = interval
+        self.page_size = resource.getpagesize()
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _current(self) -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self.page_size
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakRSS":
+        self.peak = self._current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_stage(name: str, frames: int, function: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    with PeakRSS() as rss:
+        start, cpu_start = time.perf_counter(), cpu_seconds()
+        metrics = function()
+        elapsed, cpu = time.perf_counter() - start, cpu_seconds() - cpu_start
+    record = {
+        "seconds": round(elapsed, 4),
+        "cpu_seconds": round(cpu, 4),
+        "fps": round(frames / elapsed, 1) if frames and elapsed > 0 else None,
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+    }
+    record.update(metrics)
+    fps = f"{record['fps']:9.1f} fps" if record["fps"] is not None else " " * 13
+    extra = ", ".join(f"{key}={value}" for key, value in metrics.items() if not isinstance(value, (list, dict)))
+    print(f"{name:22s} {elapsed:8.2f}s {fps} {record['peak_rss_mb']:8.1f} MB  {extra}")
+    return record
+
+
+def break_metrics(
+    result: Any, truth: Dict[str, Any], tolerance: float, event_names: Tuple[str, str] = ("start", "end")
+) -> Dict[str, Any]:
+    if isinstance(result, str):
+        return {"status": result, "precision": 0.0, "recall": 0.0, "breaks": []}
+    start_name, end_name = event_names
+    predicted = [
+        (datetime.strptime(item[start_name], DATE_FORMAT), datetime.strptime(item[end_name], DATE_FORMAT))
+        for item in result["items"]
+    ]
+    expected = [
+        (datetime.strptime(item["start"], DATE_FORMAT), datetime.strptime(item["end"], DATE_FORMAT))
+        for item in truth["breaks"]
+    ]
+    used, errors = set(), []
+    for start, end in expected:
+        for i, (p_start, p_end) in enumerate(predicted):
+            start_error = abs((p_start - start).total_seconds())
+            end_error = abs((p_end - end).total_seconds())
+            if i not in used and start_error <= tolerance and end_error <= tolerance:
+                used.add(i)
+                errors += [start_error, end_error]
+                break
+    return {
+        "status": "OK",
+        "precision": round(len(used) / len(predicted), 3) if predicted else 0.0,
+        "recall": round(len(used) / len(expected), 3) if expected else 1.0,
+        "boundary_error_s": round(float(np.mean(errors)), 2) if errors else None,
+        "breaks": result["items"],
+    }
+
+
+def ocr_samples(video_file: str, truth: Dict[str, Any]) -> List[Tuple[np.ndarray, Optional[str]]]:
+    # el frame del medio de cada placa y PROGRAMME_SAMPLES frames repartidos fuera de las placas
+    fps, card_seconds = truth["fps"], truth["card_seconds"]
+    start_dt = datetime.strptime(truth["start_date"], DATE_FORMAT)
+    cards: List[Tuple[float, str]] = []
+    for item in truth["breaks"]:
+        start = (datetime.strptime(item["start"], DATE_FORMAT) - start_dt).total_seconds()
+        end = (datetime.strptime(item["end"], DATE_FORMAT) - start_dt).total_seconds()
+        cards += [(start - card_seconds, "start"), (end, "end")]
+    wanted = {int((second + card_seconds / 2) * fps): label for second, label in cards}
+    step = truth["frame_count"] // (PROGRAMME_SAMPLES + 1)
+    for index in range(step, truth["frame_count"], step):
+        second = index / fps
+        if len(wanted) < len(cards) + PROGRAMME_SAMPLES and not any(
+            card <= second < card + card_seconds for card, _ in cards
+        ):
+            wanted[index] = None
+    samples = []
+    cap = cv2.VideoCapture(video_file)
+    for index in sorted(wanted):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = cap.read()
+        if ret:
+            samples.append((frame, wanted[index]))
+    cap.release()
+    return samples
+
+
+def cut_metrics(start_frames: np.ndarray, truth_cuts: List[int], tolerance: int = 2) -> Dict[str, Any]:
+    detected = start_frames[start_frames > 0]
+    expected = np.asarray(truth_cuts)
+    if len(detected) == 0 or len(expected) == 0:
+        return {"scenes": int(len(start_frames)), "cut_precision": 0.0, "cut_recall": 0.0}
+    distance = np.abs(detected[:, None] - expected[None, :])
+    return {
+        "scenes": int(len(start_frames)),
+        "cut_precision": round(float((distance.min(axis=1) <= tolerance).mean()), 3),
+        "cut_recall": round(float((distance.min(axis=0) <= tolerance).mean()), 3),
+    }
+
+
+def text_width(line: str) -> int:
+    return cv2.getTextSize(line, cv2.FONT_HERSHEY_DUPLEX, 1.4, 3)[0][0]
+
+
+class OracleReader:
+    # sustituto de easyocr: "lee" el texto de una placa si la imagen (frame completo o recorte) tiene el color
+    # de fondo de la tarjeta y devuelve una caja por linea de texto blanco.
+    # Aisla el costo y la precision del resto del pipeline de la del modelo de OCR
+    def __init__(self, same_design: bool = False) -> None:
+        self.colors = {}
+        for label in CARD_TEXT:
+            color = CARD_COLORS[card_design(label, same_design)]
+            self.colors[label] = np.array(color, dtype=np.float32) / np.linalg.norm(color)
+        # placas con el mismo fondo: se distinguen por el ancho de la primera linea de texto relativo a la segunda
+        self.line_ratios = {label: text_width(lines[0]) / text_width(lines[1]) for label, lines in CARD_TEXT.items()}
+        self.calls = 0
+
+    def _labels(self, image: np.ndarray, text_mask: np.ndarray) -> List[str]:
+        pixels = image[~text_mask].reshape(-1, 3).astype(np.float32)
+        if len(pixels) == 0:
+            return []
+        directions = pixels / np.maximum(np.linalg.norm(pixels, axis=1, keepdims=True), 1)
+        return [label for label, color in self.colors.items() if (directions @ color > 0.98).mean() > 0.9]
+
+    def _boxes(self, text_mask: np.ndarray) -> List[List[List[int]]]:
+        rows = np.flatnonzero(text_mask.any(axis=1))
+        boxes = []
+        for line in np.split(rows, np.flatnonzero(np.diff(rows) > 2) + 1) if len(rows) else []:
+            columns = np.flatnonzero(text_mask[line[0]:line[-1] + 1].any(axis=0))
+            x0, x1, y0, y1 = int(columns[0]), int(columns[-1]), int(line[0]), int(line[-1])
+            boxes.append([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+        return boxes
+
+    def readtext(self, image: Any, detail: int = 1, **kwargs: Any) -> List[Any]:
+        self.calls += 1
+        image = np.asarray(image)
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        text_mask = image.min(axis=2) > 150
+        labels = self._labels(image[::4, ::4], text_mask[::4, ::4])
+        if not labels:
+            return []
+        boxes = self._boxes(text_mask)
+        label = labels[0]
+        if len(labels) > 1:
+            if len(boxes) != 2:
+                return []
+            ratio = (boxes[0][1][0] - boxes[0][0][0]) / max(1, boxes[1][1][0] - boxes[1][0][0])
+            label = min(labels, key=lambda candidate: abs(self.line_ratios[candidate] - ratio))
+        lines = list(CARD_TEXT[label])
+        if len(boxes) != len(lines):
+            # lineas pegadas o cortadas por el recorte: una sola caja con todo el texto
+            lines = [" ".join(lines)]
+            xs = [x for box in boxes for x, _ in box] or [0]
+            ys = [y for box in boxes for _, y in box] or [0]
+            boxes = [[[min(xs), min(ys)], [max(xs), min(ys)], [max(xs), max(ys)], [min(xs), max(ys)]]]
+        return lines if detail == 0 else [(box, line, 1.0) for box, line in zip(boxes, lines)]
+
+    def readtext_batched(self, images: List[Any], detail: int = 1, **kwargs: Any) -> List[List[Any]]:
+        return [self.readtext(image, detail) for image in images]
+
+
+def environment_info() -> Dict[str, Any]:
+    from config import settings
+
+    versions = {"python": platform.python_version(), "opencv": cv2.__version__, "numpy": np.__version__}
+    for module in ("scenedetect", "easyocr", "torch", "pandas"):
+        try:
+            versions[module] = __import__(module).__version__
+        except Exception:
+            versions[module] = None
+    settings_snapshot = {
+        name: getattr(settings, name)
+        for name in dir(settings)
+        if name.isupper() and isinstance(getattr(settings, name), (str, int, float, list))
+    }
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+        "settings": settings_snapshot,
+    }
+
+
+def compare(results: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    print(f"\ncompared with {previous.get('created')}:")
+    for stage, record in results["stages"].items():
+        old = previous.get("stages", {}).get(stage)
+        if old is None:
+            continue
+        changes = []
+        for key in ("seconds", "fps", "peak_rss_mb", "precision", "recall", "accuracy", "ms_per_frame", "cut_recall"):
+            if record.get(key) is None or old.get(key) is None:
+                continue
+            delta = record[key] - old[key]
+            ratio = f" ({record[key] / old[key]:.2f}x)" if key in ("seconds", "fps") and old[key] else ""
+            changes.append(f"{key} {old[key]} -> {record[key]}{ratio}" if delta else f"{key} =")
+        print(f"  {stage:22s} " + ", ".join(changes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End to end benchmark on synthetic broadcast videos")
+    parser.add_argument("--seconds", type=float, default=300, help="length of the synthetic video")
+    parser.add_argument("--fps", type=float, default=25)
+    parser.add_argument("--size", type=str, default="1280x720")
+    parser.add_argument("--breaks", type=int, default=3, help="commercial breaks inserted in the video")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--same_design", action="store_true", help="start and end cards share their design and differ only in text"
+    )
+    parser.add_argument("--stages", type=str, nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument(
+        "--ocr", type=str, default="easyocr", choices=OCR_CHOICES, help="OCR backend, oracle reads the cards exactly"
+    )
+    parser.add_argument("--tolerance", type=float, default=2, help="seconds allowed on each break boundary")
+    parser.add_argument("--video_dir", type=str, default=os.path.join(tempfile.gettempdir(), "tv_ad_bench"))
+    parser.add_argument("--out", type=str, help="write the results to this JSON file")
+    parser.add_argument("--compare", type=str, help="results JSON of a previous run")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.split("x"))
+    video_file, truth = load_or_generate(
+        args.video_dir,
+        seconds=args.seconds,
+        fps=args.fps,
+        width=width,
+        height=height,
+        breaks=args.breaks,
+        seed=args.seed,
+        same_design=args.same_design,
+    )
+    frame_count, duration, start_date = truth["frame_count"], truth["seconds"], truth["start_date"]
+
+    # bumpers y caches en un directorio propio: cada corrida arranca igual
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    bumpers_dir = os.path.join(work_dir, "bumpers")
+    os.makedirs(bumpers_dir)
+    os.environ["BUMPER_DETECTION_DIR"] = bumpers_dir + "/"
+    os.environ["OCR_CACHE_PERSIST"] = "false"
+    os.environ.setdefault("HASH_TRACK_ENABLED", "false")
+    os.environ.setdefault("CHECKPOINT_ENABLED", "false")
+    import config  # noqa: E402
+    from bumper_index import get_indexed_bumpers_dhashes  # noqa: E402
+    from ocr_backend import load_ocr_reader  # noqa: E402
+    from ocr_batch import classify_full_frames  # noqa: E402
+    from scenedetect import ContentDetector  # noqa: E402
+    from shot_boundary_detection import CONTENT_THRESHOLD, find_scenes  # noqa: E402
+    from tv_ad_detector import bumper_dhash_detector, placa_detector, process_events  # noqa: E402
+    from utils import classify_board  # noqa: E402
+
+    cards = {label: cv2.imread(card_path(args.video_dir, label, args.same_design)) for label in CARD_TEXT}
+    # el canal "caliente" ya conoce sus placas; el "frio" tiene que descubrirlas
+    names = (config.settings.START_EVENT_NAME, config.settings.END_EVENT_NAME)
+    event_names = dict(zip(CARD_TEXT, names))
+    for label, card in cards.items():
+        cv2.imwrite(os.path.join(bumpers_dir, f"{WARM_CHANNEL}-{event_names[label]}-card.png"), card)
+    start = time.perf_counter()
+    config._reader = OracleReader(args.same_design) if args.ocr == "oracle" else load_ocr_reader(args.ocr)
+    ocr_load_seconds = time.perf_counter() - start
+    config.warm_up()
+
+    print(
+        f"{os.path.basename(video_file)}: {frame_count} frames, {len(truth['breaks'])} breaks, "
+        f"OCR {args.ocr} (loaded in {ocr_load_seconds:.2f}s)"
+    )
+    results: Dict[str, Any] = {
+        "created": datetime.now().strftime(DATE_FORMAT),
+        "video": {key: value for key, value in truth.items() if key != "scene_cuts"},
+        "ocr": args.ocr,
+        "ocr_load_seconds": round(ocr_load_seconds, 2),
+        "tolerance_s": args.tolerance,
+        "environment": environment_info(),
+        "stages": {},
+    }
+
+    def stage_classify_board() -> Dict[str, Any]:
+        repeat = 200
+        correct = 0
+        for _ in range(repeat):
+            correct += sum(classify_board(lines) == expected for lines, expected in BOARDS)
+        return {"boards": repeat * len(BOARDS), "accuracy": round(correct / (repeat * len(BOARDS)), 3)}
+
+    def stage_ocr_frames() -> Dict[str, Any]:
+        # precision contra latencia del backend de OCR: frames completos, de a uno, sin compuerta ni zona de texto
+        samples = ocr_samples(video_file, truth)
+        latencies, correct, bumpers, bumpers_read = [], 0, 0, 0
+        for frame, label in samples:
+            start = time.perf_counter()
+            classification = classify_full_frames([frame], 1)[0]
+            latencies.append(time.perf_counter() - start)
+            expected = event_names[label] if label is not None else None
+            correct += classification == expected
+            bumpers += label is not None
+            bumpers_read += label is not None and classification == expected
+        return {
+            "frames": len(samples),
+            "accuracy": round(correct / len(samples), 3) if samples else None,
+            "bumper_recall": round(bumpers_read / bumpers, 3) if bumpers else None,
+            "ms_per_frame": round(1000 * float(np.mean(latencies)), 1) if latencies else None,
+            "p95_ms": round(1000 * float(np.percentile(latencies, 95)), 1) if latencies else None,
+        }
+
+    def stage_find_scenes() -> Dict[str, Any]:
+        scenes = find_scenes(video_file, ContentDetector(threshold=CONTENT_THRESHOLD))
+        return cut_metrics(scenes["Start_Frames"].to_numpy(), truth["scene_cuts"])
+
+    def stage_bumper_dhash_detector() -> Dict[str, Any]:
+        raw_events = bumper_dhash_detector(video_file, get_indexed_bumpers_dhashes(WARM_CHANNEL), start_date)
+        if isinstance(raw_events, str):
+            return break_metrics(raw_events, truth, args.tolerance, names)
+        return break_metrics(process_events(raw_events, start_date, duration), truth, args.tolerance, names)
+
+    def stage_placa_detector(channel: str) -> Callable[[], Dict[str, Any]]:
+        def run() -> Dict[str, Any]:
+            dhashes = get_indexed_bumpers_dhashes(channel)
+            result = break_metrics(
+                placa_detector(video_file, duration, dhashes, start_date, channel), truth, args.tolerance, names
+            )
+            result["bumpers"] = len(get_indexed_bumpers_dhashes(channel))
+            return result
+
+        return run
+
+    functions = {
+        "classify_board": stage_classify_board,
+        "ocr_frames": stage_ocr_frames,
+        "find_scenes": stage_find_scenes,
+        "bumper_dhash_detector": stage_bumper_dhash_detector,
+        "placa_detector_warm": stage_placa_detector(WARM_CHANNEL),
+        "placa_detector_cold": stage_placa_detector(COLD_CHANNEL),
+    }
+    try:
+        for stage in args.stages:
+            calls_before = getattr(config._reader, "calls", None)
+            record = run_stage(stage, 0 if stage in ("classify_board", "ocr_frames") else frame_count, functions[stage])
+            if stage == "classify_board":
+                record["boards_per_s"] = round(record["boards"] / record["seconds"], 1) if record["seconds"] else None
+            if calls_before is not None:
+                record["ocr_calls"] = config._reader.calls - calls_before
+            results["stages"][stage] = record
+    finally:
+        shutil.rmtree(work_dir)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
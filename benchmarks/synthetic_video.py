@@ -0,0 +1,183 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+CARD_TEXT: Dict[str, List[str]] = {
+    "start": ["INICIO", "ESPACIO PUBLICITARIO"],
+    "end": ["FIN", "ESPACIO PUBLICITARIO"],
+}
+CARD_COLORS: Dict[str, Tuple[int, int, int]] = {"start": (120, 40, 30), "end": (30, 40, 120)}
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+SAME_DESIGN_TEXT_SCALE = 0.6
+
+
+def card_design(label: str, same_design: bool = False) -> str:
+    # con same_design las dos placas usan el fondo de la de inicio y un texto mas chico que es lo unico que cambia,
+    # como en los canales que reusan el mismo arte: quedan a uno o dos bits en dHash
+    return "start" if same_design else label
+
+
+def card_path(folder: str, label: str, same_design: bool = False) -> str:
+    return os.path.join(folder, f"card-{label}{'-same' if same_design else ''}.png")
+
+
+def make_card(label: str, width: int, height: int, same_design: bool = False) -> np.ndarray:
+    # por defecto degradados opuestos: las dos placas quedan lejos en dHash, no solo en el texto
+    design = card_design(label, same_design)
+    ramp = np.linspace(0.4, 1.0, width) if design == "start" else np.linspace(1.0, 0.4, width)
+    card = (ramp[None, :, None] * np.array(CARD_COLORS[design])[None, None, :]).repeat(height, axis=0).astype(np.uint8)
+    scale = width / 640 * (SAME_DESIGN_TEXT_SCALE if same_design else 1)
+    lines = CARD_TEXT[label]
+    for i, line in enumerate(lines):
+        (text_width, text_height), _ = cv2.getTextSize(line, cv2.FONT_HERSHEY_DUPLEX, 1.4 * scale, int(3 * scale))
+        y = int(height / 2 + (i - (len(lines) - 1) / 2) * text_height * 2.2)
+        cv2.putText(
+            card,
+            line,
+            ((width - text_width) // 2, y),
+            cv2.FONT_HERSHEY_DUPLEX,
+            1.4 * scale,
+            (255, 255, 255),
+            int(3 * scale),
+            cv2.LINE_AA,
+        )
+    return card
+
+
+class ShotGenerator:
+    # Tomas sinteticas: un fondo suave que se desplaza, ruido de sensor y, en las tandas, rectangulos en movimiento
+    def __init__(self, width: int, height: int, rng: np.random.Generator) -> None:
+        self.width, self.height = width, height
+        self.rng = rng
+        self.noise = [rng.integers(0, 24, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+
+    def new_shot(self, commercial: bool) -> Dict[str, Any]:
+        small = self.rng.integers(0, 255, (6, 10, 3), dtype=np.uint8)
+        background = cv2.resize(small, (self.width * 2, self.height * 2), interpolation=cv2.INTER_CUBIC)
+        velocity = self.rng.integers(-6, 7, 2)
+        boxes = []
+        if commercial:
+            for _ in range(self.rng.integers(1, 4)):
+                boxes.append(
+                    (
+                        self.rng.integers(0, self.width // 2, 2),
+                        self.rng.integers(-8, 9, 2),
+                        tuple(int(c) for c in self.rng.integers(0, 255, 3)),
+                    )
+                )
+        return {"background": background, "velocity": velocity, "boxes": boxes}
+
+    def frame(self, shot: Dict[str, Any], t: int) -> np.ndarray:
+        dx, dy = (shot["velocity"] * t) % np.array([self.width, self.height])
+        frame = shot["background"][dy:dy + self.height, dx:dx + self.width].copy()
+        for origin, speed, color in shot["boxes"]:
+            x, y = (origin + speed * t) % np.array([self.width, self.height])
+            cv2.rectangle(frame, (int(x), int(y)), (int(x) + self.width // 5, int(y) + self.height // 5), color, -1)
+        return cv2.add(frame, self.noise[t % len(self.noise)])
+
+
+def plan_breaks(seconds: float, breaks: int, break_seconds: float, card_seconds: float) -> List[Tuple[float, float]]:
+    # (inicio de la placa de inicio, inicio de la placa de fin), repartidas a lo largo del video
+    plan = []
+    # entre tandas queda al menos tanto programa como dura cada tanda
+    break_seconds = min(break_seconds, seconds / (breaks + 1) / 2 - 2 * card_seconds)
+    for k in range(breaks):
+        center = (k + 1) * seconds / (breaks + 1)
+        start = round(center - break_seconds / 2, 2)
+        plan.append((start, round(start + card_seconds + break_seconds, 2)))
+    return plan
+
+
+def generate_video(
+    path: str,
+    seconds: float = 300,
+    fps: float = 25,
+    width: int = 1280,
+    height: int = 720,
+    breaks: int = 3,
+    break_seconds: float = 40,
+    card_seconds: float = 2,
+    start_date: str = "2024-01-01 10:00:00",
+    seed: int = 0,
+    same_design: bool = False,
+) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    cards = {label: make_card(label, width, height, same_design) for label in CARD_TEXT}
+    plan = plan_breaks(seconds, breaks, break_seconds, card_seconds)
+    shots = ShotGenerator(width, height, rng)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+
+    scene_cuts: List[int] = []
+    shot = None
+    shot_end = 0
+    previous_segment = None
+    total_frames = int(seconds * fps)
+    for i in range(total_frames):
+        t = i / fps
+        segment = "program"
+        for card_start, end_card_start in plan:
+            if card_start <= t < card_start + card_seconds:
+                segment = "start"
+            elif end_card_start <= t < end_card_start + card_seconds:
+                segment = "end"
+            elif card_start + card_seconds <= t < end_card_start:
+                segment = "commercial"
+        if segment in cards:
+            frame = cards[segment]
+        else:
+            if shot is None or i >= shot_end or segment != previous_segment:
+                commercial = segment == "commercial"
+                # las tandas tienen tomas cortas, del orden de la duracion de una placa
+                length = rng.uniform(1, 3) if commercial else rng.uniform(3, 9)
+                shot, shot_start, shot_end = shots.new_shot(commercial), i, i + int(length * fps)
+            frame = shots.frame(shot, i - shot_start)
+        if segment != previous_segment or (segment not in cards and i == shot_start):
+            if i > 0:
+                scene_cuts.append(i)
+        previous_segment = segment
+        writer.write(frame)
+    writer.release()
+
+    start_dt = datetime.strptime(start_date, DATE_FORMAT)
+    # lo que deberia devolver process_events: desde el final de la placa de inicio hasta la placa de fin
+    truth_breaks = [
+        {
+            "start": (start_dt + timedelta(seconds=card_start + card_seconds)).strftime(DATE_FORMAT),
+            "end": (start_dt + timedelta(seconds=end_card_start)).strftime(DATE_FORMAT),
+        }
+        for card_start, end_card_start in plan
+    ]
+    ground_truth = {
+        "video_file": os.path.basename(path),
+        "seconds": seconds,
+        "fps": fps,
+        "width": width,
+        "height": height,
+        "frame_count": total_frames,
+        "start_date": start_date,
+        "seed": seed,
+        "card_seconds": card_seconds,
+        "same_design": same_design,
+        "breaks": truth_breaks,
+        "scene_cuts": sorted(set(scene_cuts)),
+    }
+    with open(path + ".truth.json", "w") as f:
+        json.dump(ground_truth, f, indent=2)
+    for label, card in cards.items():
+        cv2.imwrite(card_path(os.path.dirname(path), label, same_design), card)
+    return ground_truth
+
+
+def load_or_generate(folder: str, **params: Any) -> Tuple[str, Dict[str, Any]]:
+    name = "synthetic_{seconds}s_{fps}fps_{width}x{height}_{breaks}b_seed{seed}".format(**params)
+    name += "_same.mp4" if params.get("same_design") else ".mp4"
+    path = os.path.join(folder, name)
+    if os.path.isfile(path) and os.path.isfile(path + ".truth.json"):
+        with open(path + ".truth.json") as f:
+            return path, json.load(f)
+    os.makedirs(folder, exist_ok=True)
+    return path, generate_video(path, **params)
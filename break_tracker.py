@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import settings
+from utils import add_seconds_to_datetime, datetime_to_string, string_to_datetime
+
+BOARD_TIME_SEPARATION = int(settings.BOARD_TIME_SEPARATION)
+
+placa_inicio: str = settings.START_EVENT_NAME
+placa_fin: str = settings.END_EVENT_NAME
+
+
+class BreakTracker:
+    # Version incremental de process_events: recibe los eventos de a uno, en orden, y devuelve cada
+    # tanda publicitaria en cuanto queda cerrada por una placa de fin (o por timeout en vivo)
+    def __init__(self, start_time_str: str) -> None:
+        self.start_time_str: str = start_time_str
+        self.last_event_type: Optional[str] = None
+        self.last_timestamp_dt: Optional[datetime] = None
+        self.last_timestamp_str: Optional[str] = None
+
+    def push(self, timestamp_str: str, event_type: str) -> List[Dict[str, str]]:
+        reduced_data: List[Dict[str, str]] = []
+        current_timestamp_dt = string_to_datetime(timestamp_str)
+        last_event_type = self.last_event_type
+        last_timestamp_dt = self.last_timestamp_dt
+
+        if last_event_type is None and event_type == placa_fin:
+            reduced_data.append({placa_inicio: self.start_time_str, placa_fin: timestamp_str})
+
+        elif event_type != last_event_type:
+            if event_type == placa_fin:
+                reduced_data.append(
+                    {
+                        placa_inicio: datetime_to_string(last_timestamp_dt),
+                        placa_fin: timestamp_str,
+                    }
+                )
+
+        elif (current_timestamp_dt - last_timestamp_dt) > timedelta(seconds=BOARD_TIME_SEPARATION):
+            if last_event_type == placa_inicio:
+                reduced_data.append(
+                    {
+                        placa_inicio: datetime_to_string(last_timestamp_dt),
+                        placa_fin: datetime_to_string(current_timestamp_dt - timedelta(seconds=1)),
+                    }
+                )
+            else:
+                reduced_data.append(
+                    {
+                        placa_inicio: add_seconds_to_datetime(1, last_timestamp_dt),
+                        placa_fin: datetime_to_string(current_timestamp_dt),
+                    }
+                )
+
+        self.last_event_type = event_type
+        self.last_timestamp_dt = current_timestamp_dt
+        self.last_timestamp_str = timestamp_str
+        return reduced_data
+
+    def check_timeout(self, now: datetime, timeout_seconds: float) -> List[Dict[str, str]]:
+        if self.last_event_type != placa_inicio or (now - self.last_timestamp_dt).total_seconds() <= timeout_seconds:
+            return []
+        # sin placa de fin a tiempo: se cierra la tanda y se sigue como si hubiera aparecido en `now`
+        timeout_end = datetime_to_string(now)
+        reduced_data = [{placa_inicio: self.last_timestamp_str, placa_fin: timeout_end}]
+        self.last_event_type = placa_fin
+        self.last_timestamp_dt = string_to_datetime(timeout_end)
+        self.last_timestamp_str = timeout_end
+        return reduced_data
+
+    def finish(self, end_timestamp_str: str) -> List[Dict[str, str]]:
+        if self.last_event_type == placa_inicio:
+            return [{placa_inicio: self.last_timestamp_str, placa_fin: end_timestamp_str}]
+        return []
@@ -0,0 +1,162 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import imagehash
+
+from config import logger, settings
+from dhash_engine import DHASH_VERSION, compute_dhash, hash_to_int, int_to_hex, int_to_imagehash
+from utils import format_channel_name
+
+BUMPER_EXTENSIONS: Tuple[str, ...] = (".png", ".jpg")
+INDEX_VERSION: int = 1
+
+# indices ya cargados en este proceso por (canal, carpeta), con el mtime de la carpeta al refrescarlos
+_loaded_indexes: Dict[Tuple[str, str], Tuple[Optional[int], "BumperIndex"]] = {}
+
+
+def bumper_label(file: str, formatted_channel_name: str) -> Optional[str]:
+    label = file[len(formatted_channel_name):].lstrip("-").split("-")[0]
+    if label in (settings.START_EVENT_NAME, settings.END_EVENT_NAME):
+        return label
+    return None
+
+
+class BumperIndex:
+    def __init__(self, channel: str, folder: str = settings.BUMPER_DETECTION_DIR) -> None:
+        self.channel: str = format_channel_name(channel)
+        self.folder: str = folder
+        self.path: str = os.path.join(folder, f".{self.channel}.bumper_index.json")
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as index_file:
+                data = json.load(index_file)
+            if data.get("version") == INDEX_VERSION and data.get("dhash_version") == DHASH_VERSION:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Bumper index {self.path} unreadable, rebuilding: {e}")
+            self.entries = {}
+
+    def save(self) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as index_file:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "dhash_version": DHASH_VERSION,
+                    "channel": self.channel,
+                    "entries": self.entries,
+                },
+                index_file,
+            )
+        os.replace(tmp_path, self.path)
+
+    def _is_bumper_file(self, file: str) -> bool:
+        return file.startswith(self.channel) and file.endswith(BUMPER_EXTENSIONS)
+
+    def _hash_file(self, file: str, stat: os.stat_result) -> Optional[Dict[str, Any]]:
+        bumper_image = cv2.imread(os.path.join(self.folder, file))
+        if bumper_image is None:
+            logger.warning(f"Bumper index: could not read {file}")
+            return None
+        return {
+            "dhash": int_to_hex(compute_dhash(bumper_image)),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "label": bumper_label(file, self.channel),
+        }
+
+    def refresh(self) -> bool:
+        if not os.path.isdir(self.folder):
+            return False
+        changed = False
+        seen = set()
+        for file in os.listdir(self.folder):
+            if not self._is_bumper_file(file):
+                continue
+            seen.add(file)
+            stat = os.stat(os.path.join(self.folder, file))
+            entry = self.entries.get(file)
+            if entry is not None and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+            new_entry = self._hash_file(file, stat)
+            if new_entry is not None:
+                self.entries[file] = new_entry
+                changed = True
+        for file in set(self.entries) - seen:
+            del self.entries[file]
+            changed = True
+        if changed:
+            self.save()
+        return changed
+
+    def add(self, path: str) -> Optional[str]:
+        file = os.path.basename(path)
+        if not self._is_bumper_file(file):
+            return None
+        entry = self._hash_file(file, os.stat(path))
+        if entry is None:
+            return None
+        self.entries[file] = entry
+        self.save()
+        return entry["dhash"]
+
+    def stale(self) -> bool:
+        # algun archivo del indice cambio o desaparecio sin pasar por refresh ni add
+        for file, entry in self.entries.items():
+            try:
+                stat = os.stat(os.path.join(self.folder, file))
+            except OSError:
+                return True
+            if entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size:
+                return True
+        return False
+
+    def hashes(self, label: Optional[str] = None) -> List[str]:
+        return [
+            entry["dhash"]
+            for _, entry in sorted(self.entries.items())
+            if label is None or entry["label"] == label
+        ]
+
+
+def _folder_mtime(folder: str) -> Optional[int]:
+    try:
+        return os.stat(folder).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_bumper_index(channel: str, folder: str = settings.BUMPER_DETECTION_DIR) -> BumperIndex:
+    # la carpeta se vuelve a listar solo si cambio su mtime (altas, bajas o renombres, incluido el indice que guarda
+    # otro proceso al agregar un bumper); una imagen sobrescrita con el mismo nombre no lo cambia, por eso en cada
+    # carga tambien se compara el stat de los archivos ya indexados
+    key = (format_channel_name(channel), os.path.abspath(folder))
+    mtime = _folder_mtime(folder)
+    loaded = _loaded_indexes.get(key)
+    if loaded is not None and mtime is not None and loaded[0] == mtime:
+        index = loaded[1]
+        if index.stale():
+            index.refresh()
+        return index
+    index = BumperIndex(channel, folder)
+    index.refresh()
+    # el mtime de antes del refresh: si refresh guardo el indice la proxima llamada vuelve a listar una vez
+    _loaded_indexes[key] = (mtime, index)
+    return index
+
+
+def get_indexed_bumpers_dhashes(
+    channel: str, folder: str = settings.BUMPER_DETECTION_DIR
+) -> List[imagehash.ImageHash]:
+    return [int_to_imagehash(hash_to_int(dhash)) for dhash in load_bumper_index(channel, folder).hashes()]
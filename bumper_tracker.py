@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import metrics
+
+from config import settings, to_boolean
+from dhash_engine import DHashMatcher, HashLike, hash_to_int
+
+DHASH_THRESHOLD = int(settings.DHASH_THRESHOLD)
+BUMPER_TRACKING: bool = to_boolean(str(settings.BUMPER_TRACKING))
+BUMPER_TRACK_RETRIES = int(settings.BUMPER_TRACK_RETRIES)
+
+# (momento del frame, clasificacion)
+RecordCallback = Callable[[datetime, Optional[str]], None]
+
+
+class _Track:
+    def __init__(self, reference: int) -> None:
+        self.reference: int = reference  # dhash del bumper indexado que matcheo
+        self.classification: Optional[str] = None
+        self.reads: int = 0
+        self.waiting: bool = False
+        # frames seguidos mientras su lectura esta en cola: se registran cuando llega el resultado
+        self.times: List[datetime] = []
+
+
+class BumperTracker:
+    # Seguimiento de la placa en pantalla: se lee con OCR el primer frame y los siguientes que quedan a menos de
+    # DHASH_THRESHOLD del bumper indexado que matcheo heredan su clasificacion. Un cambio de imagen cierra el
+    # seguimiento y el proximo match se vuelve a leer. Si la lectura no da placa se reintenta con otro frame
+    def __init__(
+        self,
+        matcher: DHashMatcher,
+        record: RecordCallback,
+        threshold: int = DHASH_THRESHOLD,
+        retries: int = BUMPER_TRACK_RETRIES,
+    ) -> None:
+        self.matcher: DHashMatcher = matcher
+        self.record: RecordCallback = record
+        self.threshold: int = threshold
+        self.retries: int = retries
+        self.track: Optional[_Track] = None
+        self._nearest: int = -1
+        self._waiting: Dict[datetime, _Track] = {}
+        self.tracks: int = 0
+        self.suppressed: int = 0
+
+    def distance(self, frame_hash: HashLike) -> int:
+        # mientras la imagen sigue cerca del bumper seguido basta con una comparacion
+        frame_hash = hash_to_int(frame_hash)
+        if self.track is not None:
+            distance = bin(self.track.reference ^ frame_hash).count("1")
+            if distance < self.threshold:
+                return distance
+            self.track = None
+        self._nearest, distance = self.matcher.nearest(frame_hash)
+        return distance
+
+    def follow(self, current_time: datetime) -> bool:
+        # para un frame que matcheo: True si hereda la clasificacion del seguimiento (no va a OCR); con False
+        # el llamador lo lee y entrega el resultado a resolve()
+        track = self.track
+        if track is None:
+            track = self.track = _Track(int(self.matcher.hashes[self._nearest]))
+            self.tracks += 1
+        elif track.waiting or track.classification is not None or track.reads > self.retries:
+            self.suppressed += 1
+            if track.waiting:
+                track.times.append(current_time)
+            else:
+                self.record(current_time, track.classification)
+            return True
+        track.reads += 1
+        track.waiting = True
+        self._waiting[current_time] = track
+        return False
+
+    def resolve(self, current_time: datetime, classification: Optional[str]) -> None:
+        self.record(current_time, classification)
+        track = self._waiting.pop(current_time, None)
+        if track is None:
+            return
+        track.waiting = False
+        track.classification = classification
+        # los frames en espera heredan solo una placa; si no se leyo nada el siguiente frame se vuelve a leer
+        times, track.times = track.times, []
+        if classification is not None:
+            for time in times:
+                self.record(time, classification)
+
+    def record_metrics(self) -> None:
+        metrics.inc("bumper_tracks", self.tracks)
+        metrics.inc("ocr_suppressed_frames", self.suppressed)
+
+    def stats(self) -> Dict[str, int]:
+        return {"tracks": self.tracks, "suppressed": self.suppressed}
+
+
+def load_bumper_tracker(matcher: DHashMatcher, record: RecordCallback) -> Optional[BumperTracker]:
+    return BumperTracker(matcher, record) if BUMPER_TRACKING else None
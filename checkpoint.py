@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from config import logger, settings, to_boolean
+from utils import format_channel_name
+
+CHECKPOINT_ENABLED: bool = to_boolean(str(settings.CHECKPOINT_ENABLED))
+CHECKPOINT_INTERVAL = float(settings.CHECKPOINT_INTERVAL)
+CHECKPOINT_DIR: str = settings.CHECKPOINT_DIR
+CHECKPOINT_VERSION: int = 2
+# etapas reanudables: deteccion de escenas, lectura de candidatos y escaneo de dhash
+CHECKPOINT_STAGES = ("scenes", "candidates", "scan")
+
+
+def checkpoint_path(video_file: str, channel: str, folder: str = CHECKPOINT_DIR) -> str:
+    # fuera de la carpeta de las grabaciones; el hash de la ruta separa grabaciones con el mismo nombre
+    path_hash = hashlib.sha1(os.path.abspath(video_file).encode()).hexdigest()[:12]
+    name = f"{os.path.basename(video_file)}.{path_hash}.checkpoint.json"
+    return os.path.join(folder, format_channel_name(channel), name)
+
+
+class JobCheckpoint:
+    # Punto de reanudacion de una grabacion: etapa, ultimo frame procesado y lo ya calculado en esa etapa.
+    # Solo vale para el mismo archivo (tamano), canal y fecha de inicio; si no, se ignora y se empieza de cero
+    def __init__(self, video_file: str, channel: str, start_date_str: str, enabled: bool = CHECKPOINT_ENABLED) -> None:
+        self.video_file: str = video_file
+        self.channel: str = format_channel_name(channel)
+        self.start_date_str: str = start_date_str
+        self.enabled: bool = enabled
+        self.path: str = checkpoint_path(video_file, channel)
+        self.stage: Optional[str] = None
+        # el descubrimiento de bumpers ya corrio para esta grabacion: al reanudar no se vuelve a correr
+        self.discovered: bool = False
+        self.frame: int = 0
+        self.events: Dict[str, Any] = {"items": {}}
+        self.scenes: Optional[Dict[str, list]] = None
+        self._saved_at: float = time.monotonic()
+        if enabled:
+            self.load()
+
+    def _video_size(self) -> int:
+        return os.path.getsize(self.video_file) if os.path.exists(self.video_file) else -1
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as checkpoint_file:
+                data = json.load(checkpoint_file)
+            if (
+                data.get("version") != CHECKPOINT_VERSION
+                or data.get("channel") != self.channel
+                or data.get("start_date") != self.start_date_str
+                or data.get("video_size") != self._video_size()
+                or data.get("stage") not in CHECKPOINT_STAGES
+            ):
+                logger.warning(f"Checkpoint {self.path} belongs to another job, starting over")
+                return
+            self.stage = data["stage"]
+            self.frame = int(data["frame"])
+            self.events = {"items": dict(data.get("events", {}).get("items", {}))}
+            self.scenes = data.get("scenes")
+            self.discovered = bool(data.get("discovered"))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Checkpoint {self.path} unreadable, starting over: {e}")
+            self.stage = None
+
+    def due(self) -> bool:
+        return self.enabled and time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL
+
+    def save(
+        self,
+        stage: str,
+        frame: int,
+        events: Optional[Dict[str, Any]] = None,
+        scenes: Optional[pd.DataFrame] = None,
+    ) -> Optional[str]:
+        self._saved_at = time.monotonic()
+        self.stage, self.frame = stage, int(frame)
+        self.events = {"items": dict(events["items"])} if events is not None else {"items": {}}
+        self.scenes = scenes.to_dict("list") if scenes is not None else None
+        if not self.enabled:
+            return None
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "video_file": os.path.basename(self.video_file),
+            "video_size": self._video_size(),
+            "channel": self.channel,
+            "start_date": self.start_date_str,
+            "stage": self.stage,
+            "frame": self.frame,
+            "events": self.events,
+            "scenes": self.scenes,
+            "discovered": self.discovered,
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump(data, checkpoint_file, default=int)
+        os.replace(tmp_path, self.path)
+        logger.debug(f"Checkpoint {self.path}: {self.stage} at frame {self.frame}")
+        return self.path
+
+    def scenes_df(self) -> Optional[pd.DataFrame]:
+        return pd.DataFrame(self.scenes) if self.scenes is not None else None
+
+    def clear(self) -> None:
+        self.stage, self.frame, self.events, self.scenes = None, 0, {"items": {}}, None
+        self.discovered = False
+        if os.path.exists(self.path):
+            os.remove(self.path)
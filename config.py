@@ -1,8 +1,7 @@
 import logging
 import os
-
-import easyocr
-from spellchecker import SpellChecker
+import threading
+from typing import Any, Optional
 
 
 def to_boolean(value: str) -> bool:
@@ -24,8 +23,68 @@ class Settings:
     )  # one in every x frames is processed
     DHASH_THRESHOLD = os.getenv("DHASH_THRESHOLD") or 8
     BOARD_TIME_SEPARATION = os.getenv("BOARD_TIME_SEPARATION") or 2  # time in seconds
-    DETECTION_TIMEOUT = os.getenv("DETECTION_TIMEOUT") or 3600  # seconds
+    # seconds per recording, 0 disables the deadline; only applies with CHECKPOINT_ENABLED
+    DETECTION_TIMEOUT = os.getenv("DETECTION_TIMEOUT") or 3600
+    CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED") or "false"  # save progress to resume interrupted jobs
+    CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR") or "./checkpoints/"  # one subfolder per channel
+    CHECKPOINT_INTERVAL = os.getenv("CHECKPOINT_INTERVAL") or 60  # seconds between checkpoints of a running scan
     VIDEO_END_PADDING_FRAMES = os.getenv("VIDEO_END_PADDING_FRAMES") or 15
+    SCAN_MODE = os.getenv("SCAN_MODE") or "dense"  # dense | coarse | threaded
+    # coarse mode: longest gap between keyframes left unscanned (capped at half the shortest bumper)
+    COARSE_MAX_GAP_SECONDS = os.getenv("COARSE_MAX_GAP_SECONDS") or 0.65
+    # in coarse mode, keyframes closer than DHASH_THRESHOLD + margin trigger a dense scan around them
+    REFINE_DHASH_MARGIN = os.getenv("REFINE_DHASH_MARGIN") or 6
+    # threaded scan mode: frames buffered between its decode, hash and OCR threads
+    PIPELINE_QUEUE_SIZE = os.getenv("PIPELINE_QUEUE_SIZE") or 16
+    DETECTION_WORKERS = os.getenv("DETECTION_WORKERS") or 1  # processes per recording
+    CHUNK_OVERLAP_SECONDS = os.getenv("CHUNK_OVERLAP_SECONDS") or 2
+    OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED") or "true"
+    OCR_CACHE_SIZE = os.getenv("OCR_CACHE_SIZE") or 4096
+    OCR_CACHE_RADIUS = os.getenv("OCR_CACHE_RADIUS") or 0  # max hamming distance between matched bumpers for a hit
+    OCR_CACHE_PERSIST = os.getenv("OCR_CACHE_PERSIST") or "false"  # keep a cache file per channel
+    OCR_BATCH_SIZE = os.getenv("OCR_BATCH_SIZE") or 8  # frames per readtext_batched call, 1 disables batching
+    OCR_BATCH_MAX_WAIT = os.getenv("OCR_BATCH_MAX_WAIT") or 2  # seconds a frame may wait for its batch
+    OCR_ROI_ENABLED = os.getenv("OCR_ROI_ENABLED") or "true"  # OCR only the learned text area of each channel
+    OCR_ROI_HEIGHT = os.getenv("OCR_ROI_HEIGHT") or 160  # text area crops are downscaled to this height in pixels
+    OCR_ROI_MARGIN = os.getenv("OCR_ROI_MARGIN") or 0.02  # margin added around the text area, fraction of the frame
+    OCR_BACKEND = os.getenv("OCR_BACKEND") or "easyocr"  # easyocr | easyocr_cpu | easyocr_onnx
+    OCR_THREADS = os.getenv("OCR_THREADS") or 0  # threads per process of the CPU OCR backends, 0 keeps the default
+    OCR_GATE_ENABLED = os.getenv("OCR_GATE_ENABLED") or "true"  # run the text detector before recognizing candidates
+    OCR_GATE_MIN_EDGES = os.getenv("OCR_GATE_MIN_EDGES") or 0.002  # fraction of strong edge pixels to reach the detector
+    FUSED_DISCOVERY = os.getenv("FUSED_DISCOVERY") or "true"  # discover bumpers and detect in a single decode
+    BUMPER_TOP_K = os.getenv("BUMPER_TOP_K") or 4  # best distinct candidates kept per bumper label during discovery
+    BUMPER_MIN_CONFIDENCE = os.getenv("BUMPER_MIN_CONFIDENCE") or 0.6  # OCR confidence of a confident bumper
+    BUMPERS_PER_LABEL = os.getenv("BUMPERS_PER_LABEL") or 1  # distinct bumpers saved per label
+    BUMPER_TRACKING = os.getenv("BUMPER_TRACKING") or "true"  # OCR a bumper once while it stays on screen
+    BUMPER_TRACK_RETRIES = os.getenv("BUMPER_TRACK_RETRIES") or 2  # frames read again when a tracked bumper is unreadable
+    SBD_DOWNSCALE = os.getenv("SBD_DOWNSCALE") or 0  # scene detection downscale factor, 0 lets scenedetect choose
+    SBD_FRAME_SKIP = os.getenv("SBD_FRAME_SKIP") or 0  # frames skipped between scene detection samples
+    HASH_TRACK_ENABLED = os.getenv("HASH_TRACK_ENABLED") or "false"  # write <video>.dhash_track.npy for rescans
+    HASH_TRACK_MATCH_CHUNK = os.getenv("HASH_TRACK_MATCH_CHUNK") or 65536  # track rows matched per step
+    DECODE_BACKEND = os.getenv("DECODE_BACKEND") or "opencv"  # opencv | ffmpeg
+    FFMPEG_BINARY = os.getenv("FFMPEG_BINARY") or "ffmpeg"
+    FFMPEG_THREADS = os.getenv("FFMPEG_THREADS") or 0  # decoder threads, 0 lets ffmpeg choose
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED") or "false"  # per stage timers, counters and histograms
+    METRICS_PROFILE = os.getenv("METRICS_PROFILE") or "false"  # sample the stack of each job, needs METRICS_ENABLED
+    METRICS_PROFILE_INTERVAL = os.getenv("METRICS_PROFILE_INTERVAL") or 0.01  # seconds between stack samples
+    # LIVE MODE
+    LIVE_BREAK_TIMEOUT = os.getenv("LIVE_BREAK_TIMEOUT") or 900  # close a break with no end bumper after x seconds
+    LIVE_RECONNECT_DELAY = os.getenv("LIVE_RECONNECT_DELAY") or 1  # seconds between reconnection attempts
+    LIVE_IDLE_TIMEOUT = os.getenv("LIVE_IDLE_TIMEOUT") or 30  # stop after x seconds without new frames
+    # SERVICE
+    SERVICE_WORKERS = os.getenv("SERVICE_WORKERS") or 2  # warm processes shared by all channels
+    SERVICE_QUEUE_SIZE = os.getenv("SERVICE_QUEUE_SIZE") or 32  # queued jobs before new ones are rejected
+    SERVICE_CHANNEL_CONCURRENCY = os.getenv("SERVICE_CHANNEL_CONCURRENCY") or 1  # running jobs per channel
+    SERVICE_WATCH_DIR = os.getenv("SERVICE_WATCH_DIR") or "./watch/"  # one subfolder per channel
+    SERVICE_WATCH_INTERVAL = os.getenv("SERVICE_WATCH_INTERVAL") or 10  # seconds between folder scans
+    SERVICE_RESULTS_DIR = os.getenv("SERVICE_RESULTS_DIR") or "./results/"
+    # finished jobs answered by GET /jobs/<id>: kept this many seconds, and at most this many
+    SERVICE_JOB_RETENTION = os.getenv("SERVICE_JOB_RETENTION") or 86400
+    SERVICE_MAX_FINISHED_JOBS = os.getenv("SERVICE_MAX_FINISHED_JOBS") or 1000
+    # watched recordings already processed (or to requeue) across service restarts
+    SERVICE_WATCH_STATE = os.getenv("SERVICE_WATCH_STATE") or "./watch_state.json"
+    SERVICE_HOST = os.getenv("SERVICE_HOST") or "127.0.0.1"
+    SERVICE_PORT = os.getenv("SERVICE_PORT") or 8080
     # WORDS
     START_WORDS = {
         "inicio",
@@ -74,10 +133,48 @@ class Settings:
     SPELLCHECKER_REMOVE_WORDS = ["jqué", "e", "d"]
 
 settings = Settings()
+logger = logging.getLogger(__name__)
 
-spellcheck = SpellChecker(language=settings.SPELLCHECKER_LANGUAGE)
-spellcheck.word_frequency.remove_words(settings.SPELLCHECKER_REMOVE_WORDS)
+# Los modelos se cargan recien cuando se usan: importar config no debe pagar torch ni el diccionario
+_models_lock = threading.Lock()
+_reader: Optional[Any] = None
+_spellcheck: Optional[Any] = None
 
-# Cargo el idioma para usar OCR
-reader = easyocr.Reader(settings.OCR_LANGUAGES)
-logger = logging.getLogger(__name__)
+
+def get_spellcheck() -> Any:
+    global _spellcheck
+    if _spellcheck is None:
+        with _models_lock:
+            if _spellcheck is None:
+                from spellchecker import SpellChecker
+
+                spellcheck = SpellChecker(language=settings.SPELLCHECKER_LANGUAGE)
+                spellcheck.word_frequency.remove_words(settings.SPELLCHECKER_REMOVE_WORDS)
+                _spellcheck = spellcheck
+    return _spellcheck
+
+
+def get_reader() -> Any:
+    global _reader
+    if _reader is None:
+        with _models_lock:
+            if _reader is None:
+                from ocr_backend import load_ocr_reader
+
+                # Cargo el idioma para usar OCR con el backend de OCR_BACKEND
+                _reader = load_ocr_reader()
+    return _reader
+
+
+def warm_up() -> None:
+    get_spellcheck()
+    get_reader()
+
+
+def __getattr__(name: str) -> Any:
+    # compatibilidad con `config.reader` / `config.spellcheck`
+    if name == "reader":
+        return get_reader()
+    if name == "spellcheck":
+        return get_spellcheck()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
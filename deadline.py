@@ -0,0 +1,73 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from config import settings, to_boolean
+
+# sin checkpoints una grabacion cortada por el plazo vuelve a empezar de cero en cada corrida y nunca termina: el
+# plazo por defecto solo corre con CHECKPOINT_ENABLED
+DETECTION_TIMEOUT = float(settings.DETECTION_TIMEOUT) if to_boolean(str(settings.CHECKPOINT_ENABLED)) else 0.0
+CANCEL_CHECK_INTERVAL = 0.5  # segundos entre consultas del evento de cancelacion (puede vivir en otro proceso)
+
+
+class Deadline:
+    # Plazo y cancelacion cooperativos: los bucles largos preguntan expired() y cortan en un punto reanudable.
+    # El plazo usa el reloj monotono del sistema, asi que vale igual en los procesos de los tramos
+    def __init__(self, seconds: float = DETECTION_TIMEOUT, cancel_event: Optional[Any] = None) -> None:
+        self.seconds: float = seconds
+        self.expires_at: Optional[float] = time.monotonic() + seconds if seconds > 0 else None
+        # threading.Event, multiprocessing.Event o el proxy de un Manager: cualquier objeto con is_set()
+        self.cancel_event: Optional[Any] = cancel_event
+        self.reason: Optional[str] = None
+        self._next_check: float = 0.0
+
+    def cancel(self) -> None:
+        self.reason = "cancelled"
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+
+    def expired(self) -> bool:
+        if self.reason is not None:
+            return True
+        now = time.monotonic()
+        if self.expires_at is not None and now >= self.expires_at:
+            self.reason = "timeout"
+        elif self.cancel_event is not None and now >= self._next_check:
+            self._next_check = now + CANCEL_CHECK_INTERVAL
+            if self.cancel_event.is_set():
+                self.reason = "cancelled"
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        return None if self.expires_at is None else max(0.0, self.expires_at - time.monotonic())
+
+    def __getstate__(self) -> dict:
+        # a los procesos de los tramos solo viaja un evento que se pueda serializar (Manager o multiprocessing)
+        state = self.__dict__.copy()
+        if isinstance(state["cancel_event"], threading.Event):
+            state["cancel_event"] = None
+        return state
+
+
+@contextmanager
+def stop_on_expiry(deadline: Optional[Deadline], stop: Callable[[], None]) -> Iterator[None]:
+    # para codigo de terceros que no consulta el plazo pero se puede frenar desde otro hilo
+    if deadline is None:
+        yield
+        return
+    finished = threading.Event()
+
+    def watch() -> None:
+        while not finished.wait(CANCEL_CHECK_INTERVAL):
+            if deadline.expired():
+                stop()
+                return
+
+    watcher = threading.Thread(target=watch, name="deadline-watch", daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        finished.set()
+        watcher.join()
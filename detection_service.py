@@ -0,0 +1,545 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+import cv2
+from apscheduler.schedulers.background import BackgroundScheduler
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.routing import Map, Rule
+from werkzeug.serving import run_simple
+from werkzeug.wrappers import Request, Response
+
+import metrics
+from bumper_index import get_indexed_bumpers_dhashes
+from config import logger, settings
+from deadline import DETECTION_TIMEOUT, Deadline
+from tv_ad_detector import SCAN_MODE, init_detection_worker, placa_detector
+from utils import datetime_to_string, format_channel_name
+
+SERVICE_WORKERS = int(settings.SERVICE_WORKERS)
+SERVICE_QUEUE_SIZE = int(settings.SERVICE_QUEUE_SIZE)
+SERVICE_CHANNEL_CONCURRENCY = int(settings.SERVICE_CHANNEL_CONCURRENCY)
+SERVICE_WATCH_INTERVAL = float(settings.SERVICE_WATCH_INTERVAL)
+SERVICE_JOB_RETENTION = float(settings.SERVICE_JOB_RETENTION)
+SERVICE_MAX_FINISHED_JOBS = int(settings.SERVICE_MAX_FINISHED_JOBS)
+# grabaciones vigiladas que no se vuelven a encolar al reiniciar (con el mismo tamano)
+WATCH_FINAL_STATUSES = ("done", "error", "cancelled")
+VIDEO_EXTENSIONS = (".mp4", ".ts", ".mkv", ".avi", ".mov")
+THROUGHPUT_WINDOW_SECONDS = 600
+
+# fecha de inicio embebida en el nombre del archivo, ej: canal_2024-01-01_10-00-00.mp4 o 20240101100000.ts
+FILENAME_DATE_PATTERN = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})[ _T-]?(\d{2})[:-]?(\d{2})[:-]?(\d{2})")
+
+def _run_job(
+    video_file: str, channel: str, start_date_str: str, scan_mode: str, cancel_event: Optional[Any] = None
+) -> Tuple[Any, float, Optional[Dict[str, Any]]]:
+    # cada worker conserva el indice de bumpers del canal entre trabajos (ver load_bumper_index)
+    dhashes = get_indexed_bumpers_dhashes(channel)
+
+    cap = cv2.VideoCapture(video_file)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+    duration = frame_count / fps if fps > 0 else 0
+
+    # el pool ya reparte las grabaciones, cada una se escanea en un solo proceso; el plazo corre desde que arranca
+    deadline = Deadline(DETECTION_TIMEOUT, cancel_event)
+    with metrics.collect() as collected:
+        result = placa_detector(video_file, duration, dhashes, start_date_str, channel, scan_mode, 1, deadline)
+    return result, duration, collected.snapshot
+
+
+def start_date_from_filename(video_file: str) -> str:
+    match = FILENAME_DATE_PATTERN.search(os.path.basename(video_file))
+    if match:
+        try:
+            return datetime_to_string(datetime(*(int(group) for group in match.groups())))
+        except ValueError:
+            pass
+    return datetime.now().strftime("%Y-%m-%d 00:00:00")
+
+
+class DetectionJob:
+    def __init__(self, job_id: str, video_file: str, channel: str, start_date_str: str, scan_mode: str) -> None:
+        self.job_id: str = job_id
+        self.video_file: str = video_file
+        self.channel: str = channel
+        self.start_date_str: str = start_date_str
+        self.scan_mode: str = scan_mode
+        self.status: str = "queued"
+        self.result: Union[Dict[str, Any], str, None] = None
+        self.duration: float = 0
+        self.metrics: Optional[Dict[str, Any]] = None
+        # evento de un Manager: lo consulta el worker que corre el trabajo
+        self.cancel_event: Optional[Any] = None
+        self.cancel_requested: bool = False
+        self.submitted_at: float = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.job_id,
+            "video_file": self.video_file,
+            "channel": self.channel,
+            "start_date": self.start_date_str,
+            "scan_mode": self.scan_mode,
+            "status": self.status,
+            "cancel_requested": self.cancel_requested,
+            "result": self.result,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "metrics": self.metrics,
+        }
+
+
+class DetectionService:
+    def __init__(
+        self,
+        workers: int = SERVICE_WORKERS,
+        queue_size: int = SERVICE_QUEUE_SIZE,
+        channel_concurrency: int = SERVICE_CHANNEL_CONCURRENCY,
+        watch_dir: Optional[str] = settings.SERVICE_WATCH_DIR,
+        results_dir: Optional[str] = settings.SERVICE_RESULTS_DIR,
+        watch_interval: float = SERVICE_WATCH_INTERVAL,
+        watch_state_file: Optional[str] = settings.SERVICE_WATCH_STATE,
+        job_retention: float = SERVICE_JOB_RETENTION,
+        max_finished_jobs: int = SERVICE_MAX_FINISHED_JOBS,
+    ) -> None:
+        self.workers: int = max(1, workers)
+        self.queue_size: int = queue_size
+        self.channel_concurrency: int = max(1, channel_concurrency)
+        self.watch_dir: Optional[str] = watch_dir
+        self.results_dir: Optional[str] = results_dir
+        self.watch_interval: float = watch_interval
+        self.watch_state_file: Optional[str] = watch_state_file
+        self.job_retention: float = job_retention
+        self.max_finished_jobs: int = max(0, max_finished_jobs)
+
+        self._lock = threading.Condition()
+        self._queue: Deque[DetectionJob] = deque()
+        self._jobs: Dict[str, DetectionJob] = {}
+        self._finished_jobs: Deque[DetectionJob] = deque()  # terminados, en el orden en que terminaron
+        self._running: Dict[str, int] = {}
+        self._job_ids = itertools.count(1)
+        self._watch_sizes: Dict[str, int] = {}
+        self._watch_submitted: set = set()  # encoladas en esta corrida
+        # ruta -> {"size", "status"} de cada grabacion vigilada; se guarda para sobrevivir a un reinicio
+        self._watch_state: Dict[str, Dict[str, Any]] = {}
+        self._watch_state_changed: bool = False
+        self._finished: Deque[Tuple[float, float, float]] = deque()  # (fin, segundos de video, segundos de proceso)
+        self.completed: int = 0
+        self.failed: int = 0
+        self.terminated: int = 0
+        self.cancelled: int = 0
+        self.rejected: int = 0
+        self.started_at: float = time.time()
+        self._stopping: bool = False
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager: Optional[Any] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._scheduler: Optional[BackgroundScheduler] = None
+
+    def start(self) -> None:
+        # los eventos de cancelacion viven en un Manager para poder llegar a los workers ya creados
+        self._manager = multiprocessing.get_context("spawn").Manager()
+        self._executor = self._new_executor()
+        self._load_watch_state()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="detection-dispatcher", daemon=True)
+        self._dispatcher.start()
+        if self.watch_dir:
+            os.makedirs(self.watch_dir, exist_ok=True)
+            self._scheduler = BackgroundScheduler()
+            self._scheduler.add_job(
+                self.scan_watch_folders, "interval", seconds=self.watch_interval, next_run_time=datetime.now()
+            )
+            self._scheduler.start()
+        logger.info(f"Detection service started with {self.workers} workers")
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: cada worker carga su propio lector OCR una sola vez y lo reutiliza en todos los trabajos
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_detection_worker,
+        )
+
+    def _restart_executor(self, broken: ProcessPoolExecutor) -> None:
+        # un worker que muere (OOM, segfault en un decodificador) rompe el pool entero: se arma uno nuevo
+        with self._lock:
+            if self._executor is not broken or self._stopping:
+                return
+            logger.error(f"Detection worker pool broken, starting {self.workers} new workers")
+            self._executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self, wait: bool = True) -> None:
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        if self._manager is not None:
+            self._manager.shutdown()
+        with self._lock:
+            self._save_watch_state()
+
+    def submit(
+        self, video_file: str, channel: str, start_date_str: Optional[str] = None, scan_mode: str = SCAN_MODE
+    ) -> Optional[DetectionJob]:
+        with self._lock:
+            if len(self._queue) >= self.queue_size:
+                self.rejected += 1
+                return None
+            job = DetectionJob(
+                str(next(self._job_ids)),
+                video_file,
+                channel,
+                start_date_str or start_date_from_filename(video_file),
+                scan_mode,
+            )
+            self._jobs[job.job_id] = job
+            self._queue.append(job)
+            self._lock.notify_all()
+        logger.info(f"Queued job {job.job_id}: {video_file} for channel {channel}")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[DetectionJob]:
+        with self._lock:
+            self._evict_jobs()
+            return self._jobs.get(job_id)
+
+    def _job_finished(self, job: DetectionJob) -> None:
+        # con el lock tomado
+        self._finished_jobs.append(job)
+        self._update_watch_state(job)
+        self._evict_jobs()
+
+    def _evict_jobs(self) -> None:
+        # con el lock tomado: los trabajos terminados se olvidan pasado job_retention o si son mas de
+        # max_finished_jobs; GET /jobs/<id> pasa a dar 404 y el resultado queda en results_dir
+        now = time.time()
+        while self._finished_jobs and (
+            len(self._finished_jobs) > self.max_finished_jobs
+            or now - self._finished_jobs[0].finished_at > self.job_retention
+        ):
+            del self._jobs[self._finished_jobs.popleft().job_id]
+
+    def cancel(self, job_id: str) -> Optional[DetectionJob]:
+        # en cola se descarta; corriendo se avisa al worker, que corta en un punto reanudable y deja su checkpoint
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "queued":
+                self._queue.remove(job)
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                self.cancelled += 1
+                self._job_finished(job)
+            elif job.status == "running" and not job.cancel_requested:
+                job.cancel_requested = True
+                if job.cancel_event is not None:
+                    job.cancel_event.set()
+        logger.info(f"Cancel requested for job {job_id}: {job.status}")
+        return job
+
+    def _next_job(self) -> Optional[DetectionJob]:
+        # el primer trabajo en cola cuyo canal no llego a su limite; los demas conservan su orden
+        for job in self._queue:
+            if self._running.get(job.channel, 0) < self.channel_concurrency:
+                self._queue.remove(job)
+                return job
+        return None
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._lock:
+                job = None
+                while not self._stopping:
+                    if sum(self._running.values()) < self.workers:
+                        job = self._next_job()
+                        if job is not None:
+                            break
+                    self._lock.wait()
+                if self._stopping:
+                    return
+                self._running[job.channel] = self._running.get(job.channel, 0) + 1
+                job.status = "running"
+                job.started_at = time.time()
+                job.cancel_event = self._manager.Event() if self._manager is not None else None
+                executor = self._executor
+            try:
+                future = executor.submit(
+                    _run_job, job.video_file, job.channel, job.start_date_str, job.scan_mode, job.cancel_event
+                )
+            except BrokenProcessPool as e:
+                # el trabajo falla y libera su lugar; el despachador sigue con un pool nuevo
+                logger.error(f"Job {job.job_id} failed: {e}")
+                self._restart_executor(executor)
+                self._finish(job, "ERROR", 0, None)
+                continue
+            future.add_done_callback(lambda done, job=job, executor=executor: self._on_done(job, done, executor))
+
+    def _on_done(self, job: DetectionJob, future: Future, executor: ProcessPoolExecutor) -> None:
+        try:
+            result, duration, job_metrics = future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"Job {job.job_id} failed: {e}")
+            result, duration, job_metrics = "ERROR", 0, None
+            self._restart_executor(executor)
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {e}")
+            result, duration, job_metrics = "ERROR", 0, None
+        self._finish(job, result, duration, job_metrics)
+
+    def _finish(
+        self,
+        job: DetectionJob,
+        result: Union[Dict[str, Any], str],
+        duration: float,
+        job_metrics: Optional[Dict[str, Any]],
+    ) -> None:
+        # los trabajos corren en otros procesos: el total del servicio se arma con lo que devuelve cada uno
+        metrics.merge(job_metrics)
+        with self._lock:
+            job.result = result
+            job.duration = duration
+            job.metrics = job_metrics
+            job.finished_at = time.time()
+            job.cancel_event = None
+            if type(result) is dict and result.get("status") == "TERMINATED":
+                # plazo vencido o cancelado: resultado parcial, la grabacion se puede reencolar y sigue del checkpoint
+                job.status = "terminated"
+                self.terminated += 1
+            elif type(result) is str:
+                job.status = "error"
+                self.failed += 1
+            else:
+                job.status = "done"
+                self.completed += 1
+            self._finished.append((job.finished_at, duration, job.finished_at - job.started_at))
+            self._running[job.channel] -= 1
+            if self._running[job.channel] == 0:
+                del self._running[job.channel]
+            self._job_finished(job)
+            self._lock.notify_all()
+        self._save_result(job)
+        logger.info(f"Job {job.job_id} {job.status}: {job.video_file}")
+
+    def _save_result(self, job: DetectionJob) -> None:
+        if not self.results_dir or job.status not in ("done", "terminated"):
+            return
+        channel_dir = os.path.join(self.results_dir, format_channel_name(job.channel))
+        os.makedirs(channel_dir, exist_ok=True)
+        result_file = os.path.join(channel_dir, os.path.splitext(os.path.basename(job.video_file))[0] + ".json")
+        with open(result_file, "w") as f:
+            json.dump(job.to_dict(), f, indent=2)
+
+    def _load_watch_state(self) -> None:
+        if not self.watch_state_file or not os.path.exists(self.watch_state_file):
+            return
+        try:
+            with open(self.watch_state_file, "r") as state_file:
+                self._watch_state = {path: dict(entry) for path, entry in json.load(state_file).items()}
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Watch state {self.watch_state_file} unreadable, starting empty: {e}")
+            self._watch_state = {}
+
+    def _save_watch_state(self) -> None:
+        # con el lock tomado; se escribe una vez por pasada de scan_watch_folders y al parar, no en cada trabajo
+        if not self.watch_state_file or not self._watch_state_changed:
+            return
+        self._watch_state_changed = False
+        os.makedirs(os.path.dirname(self.watch_state_file) or ".", exist_ok=True)
+        tmp_path = f"{self.watch_state_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as state_file:
+            json.dump(self._watch_state, state_file)
+        os.replace(tmp_path, self.watch_state_file)
+
+    def _update_watch_state(self, job: DetectionJob) -> None:
+        # con el lock tomado; solo para las grabaciones que entraron por las carpetas vigiladas
+        entry = self._watch_state.get(job.video_file)
+        if entry is None:
+            return
+        status = job.status
+        if status == "terminated" and job.result.get("reason") == "cancelled":
+            # cancelado a pedido: no se reencola al reiniciar
+            status = "cancelled"
+        entry["status"] = status
+        self._watch_state_changed = True
+
+    def _prune_watch_state(self) -> None:
+        # con el lock tomado: las grabaciones borradas de las carpetas vigiladas se olvidan. Las que siguen ahi se
+        # conservan aunque sean viejas: sin su estado se volverian a encolar
+        for path in [path for path in self._watch_state if not os.path.exists(path)]:
+            del self._watch_state[path]
+            self._watch_state_changed = True
+        for path in [path for path in self._watch_submitted if not os.path.exists(path)]:
+            self._watch_submitted.discard(path)
+        for path in [path for path in self._watch_sizes if not os.path.exists(path)]:
+            del self._watch_sizes[path]
+
+    def scan_watch_folders(self) -> None:
+        # watch_dir/<canal>/<grabacion>: un archivo se encola cuando su tamano no cambio entre dos pasadas.
+        # Al reiniciar no se encolan de nuevo las ya terminadas; las que quedaron en cola, corriendo o cortadas
+        # por el plazo se reencolan enseguida (con checkpoints siguen desde donde quedaron)
+        with self._lock:
+            self._prune_watch_state()
+        try:
+            self._scan_watch_folders()
+        finally:
+            with self._lock:
+                self._save_watch_state()
+
+    def _scan_watch_folders(self) -> None:
+        for channel in sorted(os.listdir(self.watch_dir)):
+            channel_dir = os.path.join(self.watch_dir, channel)
+            if not os.path.isdir(channel_dir):
+                continue
+            for file in sorted(os.listdir(channel_dir)):
+                path = os.path.join(channel_dir, file)
+                if path in self._watch_submitted or not file.lower().endswith(VIDEO_EXTENSIONS):
+                    continue
+                size = os.path.getsize(path)
+                with self._lock:
+                    entry = self._watch_state.get(path)
+                if entry is not None and entry.get("size") == size:
+                    if entry.get("status") in WATCH_FINAL_STATUSES:
+                        continue
+                elif self._watch_sizes.get(path) != size:
+                    self._watch_sizes[path] = size
+                    continue
+                with self._lock:
+                    # antes de encolar: un trabajo corto podria terminar antes de registrarse
+                    self._watch_state[path] = {"size": size, "status": "queued"}
+                    self._watch_state_changed = True
+                if self.submit(path, channel) is None:
+                    # cola llena: se reintenta en la proxima pasada
+                    return
+                self._watch_submitted.add(path)
+                self._watch_sizes.pop(path, None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            while self._finished and now - self._finished[0][0] > THROUGHPUT_WINDOW_SECONDS:
+                self._finished.popleft()
+            window = min(THROUGHPUT_WINDOW_SECONDS, now - self.started_at) or 1
+            video_seconds = sum(finished[1] for finished in self._finished)
+            busy_seconds = sum(finished[2] for finished in self._finished)
+            queued_per_channel: Dict[str, int] = {}
+            for job in self._queue:
+                queued_per_channel[job.channel] = queued_per_channel.get(job.channel, 0) + 1
+            return {
+                "queue_depth": len(self._queue),
+                "queue_size": self.queue_size,
+                "queued_per_channel": queued_per_channel,
+                "running": sum(self._running.values()),
+                "running_per_channel": dict(self._running),
+                "workers": self.workers,
+                "completed": self.completed,
+                "failed": self.failed,
+                "terminated": self.terminated,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+                "jobs_per_minute": len(self._finished) * 60 / window,
+                "video_seconds_per_second": video_seconds / window,
+                "realtime_factor": video_seconds / busy_seconds if busy_seconds else None,
+                "uptime_seconds": now - self.started_at,
+            }
+
+
+class DetectionAPI:
+    def __init__(self, service: DetectionService) -> None:
+        self.service: DetectionService = service
+        self.url_map = Map(
+            [
+                Rule("/jobs", endpoint="submit", methods=["POST"]),
+                Rule("/jobs/<job_id>", endpoint="job", methods=["GET"]),
+                Rule("/jobs/<job_id>", endpoint="cancel", methods=["DELETE"]),
+                Rule("/stats", endpoint="stats", methods=["GET"]),
+                Rule("/metrics", endpoint="metrics", methods=["GET"]),
+            ]
+        )
+
+    def json_response(self, data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+        return Response(json.dumps(data), status=status, headers=headers, mimetype="application/json")
+
+    def on_submit(self, request: Request) -> Response:
+        data = request.get_json(silent=True) or {}
+        video_file, channel = data.get("video_file"), data.get("channel")
+        if not video_file or not channel:
+            return self.json_response({"error": "video_file and channel are required"}, 400)
+        if not os.path.isfile(video_file):
+            return self.json_response({"error": f"{video_file} not found"}, 404)
+        job = self.service.submit(video_file, channel, data.get("start_date"), data.get("scan_mode") or SCAN_MODE)
+        if job is None:
+            return self.json_response({"error": "queue is full"}, 503, {"Retry-After": "30"})
+        return self.json_response(job.to_dict(), 202)
+
+    def on_job(self, request: Request, job_id: str) -> Response:
+        job = self.service.get_job(job_id)
+        if job is None:
+            raise NotFound()
+        return self.json_response(job.to_dict())
+
+    def on_cancel(self, request: Request, job_id: str) -> Response:
+        job = self.service.cancel(job_id)
+        if job is None:
+            raise NotFound()
+        return self.json_response(job.to_dict(), 202)
+
+    def on_stats(self, request: Request) -> Response:
+        return self.json_response(self.service.stats())
+
+    def on_metrics(self, request: Request) -> Response:
+        # formato de texto de Prometheus: etapas sumadas de todos los trabajos y estado de la cola
+        gauges = {
+            "service_" + name: value
+            for name, value in self.service.stats().items()
+            if type(value) in (int, float)
+        }
+        return Response(metrics.to_prometheus(gauges=gauges), mimetype="text/plain; version=0.0.4")
+
+    def __call__(self, environ: Dict[str, Any], start_response: Any) -> List[bytes]:
+        request = Request(environ)
+        adapter = self.url_map.bind_to_environ(environ)
+        try:
+            endpoint, values = adapter.match()
+            response = getattr(self, f"on_{endpoint}")(request, **values)
+        except HTTPException as e:
+            response = e
+        return response(environ, start_response)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TV Ad Detector - multi channel service")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Warm detection processes")
+    parser.add_argument("--watch_dir", type=str, default=settings.SERVICE_WATCH_DIR, help="One subfolder per channel")
+    parser.add_argument("--host", type=str, default=settings.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=int(settings.SERVICE_PORT))
+    args = parser.parse_args()
+
+    service = DetectionService(workers=args.workers, watch_dir=args.watch_dir)
+    service.start()
+    try:
+        run_simple(args.host, args.port, DetectionAPI(service), threaded=True)
+    finally:
+        service.stop()
@@ -0,0 +1,145 @@
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import imagehash
+import numpy as np
+from PIL import Image
+
+DHASH_SIZE: int = 8
+NO_MATCH_DISTANCE: int = DHASH_SIZE * DHASH_SIZE + 1
+PREFILTER_SCALE: int = 16
+# cambia con el calculo del hash: los indices y tracks guardados con otra version se vuelven a calcular
+DHASH_VERSION: int = 2
+
+HashLike = Union[int, np.integer, str, imagehash.ImageHash]
+
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.int64)
+    # numpy < 2.0 no tiene bitwise_count: se cuenta por bytes con una tabla
+    as_bytes = values.view(np.uint8).reshape(values.shape + (8,))
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.int64)
+
+
+def _resize_to_hash_grid(frame: Any) -> np.ndarray:
+    # Mismo orden y filtro que imagehash.dhash: gris y despues Lanczos a 9x8. Antes de Lanczos se reduce por
+    # area a PREFILTER_SCALE veces la grilla: evita el Lanczos sobre el frame HD y solo cambia bits de columnas
+    # vecinas casi iguales (hasta 3 de 64 en los frames sinteticos, ver tests/test_dhash.py)
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    height, width = frame.shape
+    prefilter_size = ((DHASH_SIZE + 1) * PREFILTER_SCALE, DHASH_SIZE * PREFILTER_SCALE)
+    if width > prefilter_size[0] and height > prefilter_size[1]:
+        frame = cv2.resize(frame, prefilter_size, interpolation=cv2.INTER_AREA)
+    return np.asarray(Image.fromarray(frame).resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS))
+
+
+def dhash_bits(frame: Any) -> np.ndarray:
+    small = _resize_to_hash_grid(frame)
+    return small[:, 1:] > small[:, :-1]
+
+
+def bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(np.asarray(bits, dtype=bool).ravel()).tobytes(), "big")
+
+
+def int_to_bits(value: int) -> np.ndarray:
+    as_bytes = np.frombuffer(int(value).to_bytes(8, "big"), dtype=np.uint8)
+    return np.unpackbits(as_bytes).astype(bool).reshape(DHASH_SIZE, DHASH_SIZE)
+
+
+def compute_dhash(frame: Any) -> int:
+    return bits_to_int(dhash_bits(frame))
+
+
+def compute_dhashes(frames: Sequence[Any]) -> np.ndarray:
+    if len(frames) == 0:
+        return np.empty(0, dtype=np.uint64)
+    bits = np.stack([dhash_bits(frame).ravel() for frame in frames])
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def hash_to_int(value: HashLike) -> int:
+    if isinstance(value, imagehash.ImageHash):
+        return bits_to_int(value.hash)
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value)
+
+
+def int_to_hex(value: int) -> str:
+    return f"{int(value):016x}"
+
+
+def int_to_imagehash(value: int) -> imagehash.ImageHash:
+    return imagehash.ImageHash(int_to_bits(value))
+
+
+def to_hash_array(hashes: Iterable[HashLike]) -> np.ndarray:
+    return np.array([hash_to_int(h) for h in hashes], dtype=np.uint64)
+
+
+class DHashMatcher:
+    def __init__(self, hashes: Iterable[HashLike] = ()) -> None:
+        self.hashes: np.ndarray = to_hash_array(hashes)
+
+    def __len__(self) -> int:
+        return int(self.hashes.shape[0])
+
+    def add(self, hashes: Iterable[HashLike]) -> None:
+        self.hashes = np.concatenate([self.hashes, to_hash_array(hashes)])
+
+    def distances(self, frame_hash: HashLike) -> np.ndarray:
+        return popcount64(np.bitwise_xor(self.hashes, np.uint64(hash_to_int(frame_hash))))
+
+    def distances_batch(self, frame_hashes: Union[np.ndarray, Iterable[HashLike]]) -> np.ndarray:
+        queries = frame_hashes if isinstance(frame_hashes, np.ndarray) else to_hash_array(frame_hashes)
+        queries = queries.astype(np.uint64, copy=False)
+        return popcount64(np.bitwise_xor(queries[:, None], self.hashes[None, :]))
+
+    def nearest(self, frame_hash: HashLike) -> Tuple[int, int]:
+        if len(self) == 0:
+            return -1, NO_MATCH_DISTANCE
+        distances = self.distances(frame_hash)
+        index = int(np.argmin(distances))
+        return index, int(distances[index])
+
+    def unique_match(self, frame_hash: HashLike, threshold: int) -> Optional[int]:
+        # hash guardado que matchea el frame si es el unico a menos de threshold; con dos o mas (placas del mismo
+        # diseno, o con el mismo dhash) no se sabe cual de ellas es y devuelve None, igual que sin match
+        distances = self.distances(frame_hash)
+        matched = np.flatnonzero(distances < threshold)
+        if len(matched) != 1:
+            return None
+        return int(self.hashes[matched[0]])
+
+    def unique_matches(self, frame_hashes: Iterable[HashLike], threshold: int) -> List[Optional[int]]:
+        return [self.unique_match(frame_hash, threshold) for frame_hash in frame_hashes]
+
+    def min_distance(self, frame_hash: HashLike) -> int:
+        return self.nearest(frame_hash)[1]
+
+    def is_match(self, frame_hash: HashLike, threshold: int) -> bool:
+        return self.min_distance(frame_hash) < threshold
+
+    def nearest_batch(self, frame_hashes: Union[np.ndarray, Iterable[HashLike]]) -> Tuple[np.ndarray, np.ndarray]:
+        queries = frame_hashes if isinstance(frame_hashes, np.ndarray) else to_hash_array(frame_hashes)
+        if len(self) == 0 or len(queries) == 0:
+            return (
+                np.full(len(queries), -1, dtype=np.int64),
+                np.full(len(queries), NO_MATCH_DISTANCE, dtype=np.int64),
+            )
+        distances = self.distances_batch(queries)
+        indexes = np.argmin(distances, axis=1)
+        return indexes, distances[np.arange(len(queries)), indexes]
+
+    def match_batch(self, frame_hashes: Union[np.ndarray, Iterable[HashLike]], threshold: int) -> np.ndarray:
+        return self.nearest_batch(frame_hashes)[1] < threshold
+
+
+def match_frames(frames: Sequence[Any], matcher: DHashMatcher, threshold: int) -> List[bool]:
+    return matcher.match_batch(compute_dhashes(frames), threshold).tolist()
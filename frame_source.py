@@ -0,0 +1,323 @@
+import queue
+import re
+import shutil
+import subprocess
+import threading
+from typing import Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import logger, settings
+
+DECODE_BACKEND: str = settings.DECODE_BACKEND
+FFMPEG_BINARY: str = settings.FFMPEG_BINARY
+FFMPEG_THREADS = int(settings.FFMPEG_THREADS)
+FULL_FRAME_SEEK_GAP_SECONDS = 5  # mas cerca que esto se avanza con grab() en lugar de hacer seek
+SHOWINFO_PTS = re.compile(rb"pts_time:\s*(-?[0-9.]+)")
+
+
+class FrameSource:
+    # Fuente de frames secuencial; los consumidores solo dependen de esta interfaz.
+    # every=N entrega uno de cada N frames (los que cumplen frame_counter % N == 0, contando desde 1).
+    # Con OpenCV los frames salen siempre a resolucion completa y en BGR: width/height/gray se ignoran
+    # y cada consumidor reduce lo que necesite
+    scaled: bool = False
+    # True si read() devuelve siempre el mismo array: quien guarde frames entre lecturas tiene que copiarlos
+    reuses_buffer: bool = False
+
+    def __init__(
+        self,
+        video_file: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        gray: bool = False,
+        every: int = 1,
+    ) -> None:
+        self.video_file: str = video_file
+        self.every: int = max(1, every)
+        self.cap = cv2.VideoCapture(video_file)
+        self.frame_index: int = -1  # indice desde 0 del ultimo frame entregado
+        self._last_frame: Optional[Any] = None
+        self._full_cap: Optional[Any] = None
+        self._full_next: int = 0
+        self._skip: int = 0  # frames ya salteados por seek() en el paso de every en curso
+
+    @property
+    def fps(self) -> float:
+        return self.cap.get(cv2.CAP_PROP_FPS)
+
+    @property
+    def frame_count(self) -> int:
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    @property
+    def width(self) -> int:
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+
+    @property
+    def height(self) -> int:
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    @property
+    def position_msec(self) -> float:
+        return self.cap.get(cv2.CAP_PROP_POS_MSEC)
+
+    def is_opened(self) -> bool:
+        return self.cap.isOpened()
+
+    def grab(self) -> bool:
+        ret = True
+        for _ in range(self.every - self._skip):
+            ret = self.cap.grab()
+            self.frame_index += 1
+        self._skip = 0
+        self._last_frame = None
+        return ret
+
+    def retrieve(self) -> Tuple[bool, Optional[Any]]:
+        ret, self._last_frame = self.cap.retrieve()
+        return ret, self._last_frame
+
+    def read(self) -> Tuple[bool, Optional[Any]]:
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def seek(self, frame_index: int) -> None:
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        self.frame_index = frame_index - 1
+        # el muestreo sigue la misma grilla que sin seek, como FFmpegFrameSource
+        self._skip = frame_index % self.every
+        self._last_frame = None
+
+    def full_frame(self, frame_index: int) -> Optional[Any]:
+        # frame BGR a resolucion completa para OCR; se lee con otra captura para no mover la principal
+        if frame_index == self.frame_index and self._last_frame is not None:
+            return self._last_frame
+        if self._full_cap is None:
+            self._full_cap = cv2.VideoCapture(self.video_file)
+            self._full_next = 0
+        if not 0 <= frame_index - self._full_next <= FULL_FRAME_SEEK_GAP_SECONDS * (self.fps or 25):
+            self._full_cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            self._full_next = frame_index
+        while self._full_next < frame_index:
+            self._full_cap.grab()
+            self._full_next += 1
+        ret, frame = self._full_cap.read()
+        self._full_next += 1
+        return frame if ret else None
+
+    def release(self) -> None:
+        self.cap.release()
+        if self._full_cap is not None:
+            self._full_cap.release()
+
+
+class FFmpegFrameSource(FrameSource):
+    # ffmpeg decodifica, muestrea (select), reduce (scale) y convierte (format) dentro del decodificador;
+    # cada frame crudo se lee sobre el mismo buffer de numpy, sin reservar memoria por frame.
+    # Los frames completos para OCR se piden aparte con full_frame()
+    reuses_buffer = True
+    # opciones del decodificador, van antes de -i
+    decode_options: List[str] = []
+    log_level: str = "error"
+
+    def __init__(
+        self,
+        video_file: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        gray: bool = False,
+        every: int = 1,
+    ) -> None:
+        self.video_file = video_file
+        self.every = max(1, every)
+        # OpenCV solo se usa para los metadatos y, bajo demanda, para los frames completos
+        self._probe = cv2.VideoCapture(video_file)
+        self._fps: float = self._probe.get(cv2.CAP_PROP_FPS)
+        self._frame_count: int = int(self._probe.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._width: int = int(self._probe.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self._height: int = int(self._probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.out_width: int = width or self._width
+        self.out_height: int = height or self._height
+        self.scaled = (self.out_width, self.out_height) != (self._width, self._height) or gray
+        self.gray: bool = gray
+        shape = (self.out_height, self.out_width) if gray else (self.out_height, self.out_width, 3)
+        self._buffer: np.ndarray = np.empty(shape, dtype=np.uint8)
+        self._view = memoryview(self._buffer.reshape(-1))
+        # el buffer se reutiliza: full_frame() nunca lo devuelve, siempre lee una copia aparte
+        self._last_frame = None
+        self._full_cap = None
+        self._full_next = 0
+        self.frame_index = -1
+        self.proc: Optional[subprocess.Popen] = None
+        self._start(0)
+
+    def _filters(self, start_frame: int) -> List[str]:
+        filters: List[str] = []
+        if self.every > 1:
+            # n cuenta desde 0 a partir del punto de inicio
+            filters.append(f"select=not(mod(n+{start_frame + 1}\\,{self.every}))")
+        if (self.out_width, self.out_height) != (self._width, self._height):
+            filters.append(f"scale={self.out_width}:{self.out_height}:flags=area")
+        return filters
+
+    def _command(self, start_frame: int) -> List[str]:
+        filters = self._filters(start_frame)
+        command = [FFMPEG_BINARY, "-nostdin", "-v", self.log_level]
+        if FFMPEG_THREADS > 0:
+            command += ["-threads", str(FFMPEG_THREADS)]
+        command += self.decode_options
+        if start_frame > 0 and self._fps > 0:
+            command += ["-ss", f"{start_frame / self._fps:.6f}"]
+        command += ["-i", self.video_file, "-an", "-sn"]
+        if filters:
+            command += ["-vf", ",".join(filters)]
+        command += ["-vsync", "passthrough", "-f", "rawvideo", "-pix_fmt", "gray" if self.gray else "bgr24", "pipe:1"]
+        return command
+
+    def _start(self, start_frame: int) -> None:
+        if self.proc is not None:
+            self._stop()
+        self._start_frame: int = start_frame
+        self._output_frames: int = 0
+        self.proc = subprocess.Popen(self._command(start_frame), stdout=subprocess.PIPE, bufsize=0)
+
+    def _stop(self) -> None:
+        # kill antes de cerrar el pipe: si no ffmpeg alcanza a quejarse del broken pipe en stderr
+        self.proc.kill()
+        self.proc.stdout.close()
+        self.proc.wait()
+        self.proc = None
+
+    @property
+    def fps(self) -> float:
+        return self._fps
+
+    @property
+    def frame_count(self) -> int:
+        return self._frame_count
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def position_msec(self) -> float:
+        return self.frame_index * 1000.0 / self._fps if self._fps > 0 else 0.0
+
+    def is_opened(self) -> bool:
+        return self.proc is not None
+
+    def _fill(self) -> bool:
+        filled = 0
+        while filled < len(self._view):
+            read = self.proc.stdout.readinto(self._view[filled:])
+            if not read:
+                return False
+            filled += read
+        return True
+
+    def read(self) -> Tuple[bool, Optional[Any]]:
+        if self.proc is None or not self._fill():
+            return False, None
+        self._output_frames += 1
+        start = self._start_frame
+        # primer frame de salida: el primer indice >= start con (indice + 1) % every == 0
+        first = start + (-(start + 1)) % self.every
+        self.frame_index = first + (self._output_frames - 1) * self.every
+        return True, self._buffer
+
+    def grab(self) -> bool:
+        return self.read()[0]
+
+    def retrieve(self) -> Tuple[bool, Optional[Any]]:
+        return self.frame_index >= 0, self._buffer
+
+    def seek(self, frame_index: int) -> None:
+        self._start(frame_index)
+        self.frame_index = frame_index - 1
+
+    def release(self) -> None:
+        if self.proc is not None:
+            self._stop()
+        if self._full_cap is not None:
+            self._full_cap.release()
+        self._probe.release()
+
+
+class FFmpegKeyframeSource(FFmpegFrameSource):
+    # Solo keyframes: con -skip_frame nokey el decodificador descarta los demas frames sin decodificarlos, asi que
+    # el costo depende del GOP y no de la duracion. Los keyframes no tienen paso fijo: el indice de cada uno sale
+    # del pts_time que showinfo escribe en stderr. every se ignora
+    decode_options = ["-skip_frame", "nokey"]
+    log_level = "info"
+
+    def __init__(
+        self, video_file: str, width: Optional[int] = None, height: Optional[int] = None, gray: bool = False
+    ) -> None:
+        super().__init__(video_file, width, height, gray)
+
+    def _filters(self, start_frame: int) -> List[str]:
+        return ["showinfo"] + super()._filters(start_frame)
+
+    def _start(self, start_frame: int) -> None:
+        if self.proc is not None:
+            self._stop()
+        self._start_frame = start_frame
+        self._output_frames = 0
+        self._pts: queue.Queue = queue.Queue()
+        self.proc = subprocess.Popen(
+            self._command(start_frame), stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
+        )
+        threading.Thread(target=self._read_pts, args=(self.proc.stderr, self._pts), daemon=True).start()
+
+    @staticmethod
+    def _read_pts(stderr: Any, pts: queue.Queue) -> None:
+        # showinfo escribe cada frame antes de que llegue a stdout
+        for line in iter(stderr.readline, b""):
+            match = SHOWINFO_PTS.search(line)
+            if match:
+                pts.put(float(match.group(1)))
+        stderr.close()
+        pts.put(None)
+
+    def read(self) -> Tuple[bool, Optional[Any]]:
+        if self.proc is None or not self._fill():
+            return False, None
+        pts_time = self._pts.get()
+        if pts_time is None:
+            return False, None
+        self._output_frames += 1
+        # los pts arrancan en 0 en el punto de inicio
+        self.frame_index = self._start_frame + round(pts_time * self._fps)
+        return True, self._buffer
+
+
+def open_keyframe_source(
+    video_file: str, width: Optional[int] = None, height: Optional[int] = None, gray: bool = False
+) -> Optional[FrameSource]:
+    # OpenCV no puede saltear la decodificacion de los frames que no son keyframes
+    if shutil.which(FFMPEG_BINARY) is None:
+        return None
+    return FFmpegKeyframeSource(video_file, width, height, gray)
+
+
+def open_frame_source(
+    video_file: str,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    gray: bool = False,
+    every: int = 1,
+    backend: str = DECODE_BACKEND,
+) -> FrameSource:
+    if backend == "ffmpeg":
+        if shutil.which(FFMPEG_BINARY) is not None:
+            return FFmpegFrameSource(video_file, width, height, gray, every)
+        logger.warning(f"{FFMPEG_BINARY} not found, decoding {video_file} with OpenCV")
+    return FrameSource(video_file, width, height, gray, every)
@@ -0,0 +1,281 @@
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+import metrics
+from bumper_index import get_indexed_bumpers_dhashes
+from config import logger, settings
+from deadline import Deadline
+from dhash_engine import DHashMatcher, compute_dhash
+from frame_source import FrameSource, open_frame_source
+from hash_track import HashTrackWriter, matched_frame_events
+from ocr_batch import OCRBatcher, load_text_gate
+from ocr_cache import OCRCache
+from text_region import TextRegion
+from shot_boundary_detection import (
+    CANDIDATE_FRAME_STEP,
+    CONTENT_THRESHOLD,
+    SBD_DOWNSCALE,
+    BumperCandidates,
+    save_bumper_candidates,
+    scene_candidate_frames,
+)
+
+DHASH_THRESHOLD = int(settings.DHASH_THRESHOLD)
+DHASH_FREQUENCY = int(settings.DHASH_FREQUENCY)
+MAX_CORRUPT_FRAMES = int(settings.MAX_CORRUPT_FRAMES)
+VIDEO_END_PADDING_FRAMES = int(settings.VIDEO_END_PADDING_FRAMES)
+MIN_SCENE_LEN = 15  # frames, igual que ContentDetector
+DOWNSCALE_MIN_WIDTH = 256  # ancho minimo al que PySceneDetect reduce los frames
+
+placa_inicio: str = settings.START_EVENT_NAME
+placa_fin: str = settings.END_EVENT_NAME
+
+
+class FrameConsumer:
+    # Cada consumidor recibe todos los frames decodificados, en orden, con su indice desde 0
+    def on_frame(self, frame_index: int, position_msec: float, frame: Any) -> None:
+        pass
+
+    def finish(self, frame_total: int) -> None:
+        pass
+
+
+class ContentChangeScorer(FrameConsumer):
+    # Misma medida que ContentDetector: diferencia media de H, S y V entre frames consecutivos reducidos
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        threshold: float = CONTENT_THRESHOLD,
+        min_scene_len: int = MIN_SCENE_LEN,
+        downscale: int = SBD_DOWNSCALE,
+        on_cut: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        self.threshold: float = threshold
+        self.min_scene_len: int = min_scene_len
+        self.downscale: int = downscale if downscale > 0 else max(1, width // DOWNSCALE_MIN_WIDTH)
+        self.size: Tuple[int, int] = (max(1, round(width / self.downscale)), max(1, round(height / self.downscale)))
+        self.on_cut: Optional[Callable[[int], None]] = on_cut
+        self.cuts: List[int] = []
+        self._last_hsv: Optional[np.ndarray] = None
+        self._last_cut: Optional[int] = None
+
+    def score(self, hsv: np.ndarray) -> float:
+        if self._last_hsv is None:
+            return 0.0
+        return sum(cv2.mean(cv2.absdiff(hsv, self._last_hsv))[:3]) / 3.0
+
+    def on_frame(self, frame_index: int, position_msec: float, frame: Any) -> None:
+        # una fuente que ya entrega la miniatura evita el resize
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_LINEAR)
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        if self._last_cut is None:
+            self._last_cut = frame_index
+        frame_score = self.score(hsv)
+        self._last_hsv = hsv
+        if frame_score >= self.threshold and frame_index - self._last_cut >= self.min_scene_len:
+            self.cuts.append(frame_index)
+            self._last_cut = frame_index
+            if self.on_cut is not None:
+                self.on_cut(frame_index)
+
+
+class SceneCandidateBuffer(FrameConsumer):
+    # Guarda solo los frames de la escena actual que podrian ser candidatos (uno cada CANDIDATE_FRAME_STEP,
+    # hasta BUMPER_TIME_WINDOW[1]); al cerrarse la escena entrega los que correspondan y se vacia
+    def __init__(
+        self,
+        fps: float,
+        on_candidate: Callable[[int, Any], None],
+        step: int = CANDIDATE_FRAME_STEP,
+        full_frame: Optional[Callable[[int], Any]] = None,
+    ) -> None:
+        self.fps: float = fps
+        self.on_candidate: Callable[[int, Any], None] = on_candidate
+        # si la fuente entrega miniaturas solo se guardan los indices y el frame completo se pide al final
+        self.full_frame: Optional[Callable[[int], Any]] = full_frame
+        self.step: int = step
+        self.scene_start: int = 0
+        self.scenes: int = 0
+        self._max_offset_seconds: float = float(settings.BUMPER_TIME_WINDOW[1])
+        self._buffer: Deque[Tuple[int, Any]] = deque(maxlen=int(self._max_offset_seconds * fps / step) + 2)
+
+    def on_cut(self, frame_index: int) -> None:
+        self._close_scene(frame_index)
+        self.scene_start = frame_index
+
+    def _close_scene(self, end_index: int) -> None:
+        self.scenes += 1
+        duration = (end_index - self.scene_start) / self.fps
+        wanted = set(
+            scene_candidate_frames(np.array([self.scene_start]), np.array([duration]), int(self.fps), self.step).tolist()
+        )
+        # las escenas no se solapan, asi que cada candidato sale de una sola escena (como en unique_scene_frames)
+        for frame_index, frame in self._buffer:
+            if frame_index in wanted:
+                if self.full_frame is not None:
+                    frame = self.full_frame(frame_index)
+                if frame is not None:
+                    self.on_candidate(frame_index, frame)
+        self._buffer.clear()
+
+    def on_frame(self, frame_index: int, position_msec: float, frame: Any) -> None:
+        offset = frame_index - self.scene_start
+        if offset > 0 and offset % self.step == 0 and offset / self.fps < self._max_offset_seconds:
+            # la fuente puede reutilizar el buffer del frame
+            self._buffer.append((frame_index, None if self.full_frame is not None else frame.copy()))
+
+    def finish(self, frame_total: int) -> None:
+        self._close_scene(frame_total)
+
+
+class DHashSampler(FrameConsumer):
+    # Mismo muestreo que bumper_dhash_detector en modo dense: contador desde 1, uno cada DHASH_FREQUENCY
+    def __init__(self, frame_count: int) -> None:
+        self.limit: int = frame_count - VIDEO_END_PADDING_FRAMES
+        self.frame_counters: List[int] = []
+        self.positions_msec: List[float] = []
+        self.hashes: List[int] = []
+
+    def on_frame(self, frame_index: int, position_msec: float, frame: Any) -> None:
+        frame_counter = frame_index + 1
+        if frame_counter % DHASH_FREQUENCY == 0 and frame_counter < self.limit:
+            self.frame_counters.append(frame_counter)
+            self.positions_msec.append(position_msec)
+            self.hashes.append(compute_dhash(frame))
+
+    def finish(self, frame_total: int) -> None:
+        metrics.inc("frames_hashed", len(self.hashes))
+
+
+@metrics.timed("fused_pipeline")
+def run_pipeline(
+    source: FrameSource, consumers: List[FrameConsumer], deadline: Optional[Deadline] = None
+) -> Union[int, str]:
+    # con el plazo vencido se corta ahi: los consumidores cierran con lo que vieron y se devuelve el frame alcanzado
+    frame_count = source.frame_count
+    frame_index = 0
+    corrupt_frames = 0
+    decode_seconds = 0.0
+    while source.is_opened():
+        if deadline is not None and deadline.expired():
+            break
+        tick = metrics.clock()
+        ret, frame = source.read()
+        decode_seconds += metrics.clock() - tick
+        if not ret:
+            if frame_count <= 0 or frame_index >= frame_count - VIDEO_END_PADDING_FRAMES:
+                break
+            corrupt_frames += 1
+            frame_index += 1
+            if corrupt_frames >= MAX_CORRUPT_FRAMES:
+                metrics.inc("corrupt_frames", corrupt_frames)
+                return "CORRUPT"
+            continue
+        position_msec = source.position_msec
+        for consumer in consumers:
+            consumer.on_frame(frame_index, position_msec, frame)
+        frame_index += 1
+    for consumer in consumers:
+        consumer.finish(frame_index)
+    metrics.inc("frames_decoded", frame_index - corrupt_frames)
+    metrics.inc("corrupt_frames", corrupt_frames)
+    metrics.inc("decode_seconds", decode_seconds)
+    return frame_index
+
+
+def run_fused_discovery(
+    video_file: str,
+    channel: str,
+    start_date_str: str,
+    ocr_cache: Optional[OCRCache] = None,
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+) -> Tuple[Union[Dict[str, Any], str], bool]:
+    # Una sola decodificacion para descubrir bumpers (escenas + OCR de candidatos) y detectar placas
+    # (dhash de los frames muestreados); devuelve (eventos crudos o estado, si se guardaron bumpers nuevos).
+    # Si el plazo vence con bumpers ya descubiertos los eventos llegan hasta ahi, con "resume_frame"
+    try:
+        # sin cache configurada se usa una en memoria por bumper matcheado
+        ocr_cache = ocr_cache if ocr_cache is not None else OCRCache(radius=0)
+        probe = cv2.VideoCapture(video_file)
+        width, height = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH)), int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        probe.release()
+        # los backends que escalan al decodificar entregan directamente la miniatura del scorer
+        source = open_frame_source(video_file, *ContentChangeScorer(max(1, width), max(1, height)).size)
+        fps, frame_count = source.fps, source.frame_count
+        bumpers = BumperCandidates()
+
+        def on_candidate_result(frame_index: int, placa_detected: Optional[str], image: Any, confidence: float) -> None:
+            logger.debug(f"Frame {frame_index} classified as {placa_detected} ({confidence:.2f})")
+            bumpers.add(placa_detected, image, confidence)
+
+        def on_candidate(frame_index: int, frame: Any) -> None:
+            # la decodificacion sigue para la deteccion, pero con placas confiables ya no se leen candidatos
+            if bumpers.done:
+                metrics.inc("bumper_candidates_skipped")
+                return
+            # sin bumper matcheado: cada candidato se lee aunque otro tenga el mismo dhash
+            batcher.add(frame_index, frame)
+
+        # los candidatos se leen completos: de las placas reconocidas sale la zona de texto del canal. No pasan por
+        # la cache de OCR, que guarda clasificaciones de bumpers indexados y un candidato todavia no lo es
+        batcher = OCRBatcher(
+            on_candidate_result,
+            text_region=text_region,
+            crop=False,
+            text_gate=load_text_gate(),
+            with_confidence=True,
+        )
+        candidates = SceneCandidateBuffer(fps, on_candidate, full_frame=source.full_frame if source.scaled else None)
+        scorer = ContentChangeScorer(source.width, source.height, on_cut=candidates.on_cut)
+        sampler = DHashSampler(frame_count)
+        # el scorer va primero: un corte cierra la escena antes de que el buffer vea el frame nuevo
+        frame_total = run_pipeline(source, [scorer, candidates, sampler], deadline)
+        source.release()
+        if frame_total == "CORRUPT":
+            logger.error("Processing video file: " + video_file + " Corrupt video")
+            return "CORRUPT", False
+        batcher.flush()
+        logger.debug(
+            f"run_fused_discovery: {frame_total} frames, {candidates.scenes} scenes, "
+            f"{len(sampler.hashes)} hashes, candidate OCR {batcher.stats()}, ranked {bumpers.summary()}"
+        )
+        saved = save_bumper_candidates(channel, bumpers)
+        cut = deadline is not None and deadline.expired()
+        if cut and not saved:
+            logger.warning(f"run_fused_discovery: {deadline.reason} at frame {frame_total} before finding bumpers")
+            return "TERMINATED", False
+
+        if hash_track is not None and not cut:
+            for frame_counter, position_msec, frame_hash in zip(
+                sampler.frame_counters, sampler.positions_msec, sampler.hashes
+            ):
+                hash_track.append(frame_counter, position_msec, frame_hash)
+            hash_track.save(fps, frame_count)
+
+        matcher = DHashMatcher(get_indexed_bumpers_dhashes(channel))
+        matched = np.flatnonzero(matcher.match_batch(np.array(sampler.hashes, dtype=np.uint64), DHASH_THRESHOLD))
+        metrics.inc("hash_hits", len(matched))
+        metrics.inc("scenes", candidates.scenes)
+        events = matched_frame_events(
+            video_file,
+            [sampler.frame_counters[i] for i in matched],
+            [sampler.positions_msec[i] for i in matched],
+            matcher.unique_matches((sampler.hashes[i] for i in matched), DHASH_THRESHOLD),
+            start_date_str,
+            ocr_cache,
+            text_region,
+        )
+        if cut and type(events) is not str:
+            events["resume_frame"] = frame_total
+        return events, saved
+
+    except Exception as e:
+        logger.error("Processing video file: " + video_file + " Error: " + str(e))
+        return "ERROR", False
@@ -0,0 +1,243 @@
+import argparse
+import glob
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from bumper_index import get_indexed_bumpers_dhashes
+from config import logger, settings, to_boolean
+from dhash_engine import DHASH_VERSION, DHashMatcher, HashLike, hash_to_int
+from frame_source import open_frame_source
+from ocr_batch import OCRBatcher
+from ocr_cache import OCRCache
+from text_region import TextRegion, load_text_region
+from utils import datetime_to_string, get_timestamp
+
+HASH_TRACK_ENABLED: bool = to_boolean(str(settings.HASH_TRACK_ENABLED))
+HASH_TRACK_MATCH_CHUNK = int(settings.HASH_TRACK_MATCH_CHUNK)
+DHASH_THRESHOLD = int(settings.DHASH_THRESHOLD)
+DHASH_FREQUENCY = int(settings.DHASH_FREQUENCY)
+TRACK_DTYPE = np.dtype([("frame", "<i8"), ("pts_ms", "<f8"), ("dhash", "<u8")])
+VIDEO_EXTENSIONS = (".mp4", ".ts", ".mkv", ".avi", ".mov")
+# modos que hashean toda la grilla de DHASH_FREQUENCY; el coarse solo guarda keyframes y los tramos que escaneo
+COMPLETE_TRACK_SCAN_MODES = ("dense", "threaded")
+
+placa_inicio: str = settings.START_EVENT_NAME
+placa_fin: str = settings.END_EVENT_NAME
+
+
+def hash_track_path(video_file: str) -> str:
+    return video_file + ".dhash_track.npy"
+
+
+def hash_track_meta_path(video_file: str) -> str:
+    return video_file + ".dhash_track.json"
+
+
+class HashTrackWriter:
+    # Acumula (frame, pts_ms, dhash) de cada frame muestreado; se guarda al terminar el escaneo
+    def __init__(self, video_file: str, start_date_str: str, scan_mode: str = "dense") -> None:
+        self.video_file: str = video_file
+        self.start_date_str: str = start_date_str
+        self.scan_mode: str = scan_mode
+        self.frames: List[int] = []
+        self.positions_msec: List[float] = []
+        self.hashes: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def append(self, frame_counter: int, position_msec: float, frame_hash: HashLike) -> None:
+        self.frames.append(frame_counter)
+        self.positions_msec.append(position_msec)
+        self.hashes.append(hash_to_int(frame_hash))
+
+    def merge(self, other: "HashTrackWriter") -> None:
+        self.frames.extend(other.frames)
+        self.positions_msec.extend(other.positions_msec)
+        self.hashes.extend(other.hashes)
+
+    def to_array(self) -> np.ndarray:
+        track = np.empty(len(self.frames), dtype=TRACK_DTYPE)
+        track["frame"] = self.frames
+        track["pts_ms"] = self.positions_msec
+        track["dhash"] = np.array(self.hashes, dtype=np.uint64)
+        # tramos solapados y los keyframes del modo coarse pueden repetir un frame del escaneo denso
+        _, first = np.unique(track["frame"], return_index=True)
+        return track[first]
+
+    def save(self, fps: float = 0, frame_count: int = 0) -> None:
+        track = self.to_array()
+        path = hash_track_path(self.video_file)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, track)
+        os.replace(tmp_path, path)
+        stat = os.stat(self.video_file)
+        meta = {
+            "video_file": os.path.basename(self.video_file),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "start_date": self.start_date_str,
+            "scan_mode": self.scan_mode,
+            "dhash_frequency": DHASH_FREQUENCY,
+            "dhash_version": DHASH_VERSION,
+            "fps": fps,
+            "frame_count": frame_count,
+            "samples": len(track),
+        }
+        with open(hash_track_meta_path(self.video_file), "w") as f:
+            json.dump(meta, f)
+        logger.debug(f"Hash track saved for {self.video_file}: {len(track)} samples")
+
+
+def load_hash_track(video_file: str) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+    path, meta_path = hash_track_path(video_file), hash_track_meta_path(video_file)
+    if not os.path.isfile(path) or not os.path.isfile(meta_path):
+        return None, None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    stat = os.stat(video_file)
+    if meta.get("size") != stat.st_size or meta.get("mtime") != stat.st_mtime:
+        logger.info(f"Hash track for {video_file} is stale, ignoring it")
+        return None, None
+    if meta.get("dhash_version") != DHASH_VERSION:
+        logger.info(f"Hash track for {video_file} was hashed by another dHash version, ignoring it")
+        return None, None
+    # memmap: solo se leen las paginas que se recorren al matchear
+    return np.load(path, mmap_mode="r"), meta
+
+
+def match_hash_track(track: np.ndarray, matcher: DHashMatcher, threshold: int = DHASH_THRESHOLD) -> np.ndarray:
+    matched: List[np.ndarray] = []
+    for start in range(0, len(track), HASH_TRACK_MATCH_CHUNK):
+        hashes = np.asarray(track["dhash"][start:start + HASH_TRACK_MATCH_CHUNK])
+        matched.append(np.flatnonzero(matcher.match_batch(hashes, threshold)) + start)
+    return np.concatenate(matched) if matched else np.empty(0, dtype=np.int64)
+
+
+def classify_matched_frames(
+    video_file: str,
+    frame_counters: List[int],
+    bumper_keys: List[Optional[int]],
+    ocr_cache: OCRCache,
+    on_result: Callable[[int, Optional[str]], None],
+    text_region: Optional[TextRegion] = None,
+) -> int:
+    # primero la cache de OCR por bumper matcheado: solo se decodifican los frames sin acierto
+    misses: List[Tuple[int, Optional[int]]] = []
+    for frame_counter, bumper_key in zip(frame_counters, bumper_keys):
+        cached, classification = ocr_cache.lookup(bumper_key) if bumper_key is not None else (False, None)
+        if cached:
+            on_result(frame_counter, classification)
+        else:
+            misses.append((frame_counter, bumper_key))
+    if not misses:
+        return 0
+
+    source = open_frame_source(video_file, backend="opencv")
+    batcher = OCRBatcher(
+        lambda frame_counter, classification, _: on_result(frame_counter, classification),
+        ocr_cache=ocr_cache,
+        text_region=text_region,
+    )
+    for frame_counter, bumper_key in misses:
+        # frame_counter cuenta desde 1: el frame leido es el de indice frame_counter - 1
+        frame = source.full_frame(frame_counter - 1)
+        if frame is not None:
+            batcher.add(frame_counter, frame, bumper_key)
+    batcher.flush()
+    source.release()
+    return len(misses)
+
+
+def matched_frame_events(
+    video_file: str,
+    frame_counters: List[int],
+    positions_msec: List[float],
+    bumper_keys: List[Optional[int]],
+    start_date_str: str,
+    ocr_cache: OCRCache,
+    text_region: Optional[TextRegion] = None,
+) -> Dict[str, Any]:
+    classifications: Dict[int, Optional[str]] = {}
+    reread = classify_matched_frames(
+        video_file, frame_counters, bumper_keys, ocr_cache, classifications.__setitem__, text_region
+    )
+    logger.debug(f"{video_file}: {len(frame_counters)} matched frames, {reread} decoded for OCR")
+    events: Dict[str, Any] = {"items": {}}
+    for frame_counter, position_msec in zip(frame_counters, positions_msec):
+        classification = classifications.get(frame_counter)
+        if classification == placa_fin or classification == placa_inicio:
+            current_time = get_timestamp(position_msec, start_date_str)
+            events["items"][datetime_to_string(current_time)] = classification
+    return events
+
+
+def rescan_video(
+    video_file: str,
+    dhashes: List[HashLike],
+    ocr_cache: Optional[OCRCache] = None,
+    text_region: Optional[TextRegion] = None,
+) -> Union[Dict[str, Any], str, None]:
+    # eventos crudos como bumper_dhash_detector, sin decodificar la grabacion; None si no hay track completo y hay
+    # que volver a escanearla
+    track, meta = load_hash_track(video_file)
+    if track is None:
+        return None
+    if meta.get("scan_mode", "dense") not in COMPLETE_TRACK_SCAN_MODES:
+        # un bumper nuevo entre keyframes, fuera de los tramos escaneados, no esta en el track
+        logger.warning(f"Hash track for {video_file} comes from a {meta['scan_mode']} scan, decode it again")
+        return None
+    try:
+        matcher = DHashMatcher(dhashes)
+        rows = track[match_hash_track(track, matcher)]
+        return matched_frame_events(
+            video_file,
+            rows["frame"].tolist(),
+            rows["pts_ms"].tolist(),
+            matcher.unique_matches(rows["dhash"].tolist(), DHASH_THRESHOLD),
+            meta["start_date"],
+            ocr_cache if ocr_cache is not None else OCRCache(radius=0),
+            text_region,
+        )
+    except Exception as e:
+        logger.error("Rescanning video file: " + video_file + " Error: " + str(e))
+        return "ERROR"
+
+
+if __name__ == "__main__":
+    from tv_ad_detector import get_ocr_cache, process_events
+
+    parser = argparse.ArgumentParser(description="TV Ad Detector - rescan recordings from their hash tracks")
+    parser.add_argument("--channel_name", type=str, default="test_channel", help="Name of the TV channel")
+    parser.add_argument("--video_files", type=str, nargs="*", default=[], help="Recordings to rescan")
+    parser.add_argument("--folder", type=str, help="Rescan every recording with a hash track in this folder")
+    args = parser.parse_args()
+
+    video_files = list(args.video_files)
+    if args.folder:
+        video_files += sorted(
+            path[: -len(".dhash_track.npy")]
+            for path in glob.glob(os.path.join(args.folder, "*.dhash_track.npy"))
+            if path[: -len(".dhash_track.npy")].lower().endswith(VIDEO_EXTENSIONS)
+        )
+    dhashes = get_indexed_bumpers_dhashes(args.channel_name)
+    ocr_cache = get_ocr_cache(args.channel_name)
+    text_region = load_text_region(args.channel_name)
+    for video_file in video_files:
+        raw_events = rescan_video(video_file, dhashes, ocr_cache, text_region)
+        if raw_events is None:
+            # sin track, o con el de un escaneo coarse: hay que correr tv_ad_detector.py sobre la grabacion
+            print(json.dumps({"video_file": video_file, "result": "NO_TRACK"}))
+            continue
+        if type(raw_events) is str:
+            print(json.dumps({"video_file": video_file, "result": raw_events}))
+            continue
+        _, meta = load_hash_track(video_file)
+        duration = meta["frame_count"] / meta["fps"] if meta["fps"] else 0
+        result = process_events(raw_events, meta["start_date"], duration)
+        print(json.dumps({"video_file": video_file, "result": result}))
+    if ocr_cache is not None:
+        ocr_cache.save()
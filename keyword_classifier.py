@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Set
+
+import metrics
+from config import get_spellcheck
+
+KEYWORD_MAX_DISTANCE: int = 2  # distancia de edicion que usa spellcheck.candidates
+KEYWORD_CACHE_SIZE: int = 65536
+
+
+def deletion_neighborhood(word: str, max_deletes: int = KEYWORD_MAX_DISTANCE) -> Set[str]:
+    variants: Set[str] = {word}
+    for deletes in range(1, min(max_deletes, len(word)) + 1):
+        for positions in combinations(range(len(word)), deletes):
+            variants.add("".join(c for i, c in enumerate(word) if i not in positions))
+    return variants
+
+
+def damerau_levenshtein(a: str, b: str) -> int:
+    # distancia sin restricciones (Lowrance-Wagner): minimo de operaciones en cualquier secuencia,
+    # que es lo que recorre spellcheck.candidates al aplicar edit_distance_1 dos veces
+    last_row: Dict[str, int] = {}
+    infinity = len(a) + len(b)
+    table = [[infinity] * (len(b) + 2) for _ in range(len(a) + 2)]
+    for i in range(len(a) + 1):
+        table[i + 1][0] = infinity
+        table[i + 1][1] = i
+    for j in range(len(b) + 1):
+        table[0][j + 1] = infinity
+        table[1][j + 1] = j
+    for i in range(1, len(a) + 1):
+        last_match_column = 0
+        for j in range(1, len(b) + 1):
+            k = last_row.get(b[j - 1], 0)
+            l = last_match_column
+            cost = 1
+            if a[i - 1] == b[j - 1]:
+                cost = 0
+                last_match_column = j
+            table[i + 1][j + 1] = min(
+                table[i][j] + cost,
+                table[i + 1][j] + 1,
+                table[i][j + 1] + 1,
+                table[k][l] + (i - k - 1) + 1 + (j - l - 1),
+            )
+        last_row[a[i - 1]] = i
+    return table[len(a) + 1][len(b) + 1]
+
+
+class KeywordClassifier:
+    # Dos palabras a distancia <= 2 (borrado, insercion, reemplazo o transposicion) siempre comparten
+    # una variante con <= 2 letras borradas de cada una. Si un token no comparte ninguna con las
+    # palabras clave, spellcheck.candidates no puede devolver ninguna y el token se descarta sin
+    # tocar el diccionario. Los pocos que si comparten se resuelven replicando candidates: palabra
+    # conocida, luego edit_distance_1 contra el diccionario y, si no hay ninguna, distancia <= 2
+    # contra las palabras clave (en lugar de generar edit_distance_2 contra todo el diccionario).
+    def __init__(self, keyword_groups: Sequence[Set[str]], cache_size: int = KEYWORD_CACHE_SIZE) -> None:
+        self.keyword_groups: List[Set[str]] = [set(group) for group in keyword_groups]
+        self.cache_size: int = cache_size
+        self._no_flags: List[bool] = [False] * len(self.keyword_groups)
+        self._deletes: Set[str] = set()
+        for group in self.keyword_groups:
+            for keyword in group:
+                self._deletes.update(deletion_neighborhood(keyword))
+        self._cache: "OrderedDict[str, List[bool]]" = OrderedDict()
+        self._known_keywords: Optional[List[Set[str]]] = None
+        self.spellcheck_calls: int = 0
+
+    def is_near_keyword(self, word: str) -> bool:
+        return not self._deletes.isdisjoint(deletion_neighborhood(word))
+
+    def _flags_for(self, candidates: Optional[Set[str]]) -> List[bool]:
+        if candidates is None:
+            return list(self._no_flags)
+        return [not candidates.isdisjoint(words) for words in self.keyword_groups]
+
+    @metrics.timed("spellcheck")
+    def _spellcheck_flags(self, word: str) -> List[bool]:
+        self.spellcheck_calls += 1
+        metrics.inc("spellcheck_calls")
+        spellcheck = get_spellcheck()
+        if self._known_keywords is None:
+            self._known_keywords = [spellcheck.known(group) for group in self.keyword_groups]
+        if spellcheck.known([word]):
+            return self._flags_for({word})
+        try:
+            # numeros (y "inf"): candidates aplica sus propias reglas, se delega
+            float(word)
+            return self._flags_for(spellcheck.candidates(word))
+        except ValueError:
+            pass
+        known_edit1 = spellcheck.known(spellcheck.edit_distance_1(word))
+        if known_edit1:
+            return self._flags_for(known_edit1)
+        return [
+            any(damerau_levenshtein(word, keyword) <= KEYWORD_MAX_DISTANCE for keyword in group)
+            for group in self._known_keywords
+        ]
+
+    def flags(self, word: str) -> List[bool]:
+        cached = self._cache.get(word)
+        if cached is not None:
+            self._cache.move_to_end(word)
+            return cached
+        result = self._spellcheck_flags(word) if self.is_near_keyword(word) else list(self._no_flags)
+        self._cache[word] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def cache_info(self) -> Dict[str, int]:
+        return {"size": len(self._cache), "spellcheck_calls": self.spellcheck_calls}
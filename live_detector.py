@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+
+from break_tracker import BreakTracker, placa_fin, placa_inicio
+from bumper_index import get_indexed_bumpers_dhashes
+from bumper_tracker import load_bumper_tracker
+from config import logger, settings
+from dhash_engine import DHashMatcher, HashLike, compute_dhash
+from ocr_cache import OCRCache
+from text_region import load_text_region
+from tv_ad_detector import DHASH_FREQUENCY, DHASH_THRESHOLD, classify_frame, get_ocr_cache
+from utils import datetime_to_string, string_to_datetime
+
+LIVE_BREAK_TIMEOUT = float(settings.LIVE_BREAK_TIMEOUT)
+LIVE_RECONNECT_DELAY = float(settings.LIVE_RECONNECT_DELAY)
+LIVE_IDLE_TIMEOUT = float(settings.LIVE_IDLE_TIMEOUT)
+
+# (tanda publicitaria, segundos desde que se vio la placa que la cierra hasta emitirla)
+BreakCallback = Callable[[Dict[str, str], float], None]
+
+
+class LiveBreakDetector:
+    def __init__(
+        self,
+        source: str,
+        channel: str,
+        on_break: BreakCallback,
+        clock: str = "wall",
+        start_date_str: Optional[str] = None,
+        dhashes: Optional[List[HashLike]] = None,
+        ocr_cache: Optional[OCRCache] = None,
+        stop_event: Optional[threading.Event] = None,
+    ) -> None:
+        self.source: str = source
+        self.channel: str = channel
+        self.on_break: BreakCallback = on_break
+        self.clock: str = clock
+        self.start_dt: datetime = string_to_datetime(start_date_str) if start_date_str else datetime.now()
+        self.matcher = DHashMatcher(dhashes if dhashes is not None else get_indexed_bumpers_dhashes(channel))
+        self.ocr_cache: Optional[OCRCache] = ocr_cache if ocr_cache is not None else get_ocr_cache(channel)
+        self.text_region = load_text_region(channel)
+        self.stop_event: threading.Event = stop_event or threading.Event()
+        self.tracker = BreakTracker(datetime_to_string(self.start_dt))
+        # la placa en pantalla se lee una vez, los frames siguientes heredan su clasificacion
+        self.bumper_tracker = load_bumper_tracker(self.matcher, self._record)
+        self.frame_counter: int = 0
+        # ultimo segundo visto todavia sin entregar al tracker: (timestamp, tipo, monotonic al verlo)
+        self._pending: Optional[Tuple[str, str, float]] = None
+        self.breaks: int = 0
+        self.latencies: List[float] = []
+
+    def _open(self) -> Any:
+        cap = cv2.VideoCapture(self.source)
+        if self.frame_counter > 0 and os.path.isfile(self.source):
+            # archivo que sigue creciendo: se retoma donde se habia llegado
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.frame_counter)
+        return cap
+
+    def _exhausted(self, cap: Any) -> bool:
+        # una URL con cantidad de frames conocida es un video cerrado: reconectar lo repetiria desde el inicio
+        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return not os.path.isfile(self.source) and 0 < frame_count <= self.frame_counter
+
+    def _now(self, cap: Any) -> datetime:
+        if self.clock == "stream":
+            return self.start_dt + timedelta(milliseconds=cap.get(cv2.CAP_PROP_POS_MSEC))
+        return datetime.now()
+
+    def _emit(self, breaks: List[Dict[str, str]], seen_at: float) -> None:
+        for commercial_break in breaks:
+            latency = time.monotonic() - seen_at
+            self.breaks += 1
+            self.latencies.append(latency)
+            if len(self.latencies) > 1000:
+                self.latencies = self.latencies[-1000:]
+            logger.info(f"Live break for {self.channel}: {commercial_break} (latency {latency:.2f}s)")
+            self.on_break(commercial_break, latency)
+
+    def _flush_pending(self) -> None:
+        if self._pending is not None:
+            timestamp_str, event_type, seen_at = self._pending
+            self._pending = None
+            self._emit(self.tracker.push(timestamp_str, event_type), seen_at)
+
+    def _advance(self, current_time: datetime) -> None:
+        # un segundo queda cerrado cuando el reloj pasa al siguiente: recien ahi se entrega
+        if self._pending is not None and self._pending[0] != datetime_to_string(current_time):
+            self._flush_pending()
+        self._emit(self.tracker.check_timeout(current_time, LIVE_BREAK_TIMEOUT), time.monotonic())
+
+    def _observe(self, current_time: datetime, event_type: str) -> None:
+        timestamp_str = datetime_to_string(current_time)
+        if self._pending is not None and self._pending[0] == timestamp_str:
+            self._pending = (timestamp_str, event_type, self._pending[2])
+        else:
+            self._flush_pending()
+            self._pending = (timestamp_str, event_type, time.monotonic())
+
+    def _record(self, current_time: datetime, classification: Optional[str]) -> None:
+        if classification == placa_inicio or classification == placa_fin:
+            self._observe(current_time, classification)
+
+    def _classify(self, frame: Any, frame_hash: int) -> Optional[str]:
+        bumper_key = self.matcher.unique_match(frame_hash, DHASH_THRESHOLD)
+        return classify_frame(frame, bumper_key, self.ocr_cache, self.text_region)
+
+    def run(self) -> Dict[str, Any]:
+        cap = self._open()
+        idle_since: Optional[float] = None
+        current_time: datetime = self.start_dt
+        while not self.stop_event.is_set():
+            if not cap.grab():
+                if self._exhausted(cap):
+                    logger.info(f"Live source {self.source} reached its end, stopping")
+                    break
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since > LIVE_IDLE_TIMEOUT:
+                    logger.info(f"Live source {self.source} idle for {LIVE_IDLE_TIMEOUT}s, stopping")
+                    break
+                cap.release()
+                self.stop_event.wait(LIVE_RECONNECT_DELAY)
+                cap = self._open()
+                continue
+            idle_since = None
+            self.frame_counter += 1
+            if self.frame_counter % DHASH_FREQUENCY != 0:
+                continue
+            ret, frame = cap.retrieve()
+            if not ret:
+                continue
+            current_time = self._now(cap)
+            self._advance(current_time)
+            frame_hash = compute_dhash(frame)
+            if self.bumper_tracker is None:
+                if self.matcher.is_match(frame_hash, DHASH_THRESHOLD):
+                    self._record(current_time, self._classify(frame, frame_hash))
+            elif self.bumper_tracker.distance(frame_hash) < DHASH_THRESHOLD:
+                if not self.bumper_tracker.follow(current_time):
+                    self.bumper_tracker.resolve(current_time, self._classify(frame, frame_hash))
+
+        cap.release()
+        self._flush_pending()
+        end_time = datetime.now() if self.clock == "wall" else current_time
+        self._emit(self.tracker.finish(datetime_to_string(end_time)), time.monotonic())
+        if self.ocr_cache is not None:
+            self.ocr_cache.save()
+        if self.bumper_tracker is not None:
+            self.bumper_tracker.record_metrics()
+        return self.stats()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "frames": self.frame_counter,
+            "breaks": self.breaks,
+            "mean_latency": sum(self.latencies) / len(self.latencies) if self.latencies else None,
+            "max_latency": max(self.latencies) if self.latencies else None,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TV Ad Detector - live mode")
+    parser.add_argument("--channel_name", type=str, default="test_channel", help="Name of the TV channel")
+    parser.add_argument("--source", type=str, help="Growing file, named pipe or ffmpeg-readable URL")
+    parser.add_argument(
+        "--clock",
+        type=str,
+        default="wall",
+        choices=["wall", "stream"],
+        help="wall stamps events with the current time, stream with start_date + stream position",
+    )
+    parser.add_argument(
+        "--start_date",
+        type=str,
+        default=None,
+        help="Start date of the stream in 'YYYY-MM-DD HH:MM:SS' format (default: now)",
+    )
+    args = parser.parse_args()
+
+    def print_break(commercial_break: Dict[str, str], latency: float) -> None:
+        print(json.dumps({**commercial_break, "latency_seconds": round(latency, 3)}), flush=True)
+
+    detector = LiveBreakDetector(args.source, args.channel_name, print_break, args.clock, args.start_date)
+    signal.signal(signal.SIGINT, lambda *_: detector.stop())
+    print(detector.run())
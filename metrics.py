@@ -0,0 +1,262 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import settings, to_boolean
+
+# se consulta en cada llamada: con METRICS_ENABLED=false cada punto de medicion cuesta un if
+METRICS_ENABLED: bool = to_boolean(str(settings.METRICS_ENABLED))
+METRICS_PROFILE: bool = to_boolean(str(settings.METRICS_PROFILE))
+METRICS_PROFILE_INTERVAL = float(settings.METRICS_PROFILE_INTERVAL)
+METRICS_PREFIX = "tv_ad_"
+SECONDS_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+PROFILE_MAX_DEPTH = 64
+PROFILE_TOP = 30
+
+
+def _copy_histogram(histogram: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: list(value) if type(value) is list else value for key, value in histogram.items()}
+
+
+class MetricsRegistry:
+    # contadores y histogramas (count, sum, max y buckets acumulables entre procesos)
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Dict[str, Any]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = SECONDS_BUCKETS) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "max": value,
+                    "buckets": list(buckets),
+                    "bucket_counts": [0] * len(buckets),
+                }
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["bucket_counts"][i] += 1
+                    break
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        with self._lock:
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other in snapshot.get("histograms", {}).items():
+                histogram = self.histograms.get(name)
+                if histogram is None or histogram["buckets"] != other["buckets"]:
+                    self.histograms[name] = _copy_histogram(other)
+                    continue
+                histogram["count"] += other["count"]
+                histogram["sum"] += other["sum"]
+                histogram["max"] = max(histogram["max"], other["max"])
+                histogram["bucket_counts"] = [a + b for a, b in zip(histogram["bucket_counts"], other["bucket_counts"])]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: _copy_histogram(histogram) for name, histogram in self.histograms.items()},
+            }
+
+
+_registry = MetricsRegistry()
+_registry_lock = threading.Lock()
+
+
+def inc(name: str, value: float = 1) -> None:
+    if METRICS_ENABLED:
+        _registry.inc(name, value)
+
+
+def observe(name: str, value: float, buckets: Sequence[float] = SECONDS_BUCKETS) -> None:
+    if METRICS_ENABLED:
+        _registry.observe(name, value, buckets)
+
+
+def clock() -> float:
+    # para acumular tiempos dentro de un bucle: sin metricas siempre devuelve 0
+    return time.perf_counter() if METRICS_ENABLED else 0.0
+
+
+class _Timer:
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.start: float = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        _registry.observe(self.name + "_seconds", time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def timer(name: str) -> Any:
+    return _Timer(name) if METRICS_ENABLED else _null_timer
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not METRICS_ENABLED:
+                return function(*args, **kwargs)
+            with _Timer(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def snapshot() -> Dict[str, Any]:
+    return _registry.snapshot()
+
+
+def merge(metrics_snapshot: Optional[Dict[str, Any]]) -> None:
+    # junta lo medido en otro proceso (tramos en paralelo, workers del servicio)
+    if METRICS_ENABLED and metrics_snapshot:
+        _registry.merge(metrics_snapshot)
+
+
+def reset() -> None:
+    global _registry
+    with _registry_lock:
+        _registry = MetricsRegistry()
+
+
+class SamplingProfiler:
+    # muestrea la pila de un hilo cada `interval` segundos desde otro hilo; no instrumenta ninguna funcion
+    def __init__(self, interval: float = METRICS_PROFILE_INTERVAL, thread_id: Optional[int] = None) -> None:
+        self.interval: float = interval
+        self.thread_id: int = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples: int = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="metrics-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack: List[str] = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def top(self, limit: int = PROFILE_TOP) -> List[Dict[str, Any]]:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        return [
+            {"function": function, "self": count, "total": total[function]}
+            for function, count in own.most_common(limit)
+        ]
+
+    def folded(self) -> List[str]:
+        # formato de flamegraph.pl / speedscope
+        return [";".join(stack) + f" {count}" for stack, count in self.stacks.most_common()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"interval": self.interval, "samples": self.samples, "top": self.top(), "folded": self.folded()}
+
+
+class Collected:
+    def __init__(self) -> None:
+        self.snapshot: Optional[Dict[str, Any]] = None
+
+
+@contextmanager
+def collect(profile: bool = METRICS_PROFILE) -> Iterator[Collected]:
+    # Metricas de un trabajo: se miden en un registro propio y al terminar se suman al del proceso
+    global _registry
+    collected = Collected()
+    if not METRICS_ENABLED:
+        yield collected
+        return
+    with _registry_lock:
+        parent, _registry = _registry, MetricsRegistry()
+    profiler = SamplingProfiler() if profile else None
+    if profiler is not None:
+        profiler.start()
+    start = time.perf_counter()
+    try:
+        yield collected
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        with _registry_lock:
+            job_registry, _registry = _registry, parent
+        collected.snapshot = job_registry.snapshot()
+        collected.snapshot["wall_seconds"] = time.perf_counter() - start
+        if profiler is not None:
+            collected.snapshot["profile"] = profiler.to_dict()
+        parent.merge(collected.snapshot)
+
+
+def _prometheus_name(name: str) -> str:
+    return METRICS_PREFIX + "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+
+def to_prometheus(metrics_snapshot: Optional[Dict[str, Any]] = None, gauges: Optional[Dict[str, float]] = None) -> str:
+    metrics_snapshot = metrics_snapshot if metrics_snapshot is not None else snapshot()
+    lines: List[str] = []
+    for name, value in sorted(metrics_snapshot.get("counters", {}).items()):
+        metric = _prometheus_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, histogram in sorted(metrics_snapshot.get("histograms", {}).items()):
+        metric = _prometheus_name(name)
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(histogram["buckets"], histogram["bucket_counts"]):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram["count"]}')
+        lines += [f"{metric}_sum {histogram['sum']}", f"{metric}_count {histogram['count']}"]
+    for name, value in sorted((gauges or {}).items()):
+        metric = _prometheus_name(name)
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
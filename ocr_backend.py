@@ -0,0 +1,230 @@
+import inspect
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import logger, settings
+
+OCR_BACKEND: str = settings.OCR_BACKEND
+OCR_THREADS = int(settings.OCR_THREADS)
+ONNX_DETECTOR_FILE = "craft_detector.onnx"
+ONNX_RECOGNIZER_FILE = "{model}_recognizer_int8.onnx"
+
+# Un backend es una funcion sin argumentos que devuelve un lector con la interfaz de easyocr.Reader que usa
+# ocr_batch: readtext(imagen, detail=) y readtext_batched(imagenes, detail=, batch_size=); si ademas tiene
+# detect() y recognize() la compuerta de texto corre el detector y el reconocedor por separado
+OCRBackend = Callable[[], Any]
+OCR_BACKENDS: Dict[str, OCRBackend] = {}
+
+
+def register_ocr_backend(name: str) -> Callable[[OCRBackend], OCRBackend]:
+    def register(backend: OCRBackend) -> OCRBackend:
+        OCR_BACKENDS[name] = backend
+        return backend
+
+    return register
+
+
+def set_torch_threads(threads: int) -> None:
+    import torch
+
+    if threads <= 0:
+        return
+    torch.set_num_threads(threads)
+    try:
+        # solo se puede fijar antes del primer trabajo en paralelo de torch en el proceso
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+@register_ocr_backend("easyocr")
+def load_easyocr() -> Any:
+    import easyocr
+
+    return easyocr.Reader(settings.OCR_LANGUAGES)
+
+
+@register_ocr_backend("easyocr_cpu")
+def load_cpu_easyocr(quantize: bool = True) -> Any:
+    # CPU explicito con OCR_THREADS hilos por proceso. quantize=True es lo que ya hace easyocr en CPU: LSTM y
+    # lineales del reconocedor en int8 con torch, las convoluciones quedan en float
+    import easyocr
+
+    set_torch_threads(OCR_THREADS)
+    return easyocr.Reader(settings.OCR_LANGUAGES, gpu=False, quantize=quantize, verbose=False)
+
+
+def onnx_session(path: str, threads: int) -> Any:
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = max(0, threads)
+    options.inter_op_num_threads = 1
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+class OnnxDetector:
+    # Reemplazo de reader.detector (CRAFT) que corre la exportacion ONNX; devuelve tensores como el modelo
+    # original para que easyocr haga el mismo postproceso
+    def __init__(self, path: str, threads: int = OCR_THREADS) -> None:
+        self.session = onnx_session(path, threads)
+        self.input_name: str = self.session.get_inputs()[0].name
+
+    def __call__(self, images: Any) -> Tuple[Any, Any]:
+        import torch
+
+        y, feature = self.session.run(None, {self.input_name: images.cpu().numpy()})
+        return torch.from_numpy(y), torch.from_numpy(feature)
+
+    def eval(self) -> "OnnxDetector":
+        return self
+
+
+class OnnxRecognizer:
+    # Reemplazo de reader.recognizer: el modelo CTC exportado a ONNX con LSTM y lineales cuantizados a int8 por
+    # onnxruntime; devuelve los logits como el modelo original
+    def __init__(self, path: str, threads: int = OCR_THREADS) -> None:
+        self.session = onnx_session(path, threads)
+        self.input_name: str = self.session.get_inputs()[0].name
+
+    def __call__(self, images: Any, text: Any = None) -> Any:
+        import torch
+
+        return torch.from_numpy(self.session.run(None, {self.input_name: images.cpu().numpy()})[0])
+
+    def eval(self) -> "OnnxRecognizer":
+        return self
+
+
+def onnx_export_kwargs() -> Dict[str, Any]:
+    import torch
+
+    kwargs: Dict[str, Any] = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # el exportador por trazas no necesita onnxscript
+        kwargs["dynamo"] = False
+    return kwargs
+
+
+def export_onnx_recognizer(recognizer: Any, path: str) -> None:
+    # el reconocedor se exporta en float (la cuantizacion de torch no se puede exportar) y se cuantiza despues.
+    # Solo LSTM y lineales, como torch: con las convoluciones en ConvInteger el modelo anda 4 veces mas lento
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    class Logits(torch.nn.Module):
+        # el forward de los modelos de easyocr (generation1 y generation2) sin el texto, que CTC no usa
+        def __init__(self, model: Any) -> None:
+            super().__init__()
+            self.model = model
+
+        def forward(self, images: Any) -> Any:
+            model = self.model
+            feature = model.FeatureExtraction(images).permute(0, 3, 1, 2)
+            # AdaptiveAvgPool2d((None, 1)) promedia la altura, pero con ancho dinamico no se puede exportar
+            feature = feature.mean(dim=3)
+            return model.Prediction(model.SequenceModeling(feature).contiguous())
+
+    float_path = f"{path}.{os.getpid()}.float.onnx"
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                Logits(recognizer.eval()),
+                torch.rand(2, 1, 64, 256),
+                float_path,
+                input_names=["input"],
+                output_names=["logits"],
+                dynamic_axes={"input": {0: "batch", 3: "width"}, "logits": {0: "batch", 1: "steps"}},
+                opset_version=17,
+                do_constant_folding=True,
+                **onnx_export_kwargs(),
+            )
+        quantize_dynamic(
+            float_path, tmp_path, op_types_to_quantize=["LSTM", "MatMul", "Gemm"], weight_type=QuantType.QInt8
+        )
+        os.replace(tmp_path, path)
+    finally:
+        for leftover in (float_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def export_onnx_detector(detector: Any, path: str) -> None:
+    import torch
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            detector,
+            torch.rand(1, 3, 320, 640),
+            tmp_path,
+            input_names=["input"],
+            output_names=["output", "feature"],
+            dynamic_axes={
+                "input": {0: "batch", 2: "height", 3: "width"},
+                "output": {0: "batch", 1: "map_height", 2: "map_width"},
+                "feature": {0: "batch", 2: "map_height", 3: "map_width"},
+            },
+            opset_version=17,
+            do_constant_folding=True,
+            **onnx_export_kwargs(),
+        )
+    os.replace(tmp_path, path)
+
+
+def recognizer_weights(reader: Any) -> Optional[str]:
+    # el Reader no guarda la ruta del reconocedor: se busca el modelo por su juego de caracteres; None si es un
+    # modelo propio (user_network_directory), que queda en torch
+    for models in getattr(reader, "recognition_models", {}).values():
+        for model in models.values():
+            if model.get("characters") == getattr(reader, "character", None):
+                return os.path.join(reader.model_storage_directory, model["filename"])
+    return None
+
+
+def is_stale(path: str, weights: str) -> bool:
+    # se exporta una vez por instalacion, de nuevo si cambian los pesos
+    return not os.path.exists(path) or (os.path.exists(weights) and os.path.getmtime(weights) > os.path.getmtime(path))
+
+
+@register_ocr_backend("easyocr_onnx")
+def load_onnx_easyocr() -> Any:
+    # detector CRAFT en ONNX Runtime (en float) y reconocedor en ONNX Runtime con las mismas capas en int8 que
+    # easyocr_cpu (LSTM y lineales; las convoluciones en float). Sin onnxruntime queda igual que easyocr_cpu
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        logger.warning("onnxruntime not installed, using the easyocr_cpu OCR backend")
+        return load_cpu_easyocr()
+    # sin cuantizar: el reconocedor cuantizado por torch no se puede exportar
+    reader = load_cpu_easyocr(quantize=False)
+    storage = reader.model_storage_directory
+    if getattr(reader, "detector", None) is not None:
+        path = os.path.join(storage, ONNX_DETECTOR_FILE)
+        if is_stale(path, os.path.join(storage, reader.detection_models["craft"]["filename"])):
+            logger.info(f"Exporting the text detector to {path}")
+            export_onnx_detector(reader.detector, path)
+        reader.detector = OnnxDetector(path)
+    weights = recognizer_weights(reader)
+    if getattr(reader, "recognizer", None) is not None and weights is not None:
+        path = os.path.join(storage, ONNX_RECOGNIZER_FILE.format(model=os.path.splitext(os.path.basename(weights))[0]))
+        if is_stale(path, weights):
+            logger.info(f"Exporting the text recognizer to {path}")
+            export_onnx_recognizer(reader.recognizer, path)
+        reader.recognizer = OnnxRecognizer(path)
+    elif getattr(reader, "recognizer", None) is not None:
+        # modelo propio: la misma cuantizacion de torch que easyocr_cpu
+        import torch
+
+        torch.quantization.quantize_dynamic(reader.recognizer, dtype=torch.qint8, inplace=True)
+    return reader
+
+
+def load_ocr_reader(backend: str = OCR_BACKEND) -> Any:
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend '{backend}', choose one of {sorted(OCR_BACKENDS)}")
+    logger.debug(f"Loading OCR backend {backend}")
+    return OCR_BACKENDS[backend]()
@@ -0,0 +1,297 @@
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import metrics
+from config import get_reader, settings, to_boolean
+from dhash_engine import HashLike, hash_to_int
+from ocr_cache import OCRCache
+from text_region import TextRegion
+from utils import OCR_WORD_LIMIT, classify_board
+
+OCR_BATCH_SIZE = int(settings.OCR_BATCH_SIZE)
+OCR_BATCH_MAX_WAIT = float(settings.OCR_BATCH_MAX_WAIT)
+OCR_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+OCR_GATE_ENABLED: bool = to_boolean(str(settings.OCR_GATE_ENABLED))
+OCR_GATE_MIN_EDGES = float(settings.OCR_GATE_MIN_EDGES)
+GATE_WIDTH = 320
+GATE_EDGE_LEVEL = 64
+GATE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+# (clave ordenable: timestamp o numero de frame, clasificacion, frame[, confianza con with_confidence=True])
+ResultCallback = Callable[..., None]
+# (clasificacion, confianza media del OCR en las lineas leidas; 0 si no es placa)
+Scored = Tuple[Optional[str], float]
+
+
+def edge_density(frame: Any) -> float:
+    # fraccion de pixeles con borde fuerte en una miniatura: sin bordes no hay texto legible
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if gray.shape[1] > GATE_WIDTH:
+        height = max(1, round(gray.shape[0] * GATE_WIDTH / gray.shape[1]))
+        gray = cv2.resize(gray, (GATE_WIDTH, height), interpolation=cv2.INTER_AREA)
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, GATE_KERNEL)
+    return cv2.countNonZero(cv2.compare(gradient, GATE_EDGE_LEVEL, cv2.CMP_GE)) / gradient.size
+
+
+class TextGate:
+    # Cascada antes del reconocedor: densidad de bordes (casi gratis) y despues solo el detector de texto.
+    # Llegan al reconocedor los frames con entre 1 y OCR_WORD_LIMIT cajas; cada caja tiene al menos una
+    # palabra, asi que los descartados por cajas nunca habrian pasado classify_board
+    def __init__(self, min_edges: float = OCR_GATE_MIN_EDGES, box_limit: int = OCR_WORD_LIMIT) -> None:
+        self.min_edges: float = min_edges
+        self.box_limit: int = box_limit
+        self.frames: int = 0
+        self.rejected_edges: int = 0
+        self.rejected_no_text: int = 0
+        self.rejected_dense: int = 0
+        self.recognized: int = 0
+
+    def read(self, frames: List[Any], batch_size: int = OCR_BATCH_SIZE, detail: int = 0) -> List[List[Any]]:
+        texts: List[List[Any]] = [[] for _ in frames]
+        self.frames += len(frames)
+        candidates = [index for index, frame in enumerate(frames) if edge_density(frame) >= self.min_edges]
+        self.rejected_edges += len(frames) - len(candidates)
+        metrics.inc("ocr_gate_rejected_edges", len(frames) - len(candidates))
+        if not candidates:
+            return texts
+
+        reader = get_reader()
+        if not hasattr(reader, "detect") or not hasattr(reader, "recognize"):
+            # lectores sin detector separado: solo el primer filtro
+            self.recognized += len(candidates)
+            for index, text in zip(candidates, read_frames_text([frames[i] for i in candidates], batch_size, detail)):
+                texts[index] = text
+            return texts
+
+        with metrics.timer("ocr_detect"):
+            if len(candidates) == 1:
+                horizontal_lists, free_lists = reader.detect(frames[candidates[0]])
+            else:
+                horizontal_lists, free_lists = reader.detect(np.stack([frames[i] for i in candidates]), reformat=False)
+        accepted = []
+        no_text = dense = 0
+        for index, horizontal, free in zip(candidates, horizontal_lists, free_lists):
+            boxes = len(horizontal) + len(free)
+            if boxes == 0:
+                no_text += 1
+            elif boxes > self.box_limit:
+                dense += 1
+            else:
+                accepted.append((index, horizontal, free))
+        self.rejected_no_text += no_text
+        self.rejected_dense += dense
+        metrics.inc("ocr_gate_rejected_no_text", no_text)
+        metrics.inc("ocr_gate_rejected_dense", dense)
+        if not accepted:
+            return texts
+
+        # el reconocedor usa las cajas ya detectadas: los frames que pasan no se detectan dos veces
+        self.recognized += len(accepted)
+        metrics.inc("ocr_calls")
+        metrics.inc("ocr_frames", len(accepted))
+        metrics.observe("ocr_batch_frames", len(accepted), OCR_BATCH_BUCKETS)
+        with metrics.timer("ocr"):
+            for index, horizontal, free in accepted:
+                frame = frames[index]
+                gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                texts[index] = reader.recognize(
+                    gray, horizontal, free, batch_size=batch_size, detail=detail, reformat=False
+                )
+        return texts
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "gate_frames": self.frames,
+            "gate_rejected_edges": self.rejected_edges,
+            "gate_rejected_no_text": self.rejected_no_text,
+            "gate_rejected_dense": self.rejected_dense,
+            "gate_recognized": self.recognized,
+        }
+
+
+def load_text_gate() -> Optional[TextGate]:
+    return TextGate() if OCR_GATE_ENABLED else None
+
+
+def read_frames_text(
+    frames: List[Any], batch_size: int = OCR_BATCH_SIZE, detail: int = 0, text_gate: Optional[TextGate] = None
+) -> List[List[Any]]:
+    if text_gate is not None:
+        return text_gate.read(frames, batch_size, detail)
+    reader = get_reader()
+    metrics.inc("ocr_calls")
+    metrics.inc("ocr_frames", len(frames))
+    metrics.observe("ocr_batch_frames", len(frames), OCR_BATCH_BUCKETS)
+    with metrics.timer("ocr"):
+        if len(frames) == 1:
+            return [reader.readtext(frames[0], detail=detail)]
+        # batch_size agrupa tambien las cajas de texto en el reconocedor
+        return reader.readtext_batched(frames, detail=detail, batch_size=batch_size)
+
+
+def score_detections(detections: List[Any]) -> Scored:
+    # detecciones de readtext(detail=1): [(caja, texto, confianza), ...]
+    classification = classify_board([text for _, text, _ in detections])
+    if classification is None:
+        return None, 0.0
+    return classification, float(sum(confidence for _, _, confidence in detections) / len(detections))
+
+
+def score_full_frames(
+    frames: List[Any],
+    batch_size: int = OCR_BATCH_SIZE,
+    text_region: Optional[TextRegion] = None,
+    text_gate: Optional[TextGate] = None,
+) -> List[Scored]:
+    scored: List[Scored] = []
+    for frame, detections in zip(frames, read_frames_text(frames, batch_size, detail=1, text_gate=text_gate)):
+        classification, confidence = score_detections(detections)
+        # con las cajas de cada placa reconocida se aprende (o amplia) la zona de texto del canal
+        if text_region is not None and classification is not None:
+            text_region.learn(frame.shape, detections)
+        scored.append((classification, confidence))
+    return scored
+
+
+def classify_full_frames(
+    frames: List[Any],
+    batch_size: int = OCR_BATCH_SIZE,
+    text_region: Optional[TextRegion] = None,
+    text_gate: Optional[TextGate] = None,
+) -> List[Optional[str]]:
+    return [classification for classification, _ in score_full_frames(frames, batch_size, text_region, text_gate)]
+
+
+def score_frames(
+    frames: List[Any],
+    batch_size: int = OCR_BATCH_SIZE,
+    text_region: Optional[TextRegion] = None,
+    crop: bool = True,
+    text_gate: Optional[TextGate] = None,
+) -> List[Scored]:
+    if text_region is None or not text_region.known or not crop:
+        return score_full_frames(frames, batch_size, text_region, text_gate)
+    # primero solo la zona de texto del canal, reducida; el frame completo solo si el recorte no clasifica
+    crops = [text_region.crop(frame) for frame in frames]
+    scored = [score_detections(detections) for detections in read_frames_text(crops, batch_size, detail=1)]
+    misses = [index for index, (classification, _) in enumerate(scored) if classification is None]
+    metrics.inc("ocr_region_hits", len(frames) - len(misses))
+    metrics.inc("ocr_region_fallbacks", len(misses))
+    if misses:
+        fallback = score_full_frames([frames[index] for index in misses], batch_size, text_region, text_gate)
+        for index, result in zip(misses, fallback):
+            scored[index] = result
+    return scored
+
+
+def classify_frames(
+    frames: List[Any],
+    batch_size: int = OCR_BATCH_SIZE,
+    text_region: Optional[TextRegion] = None,
+    crop: bool = True,
+    text_gate: Optional[TextGate] = None,
+) -> List[Optional[str]]:
+    return [classification for classification, _ in score_frames(frames, batch_size, text_region, crop, text_gate)]
+
+
+class OCRBatcher:
+    def __init__(
+        self,
+        on_result: ResultCallback,
+        batch_size: int = OCR_BATCH_SIZE,
+        max_wait: float = OCR_BATCH_MAX_WAIT,
+        ocr_cache: Optional[OCRCache] = None,
+        text_region: Optional[TextRegion] = None,
+        crop: bool = True,
+        text_gate: Optional[TextGate] = None,
+        with_confidence: bool = False,
+    ) -> None:
+        self.on_result: ResultCallback = on_result
+        self.batch_size: int = max(1, batch_size)
+        self.max_wait: float = max_wait
+        self.ocr_cache: Optional[OCRCache] = ocr_cache
+        # crop=False solo aprende la zona de texto (descubrimiento: casi ningun candidato es placa)
+        self.text_region: Optional[TextRegion] = text_region
+        self.crop: bool = crop
+        self.text_gate: Optional[TextGate] = text_gate
+        self.with_confidence: bool = with_confidence
+        self._pending: List[Tuple[Any, Any, Optional[int], bool, Optional[str]]] = []
+        self._to_read: int = 0
+        self._oldest: Optional[float] = None
+        self.frames: int = 0
+        self.ocr_frames: int = 0
+        self.ocr_batches: int = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, key: Any, frame: Any, bumper_key: Optional[HashLike] = None) -> None:
+        # bumper_key: dhash del unico bumper indexado que matcheo el frame (DHashMatcher.unique_match); sin el
+        # frame se lee siempre, sin cache ni deduplicacion
+        self.frames += 1
+        bumper_key = hash_to_int(bumper_key) if bumper_key is not None else None
+        cached, classification = (False, None)
+        if self.ocr_cache is not None and bumper_key is not None:
+            cached, classification = self.ocr_cache.lookup(bumper_key)
+        self._pending.append((key, frame, bumper_key, cached, classification))
+        if not cached:
+            self._to_read += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if self._to_read >= self.batch_size:
+            self.flush()
+        else:
+            self.poll()
+
+    def poll(self) -> None:
+        if self._oldest is not None and time.monotonic() - self._oldest >= self.max_wait:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._to_read = 0
+        self._oldest = None
+
+        # frames del lote que matchearon el mismo bumper se leen una sola vez
+        to_read: Dict[Any, int] = {}
+        frames: List[Any] = []
+        for index, (_, frame, bumper_key, cached, _) in enumerate(pending):
+            if cached:
+                continue
+            read_key = bumper_key if bumper_key is not None else ("frame", index)
+            if read_key not in to_read:
+                to_read[read_key] = len(frames)
+                frames.append(frame)
+
+        scored: List[Scored] = []
+        if frames:
+            self.ocr_batches += 1
+            self.ocr_frames += len(frames)
+            scored = score_frames(frames, self.batch_size, self.text_region, self.crop, self.text_gate)
+
+        results = []
+        for index, (key, frame, bumper_key, cached, classification) in enumerate(pending):
+            # la cache solo guarda la clasificacion: sus aciertos llegan sin confianza
+            confidence = 0.0
+            if not cached:
+                classification, confidence = scored[to_read[bumper_key if bumper_key is not None else ("frame", index)]]
+                if self.ocr_cache is not None and bumper_key is not None:
+                    self.ocr_cache.put(bumper_key, classification)
+            results.append((key, classification, frame, confidence))
+        results.sort(key=lambda result: result[0])
+        for key, classification, frame, confidence in results:
+            if self.with_confidence:
+                self.on_result(key, classification, frame, confidence)
+            else:
+                self.on_result(key, classification, frame)
+
+    def stats(self) -> Dict[str, int]:
+        stats = {"frames": self.frames, "ocr_frames": self.ocr_frames, "ocr_batches": self.ocr_batches}
+        if self.text_gate is not None:
+            stats.update(self.text_gate.stats())
+        return stats
@@ -0,0 +1,123 @@
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import logger, settings
+from dhash_engine import DHASH_VERSION, HashLike, hash_to_int, int_to_hex, popcount64
+from utils import format_channel_name
+
+OCR_CACHE_SIZE = int(settings.OCR_CACHE_SIZE)
+OCR_CACHE_RADIUS = int(settings.OCR_CACHE_RADIUS)
+OCR_CACHE_VERSION: int = 2
+
+
+class OCRCache:
+    # Clasificacion por bumper indexado: la clave es el dhash del unico bumper que matcheo el frame (ver
+    # DHashMatcher.unique_match), no el del frame. Placas del mismo diseno a pocos bits matchean las dos y no se
+    # cachean. Solo se guardan placas reconocidas: un frame sin placa no dice nada del bumper
+    def __init__(self, max_size: int = OCR_CACHE_SIZE, radius: int = OCR_CACHE_RADIUS, path: Optional[str] = None) -> None:
+        self.max_size: int = max_size
+        self.radius: int = radius
+        self.path: Optional[str] = path
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: "OrderedDict[int, str]" = OrderedDict()
+        self._keys: Optional[np.ndarray] = None
+        if path is not None:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _nearest_key(self, key: int) -> Optional[int]:
+        if key in self._entries:
+            return key
+        if self.radius <= 0 or not self._entries:
+            return None
+        if self._keys is None:
+            self._keys = np.fromiter(self._entries.keys(), dtype=np.uint64, count=len(self._entries))
+        distances = popcount64(np.bitwise_xor(self._keys, np.uint64(key)))
+        nearest = int(np.argmin(distances))
+        if distances[nearest] <= self.radius:
+            return int(self._keys[nearest])
+        return None
+
+    def lookup(self, bumper_key: HashLike) -> Tuple[bool, Optional[str]]:
+        key = self._nearest_key(hash_to_int(bumper_key))
+        if key is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return True, self._entries[key]
+
+    def put(self, bumper_key: HashLike, classification: Optional[str]) -> None:
+        if classification is None:
+            return
+        key = hash_to_int(bumper_key)
+        if key not in self._entries:
+            self._keys = None
+        self._entries[key] = classification
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._keys = None
+
+    def update(self, entries: Dict[str, Optional[str]]) -> None:
+        for bumper_key, classification in entries.items():
+            self.put(bumper_key, classification)
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def merge(self, other: "OCRCache") -> None:
+        self.update(other.entries())
+        self.hits += other.hits
+        self.misses += other.misses
+
+    def entries(self) -> Dict[str, str]:
+        return {int_to_hex(key): classification for key, classification in self._entries.items()}
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self) -> None:
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as cache_file:
+                data = json.load(cache_file)
+            # caches de versiones anteriores (claves por dhash del frame) o de otro dhash se descartan
+            if data.get("version") == OCR_CACHE_VERSION and data.get("dhash_version") == DHASH_VERSION:
+                self.update(data["entries"])
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning(f"OCR cache {self.path} unreadable, starting empty: {e}")
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as cache_file:
+            json.dump(
+                {"version": OCR_CACHE_VERSION, "dhash_version": DHASH_VERSION, "entries": self.entries()}, cache_file
+            )
+        os.replace(tmp_path, self.path)
+
+
+def channel_ocr_cache_path(channel: str, folder: str = settings.BUMPER_DETECTION_DIR) -> str:
+    return os.path.join(folder, f".{format_channel_name(channel)}.ocr_cache.json")
+
+
+def load_channel_ocr_cache(channel: str, folder: str = settings.BUMPER_DETECTION_DIR) -> OCRCache:
+    return OCRCache(path=channel_ocr_cache_path(channel, folder))
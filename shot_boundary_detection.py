@@ -1,15 +1,32 @@
 import os
 import time
 from datetime import datetime
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import cv2
+import numpy as np
 import pandas as pd
-from scenedetect import ContentDetector, SceneManager, StatsManager, open_video
+from scenedetect import ContentDetector, SceneManager, open_video
 from tqdm import tqdm
 
-from config import reader, settings
-from utils import classify_board, datetime_to_string, get_frame_dhash, format_channel_name
+import metrics
+from bumper_index import BumperIndex
+from checkpoint import JobCheckpoint
+from config import logger, settings
+from deadline import Deadline, stop_on_expiry
+from dhash_engine import compute_dhash
+from ocr_batch import OCRBatcher, load_text_gate
+from text_region import TextRegion, load_text_region
+from utils import datetime_to_string, format_channel_name, get_frame_dhash
+
+SBD_DOWNSCALE = int(settings.SBD_DOWNSCALE)
+SBD_FRAME_SKIP = int(settings.SBD_FRAME_SKIP)
+BUMPER_TOP_K = int(settings.BUMPER_TOP_K)
+BUMPER_MIN_CONFIDENCE = float(settings.BUMPER_MIN_CONFIDENCE)
+BUMPERS_PER_LABEL = int(settings.BUMPERS_PER_LABEL)
+DHASH_THRESHOLD = int(settings.DHASH_THRESHOLD)
+CONTENT_THRESHOLD = 11
+CANDIDATE_FRAME_STEP = 10  # skip frame factor
 
 
 def get_event_times(events_dataframe: pd.DataFrame) -> List[int]:
@@ -29,19 +46,31 @@ def get_scene_duration(scene: pd.Series) -> float:
     return float(scene["End_Seconds"]) - float(scene["Start_Seconds"])
 
 
-def list_scenes(scenes: pd.DataFrame, fps_second: int, f_skip_factor: int) -> List[int]:
-    scenes_list: List[int] = []
+def list_scenes(scenes: pd.DataFrame, fps_second: int, f_skip_factor: int) -> np.ndarray:
+    start_frames = scenes["Start_Frames"].to_numpy(dtype=np.int64)
+    durations = scenes["End_Seconds"].to_numpy(dtype=float) - scenes["Start_Seconds"].to_numpy(dtype=float)
+    return scene_candidate_frames(start_frames, durations, fps_second, f_skip_factor)
+
+
+def scene_candidate_frames(
+    start_frames: np.ndarray, durations: np.ndarray, fps_second: int, f_skip_factor: int
+) -> np.ndarray:
     time_skip: float = f_skip_factor / fps_second
+    in_window = (settings.BUMPER_TIME_WINDOW[0] < durations) & (durations < settings.BUMPER_TIME_WINDOW[1])
+    start_frames, durations = start_frames[in_window], durations[in_window]
 
-    for _, scene in scenes.iterrows():
-        scene_duration = get_scene_duration(scene)
-        if settings.BUMPER_TIME_WINDOW[0] < scene_duration < settings.BUMPER_TIME_WINDOW[1]:
-            n = 1
-            while n * time_skip < scene_duration:
-                scenes_list.append(int(scene["Start_Frames"]) + n * f_skip_factor)
-                n += 1
+    # n = 1, 2, ... mientras n * time_skip < duracion; se genera una cota y se filtra con la misma comparacion
+    steps = np.floor(durations / time_skip).astype(np.int64) + 1
+    scene_index = np.repeat(np.arange(len(steps)), steps)
+    n = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps) + 1
+    keep = n * time_skip < durations[scene_index]
+    return start_frames[scene_index[keep]] + n[keep] * f_skip_factor
 
-    return scenes_list
+
+def unique_scene_frames(video_scenes: np.ndarray) -> np.ndarray:
+    # frames que aparecen en una sola escena candidata, ordenados
+    frames, counts = np.unique(video_scenes, return_counts=True)
+    return frames[counts == 1]
 
 
 def count_words_in_ocr(ocr: List[str]) -> int:
@@ -51,112 +80,229 @@ def count_words_in_ocr(ocr: List[str]) -> int:
     return counter
 
 
-def find_new_bumpers_sbd(
-    scenes_df: pd.DataFrame, video_path: str
-) -> Tuple[Optional[Any], Optional[Any], Optional[Any], Optional[Any]]:
+class BumperCandidates:
+    # Los mejores BUMPER_TOP_K candidatos de cada placa, ordenados por confianza del OCR y sin casi-duplicados:
+    # un candidato a menos de DHASH_THRESHOLD de otro ya guardado solo lo reemplaza si tiene mas confianza.
+    # En memoria quedan a lo sumo BUMPER_TOP_K frames por placa
+    def __init__(
+        self,
+        top_k: int = BUMPER_TOP_K,
+        min_confidence: float = BUMPER_MIN_CONFIDENCE,
+        per_label: int = BUMPERS_PER_LABEL,
+        distance: int = DHASH_THRESHOLD,
+    ) -> None:
+        self.top_k: int = max(1, top_k, per_label)
+        self.min_confidence: float = min_confidence
+        self.per_label: int = max(1, per_label)
+        self.distance: int = distance
+        # si la lectura de candidatos se corto por el plazo: el proximo candidato a leer
+        self.resume_frame: Optional[int] = None
+        # placa -> [(confianza, dhash, frame)] de mayor a menor confianza
+        self.ranked: Dict[str, List[Tuple[float, int, Any]]] = {
+            settings.START_EVENT_NAME: [],
+            settings.END_EVENT_NAME: [],
+        }
+
+    def add(self, label: Optional[str], frame: Any, confidence: float) -> None:
+        ranked = self.ranked.get(label)
+        if ranked is None:
+            return
+        frame_hash = compute_dhash(frame)
+        for index, (other_confidence, other_hash, _) in enumerate(ranked):
+            if bin(frame_hash ^ other_hash).count("1") <= self.distance:
+                if confidence > other_confidence:
+                    ranked[index] = (confidence, frame_hash, frame)
+                    ranked.sort(key=lambda candidate: -candidate[0])
+                return
+        ranked.append((confidence, frame_hash, frame))
+        ranked.sort(key=lambda candidate: -candidate[0])
+        del ranked[self.top_k:]
+
+    def confident(self, label: str) -> int:
+        return sum(confidence >= self.min_confidence for confidence, _, _ in self.ranked[label])
+
+    @property
+    def done(self) -> bool:
+        return all(self.confident(label) >= self.per_label for label in self.ranked)
+
+    def selected(self, label: str) -> List[Any]:
+        return [frame for _, _, frame in self.ranked[label][: self.per_label]]
+
+    def summary(self) -> Dict[str, List[float]]:
+        return {label: [round(confidence, 3) for confidence, _, _ in ranked] for label, ranked in self.ranked.items()}
+
+
+def discover_bumpers(
+    scenes_df: pd.DataFrame,
+    video_path: str,
+    text_region: Optional[TextRegion] = None,
+    candidates: Optional[BumperCandidates] = None,
+    deadline: Optional[Deadline] = None,
+    start_frame: int = 0,
+) -> BumperCandidates:
     video_capture = cv2.VideoCapture(video_path)
     fps: float = video_capture.get(cv2.CAP_PROP_FPS)
-    video_scenes: List[int] = list_scenes(scenes_df, int(fps), 10)  # skip frame factor
-    video_scenes.sort()
-    video_scenes_unique: List[int] = []
-    for num in video_scenes:
-        if video_scenes.count(num) == 1:
-            video_scenes_unique.append(num)
-
+    video_scenes: np.ndarray = list_scenes(scenes_df, int(fps), CANDIDATE_FRAME_STEP)
+    video_scenes_unique: List[int] = [
+        frame_number for frame_number in unique_scene_frames(video_scenes).tolist() if frame_number >= start_frame
+    ]
+    candidates = candidates if candidates is not None else BumperCandidates()
+
+    def on_candidate(frame_number: int, placa_detected: Optional[str], image: Any, confidence: float) -> None:
+        logger.debug(f"Frame {frame_number} classified as {placa_detected} ({confidence:.2f})")
+        metrics.inc("bumper_candidates")
+        candidates.add(placa_detected, image, confidence)
+
+    # lectura completa de cada candidato; de las placas reconocidas se aprende la zona de texto del canal
+    batcher = OCRBatcher(
+        on_candidate, text_region=text_region, crop=False, text_gate=load_text_gate(), with_confidence=True
+    )
+    # una sola pasada hacia adelante: grab() no copia ni convierte los frames que no son candidatos
     frame_count: int = 0
-    success: bool = True
-
-    images_inicio: List[Any] = []
-    images_fin: List[Any] = []
+    if start_frame > 0:
+        video_capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        frame_count = start_frame
+    read: int = 0
     for frame_number in tqdm(video_scenes_unique, desc="Analyzing scene for bumpers"):
-        while success:
-            success, image = video_capture.read()
-
-            if not success:
-                frame_count += 1
-                break
-
-            if frame_count == frame_number:
-                frame_text: List[str] = reader.readtext(image, detail=0)
-                placa_detected: str = classify_board(frame_text)
-                print(f"Frame {frame_count} classified as {placa_detected}")
-                if placa_detected == settings.START_EVENT_NAME:
-                    images_inicio.append(image)
-
-                if placa_detected == settings.END_EVENT_NAME:
-                    images_fin.append(image)
-
-                frame_count += 1
-                break
+        if deadline is not None and deadline.expired():
+            candidates.resume_frame = frame_number
+            break
+        while frame_count < frame_number and video_capture.grab():
             frame_count += 1
-
+        if frame_count < frame_number:
+            break
+        success, image = video_capture.read()
+        if not success:
+            break
+        frame_count += 1
+        read += 1
+        batcher.add(frame_number, image)
+        if candidates.done:
+            break
+    batcher.flush()
     video_capture.release()
-    inicio_image, inicio_hash = (
-        (images_inicio[0], get_frame_dhash(images_inicio[0])) if len(images_inicio) > 0 else (None, None)
-    )
-    fin_image, fin_hash = (images_fin[0], get_frame_dhash(images_fin[0])) if len(images_fin) > 0 else (None, None)
+    if candidates.done and read < len(video_scenes_unique):
+        metrics.inc("bumper_discovery_early_exits")
+        logger.debug(f"discover_bumpers: confident bumpers after {read} of {len(video_scenes_unique)} candidates")
+    logger.debug(f"discover_bumpers: candidate OCR {batcher.stats()}, ranked {candidates.summary()}")
+    return candidates
+
 
+def find_new_bumpers_sbd(
+    scenes_df: pd.DataFrame, video_path: str
+) -> Tuple[Optional[Any], Optional[Any], Optional[Any], Optional[Any]]:
+    # la mejor placa de inicio y de fin de discover_bumpers; (None, None) para la que no se encontro
+    candidates = discover_bumpers(scenes_df, video_path)
+    inicio = candidates.selected(settings.START_EVENT_NAME)[:1]
+    fin = candidates.selected(settings.END_EVENT_NAME)[:1]
+    inicio_image, inicio_hash = (inicio[0], get_frame_dhash(inicio[0])) if inicio else (None, None)
+    fin_image, fin_hash = (fin[0], get_frame_dhash(fin[0])) if fin else (None, None)
     return inicio_image, inicio_hash, fin_image, fin_hash
 
 
-def find_scenes(video_path: str, detector: Any) -> pd.DataFrame:
+@metrics.timed("find_scenes")
+def find_scenes(
+    video_path: str, detector: Any, deadline: Optional[Deadline] = None, start_frame: int = 0
+) -> pd.DataFrame:
+    # con el plazo vencido devuelve las escenas hasta donde llego: la ultima termina en el frame alcanzado
     video = open_video(video_path)
-    scene_manager = SceneManager(stats_manager=StatsManager())
+    if start_frame > 0:
+        video.seek(start_frame)
+    # sin StatsManager: no se usan las metricas por frame y es incompatible con frame_skip
+    scene_manager = SceneManager()
+    if SBD_DOWNSCALE > 0:
+        scene_manager.auto_downscale = False
+        scene_manager.downscale = SBD_DOWNSCALE
     scene_manager.add_detector(detector)
-    scene_manager.detect_scenes(video)
-
-    scenes_df = pd.DataFrame(
-        columns=[
-            "Start_Timecode",
-            "Start_Seconds",
-            "Start_Frames",
-            "End_Timecode",
-            "End_Seconds",
-            "End_Frames",
-        ]
-    )
+    with stop_on_expiry(deadline, scene_manager.stop):
+        scene_manager.detect_scenes(video, frame_skip=SBD_FRAME_SKIP)
+
     scene_list = scene_manager.get_scene_list()
-    num_scenes = len(scene_list)
-    for idx, scene in enumerate(tqdm(scene_list, desc="Detecting scenes for bumper detection", unit="scene")):
-        scene_dict = {
-            "Start_Timecode": scene[0].get_timecode(),
-            "Start_Seconds": scene[0].get_seconds(),
-            "Start_Frames": scene[0].get_frames(),
-            "End_Timecode": scene[1].get_timecode(),
-            "End_Seconds": scene[1].get_seconds(),
-            "End_Frames": scene[1].get_frames(),
+    metrics.inc("scenes", len(scene_list))
+    return pd.DataFrame(
+        {
+            "Start_Timecode": [scene[0].get_timecode() for scene in scene_list],
+            "Start_Seconds": np.array([scene[0].get_seconds() for scene in scene_list], dtype=float),
+            "Start_Frames": np.array([scene[0].get_frames() for scene in scene_list], dtype=np.int64),
+            "End_Timecode": [scene[1].get_timecode() for scene in scene_list],
+            "End_Seconds": np.array([scene[1].get_seconds() for scene in scene_list], dtype=float),
+            "End_Frames": np.array([scene[1].get_frames() for scene in scene_list], dtype=np.int64),
         }
-        scenes_df = pd.concat([scenes_df, pd.DataFrame(scene_dict, index=[0])], ignore_index=True)
-
-    return scenes_df
-
-
-def new_bumper_detection(video: str, channel: str) -> str:
-    scene_df_content: pd.DataFrame = find_scenes(video, ContentDetector(threshold=11))
-    inicio_image, inicio_hash, fin_image, fin_hash = find_new_bumpers_sbd(scene_df_content, video)
+    )
 
-    if str(inicio_hash) == "TERMINATED":
-        return "TERMINATED"
-    current_date: datetime = datetime.now()
 
+def join_scenes(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    # la ultima escena antes del corte termina en el frame alcanzado, que no es un cambio de escena: se une con
+    # la primera escena de la reanudacion
+    if len(before) == 0 or len(after) == 0:
+        return pd.concat([before, after], ignore_index=True)
+    before = before.copy()
+    last = before.index[-1]
+    for column in ("End_Timecode", "End_Seconds", "End_Frames"):
+        before.at[last, column] = after[column].iloc[0]
+    return pd.concat([before, after.iloc[1:]], ignore_index=True)
+
+
+@metrics.timed("new_bumper_detection")
+def new_bumper_detection(
+    video: str,
+    channel: str,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[JobCheckpoint] = None,
+) -> str:
+    # con plazo vencido devuelve "TERMINATED" y deja en el checkpoint las escenas y la posicion alcanzada
+    candidate_frame = 0
+    if checkpoint is not None and checkpoint.stage == "candidates":
+        scene_df_content = checkpoint.scenes_df()
+        candidate_frame = checkpoint.frame
+    else:
+        resumed = checkpoint is not None and checkpoint.stage == "scenes"
+        scene_start = checkpoint.frame if resumed else 0
+        scene_df_content = find_scenes(video, ContentDetector(threshold=CONTENT_THRESHOLD), deadline, scene_start)
+        if resumed:
+            scene_df_content = join_scenes(checkpoint.scenes_df(), scene_df_content)
+        if deadline is not None and deadline.expired():
+            reached = int(scene_df_content["End_Frames"].iloc[-1]) if len(scene_df_content) else scene_start
+            if checkpoint is not None:
+                checkpoint.save("scenes", reached, scenes=scene_df_content)
+            logger.warning(f"new_bumper_detection: {deadline.reason} detecting scenes at frame {reached}")
+            return "TERMINATED"
+    if text_region is None:
+        text_region = load_text_region(channel)
+    candidates = discover_bumpers(scene_df_content, video, text_region, deadline=deadline, start_frame=candidate_frame)
+    saved = save_bumper_candidates(channel, candidates)
+    if candidates.resume_frame is None:
+        return "SUCCESS"
+    logger.warning(f"new_bumper_detection: {deadline.reason} reading candidates at frame {candidates.resume_frame}")
+    if checkpoint is not None:
+        # con inicio y fin ya guardados la reanudacion pasa directo al escaneo, desde el principio
+        if saved:
+            checkpoint.discovered = True
+            checkpoint.save("scan", 0)
+        else:
+            checkpoint.save("candidates", candidates.resume_frame, scenes=scene_df_content)
+    return "TERMINATED"
+
+
+def save_bumper_candidates(channel: str, candidates: BumperCandidates) -> bool:
+    # hasta BUMPERS_PER_LABEL placas distintas de cada tipo; sin inicio y fin no se guarda nada
+    selected = {label: candidates.selected(label) for label in candidates.ranked}
+    if not all(selected.values()):
+        return False
     formatted_channel: str = format_channel_name(channel)
-    formatted_date: str = datetime_to_string(current_date).replace(" ", "_")
-    if inicio_hash is not None and fin_hash is not None:
-        start_bumper_path: str = os.path.join(
-            settings.BUMPER_DETECTION_DIR,
-            f"{formatted_channel}-{settings.START_EVENT_NAME}-{formatted_date}.jpg",
-        )
-        
-        save_bumper(start_bumper_path, inicio_image)
-
-        end_bumper_path: str = os.path.join(
-            settings.BUMPER_DETECTION_DIR,
-            f"{formatted_channel}-{settings.END_EVENT_NAME}-{formatted_date}.jpg",
-        )
-
-        save_bumper(end_bumper_path, fin_image)
-    return "SUCCESS"
-
-
-def save_bumper(path: str, bumper: Any) -> None:
+    formatted_date: str = datetime_to_string(datetime.now()).replace(" ", "_")
+    for label, frames in selected.items():
+        for rank, frame in enumerate(frames):
+            suffix = f"-{rank}" if rank > 0 else ""
+            path = os.path.join(
+                settings.BUMPER_DETECTION_DIR, f"{formatted_channel}-{label}-{formatted_date}{suffix}.jpg"
+            )
+            save_bumper(path, frame, channel)
+    return True
+
+
+def save_bumper(path: str, bumper: Any, channel: Optional[str] = None) -> None:
     cv2.imwrite(path, bumper)
+    if channel is not None:
+        BumperIndex(channel, os.path.dirname(path)).add(path)
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+# config lee el entorno al importarse: los tests no escriben bumpers, checkpoints ni tracks fuera de una carpeta
+# temporal
+STATE_DIR = tempfile.mkdtemp(prefix="tv_ad_tests_")
+os.environ["BUMPER_DETECTION_DIR"] = os.path.join(STATE_DIR, "bumpers") + "/"
+os.environ["CHECKPOINT_ENABLED"] = "false"
+os.environ["HASH_TRACK_ENABLED"] = "false"
+os.environ["OCR_CACHE_PERSIST"] = "false"
+
+VIDEO_PARAMS: Dict[str, Any] = {
+    "seconds": 60,
+    "fps": 25,
+    "width": 640,
+    "height": 360,
+    "breaks": 2,
+    "seed": 0,
+    "same_design": True,
+}
+
+
+@pytest.fixture(scope="session")
+def synthetic_video(tmp_path_factory: pytest.TempPathFactory) -> Tuple[str, Dict[str, Any]]:
+    # placas de inicio y fin con el mismo diseno: quedan a pocos bits en dHash y solo el OCR las distingue
+    from synthetic_video import load_or_generate
+
+    return load_or_generate(str(tmp_path_factory.mktemp("video")), **VIDEO_PARAMS)
+
+
+@pytest.fixture(scope="session")
+def card_hashes(synthetic_video: Tuple[str, Dict[str, Any]]) -> List[int]:
+    import cv2
+
+    from dhash_engine import compute_dhash
+    from synthetic_video import CARD_TEXT, card_path
+
+    folder = os.path.dirname(synthetic_video[0])
+    return [compute_dhash(cv2.imread(card_path(folder, label, True))) for label in CARD_TEXT]
+
+
+@pytest.fixture
+def oracle_reader(monkeypatch: pytest.MonkeyPatch) -> Any:
+    # lector exacto de las placas sinteticas en lugar de easyocr
+    import config
+    from bench_suite import OracleReader
+
+    reader = OracleReader(same_design=True)
+    monkeypatch.setattr(config, "_reader", reader)
+    return reader
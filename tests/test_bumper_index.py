@@ -0,0 +1,27 @@
+import os
+import shutil
+
+from bumper_index import get_indexed_bumpers_dhashes, load_bumper_index
+from dhash_engine import hash_to_int
+from synthetic_video import CARD_TEXT, card_path
+
+
+def test_overwritten_bumper_is_rehashed(synthetic_video, card_hashes, tmp_path) -> None:
+    # sobrescribir una imagen con el mismo nombre no cambia el mtime de la carpeta
+    cards = [card_path(os.path.dirname(synthetic_video[0]), label, True) for label in CARD_TEXT]
+    folder = str(tmp_path) + "/"
+    bumper = os.path.join(folder, "overwrite-start-card.png")
+    shutil.copy(cards[0], bumper)
+    os.utime(bumper, (1_000_000, 1_000_000))
+    assert [hash_to_int(dhash) for dhash in get_indexed_bumpers_dhashes("overwrite", folder)] == [card_hashes[0]]
+    # la primera carga guardo el indice y cambio la carpeta: con esta el cache queda al dia
+    index = load_bumper_index("overwrite", folder)
+    assert load_bumper_index("overwrite", folder) is index
+    folder_mtime = os.stat(folder).st_mtime_ns
+    with open(cards[1], "rb") as source, open(bumper, "wb") as target:
+        target.write(source.read())
+    os.utime(bumper, (2_000_000, 2_000_000))
+    assert os.stat(folder).st_mtime_ns == folder_mtime
+    assert [hash_to_int(dhash) for dhash in get_indexed_bumpers_dhashes("overwrite", folder)] == [card_hashes[1]]
+    assert index.entries["overwrite-start-card.png"]["mtime"] == 2_000_000
+
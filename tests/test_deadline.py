@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR, TESTS_DIR
+
+# el plazo por defecto se lee de la configuracion al importar: cada configuracion corre en su propio interprete
+RERUN_SCRIPT = """
+import json, os, shutil, sys
+sys.path[:0] = [{repo!r}, {benchmarks!r}]
+import config
+from bench_suite import OracleReader
+from synthetic_video import CARD_TEXT, card_path
+
+config._reader = OracleReader(same_design=True)
+from bumper_index import get_indexed_bumpers_dhashes
+from tv_ad_detector import placa_detector
+
+video_file, seconds, start_date = sys.argv[1], float(sys.argv[2]), sys.argv[3]
+for label in CARD_TEXT:
+    bumper_file = os.path.join(os.environ["BUMPER_DETECTION_DIR"], "test-" + label + ".png")
+    shutil.copy(card_path(os.path.dirname(video_file), label, True), bumper_file)
+runs = []
+while len(runs) < 40:
+    result = placa_detector(video_file, seconds, get_indexed_bumpers_dhashes("test"), start_date, "test")
+    runs.append(result.get("status") if isinstance(result, dict) else result)
+    if runs[-1] is None:
+        break
+print(json.dumps({{"runs": runs, "result": result}}))
+"""
+
+
+def run_until_done(synthetic_video, tmp_path, **env):
+    video_file, truth = synthetic_video
+    bumpers_dir = tmp_path / "bumpers"
+    bumpers_dir.mkdir()
+    script = RERUN_SCRIPT.format(repo=REPO_DIR, benchmarks=os.path.join(REPO_DIR, "benchmarks"))
+    environment = dict(
+        os.environ,
+        BUMPER_DETECTION_DIR=f"{bumpers_dir}/",
+        CHECKPOINT_DIR=f"{tmp_path / 'checkpoints'}/",
+        CHECKPOINT_INTERVAL="0.2",
+        **env,
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script, video_file, str(truth["seconds"]), truth["start_date"]],
+        cwd=TESTS_DIR,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("checkpoint_enabled", ["false", "true"])
+def test_job_cut_by_the_deadline_finishes_on_rerun(synthetic_video, tmp_path, checkpoint_enabled) -> None:
+    from bench_suite import break_metrics
+    from tv_ad_detector import placa_fin, placa_inicio
+
+    # un plazo mucho mas corto que el escaneo
+    done = run_until_done(synthetic_video, tmp_path, DETECTION_TIMEOUT="0.5", CHECKPOINT_ENABLED=checkpoint_enabled)
+    assert done["runs"][-1] is None, done["runs"]
+    if checkpoint_enabled == "false":
+        # sin checkpoints no hay plazo por defecto: la primera corrida termina
+        assert done["runs"] == [None]
+    else:
+        assert len(done["runs"]) > 1 and set(done["runs"][:-1]) == {"TERMINATED"}
+    result = break_metrics(done["result"], synthetic_video[1], tolerance=2.0, event_names=(placa_inicio, placa_fin))
+    assert (result["precision"], result["recall"]) == (1.0, 1.0)
@@ -0,0 +1,50 @@
+import json
+import time
+
+from detection_service import DetectionService
+
+
+def finish(service, job, result):
+    # lo que hace el despachador con un trabajo, sin el pool de procesos
+    with service._lock:
+        service._queue.remove(job)
+        service._running[job.channel] = service._running.get(job.channel, 0) + 1
+        job.started_at = time.time()
+    service._finish(job, result, 1.0, None)
+
+
+def test_finished_jobs_are_evicted(tmp_path) -> None:
+    service = DetectionService(watch_dir=None, results_dir=None, watch_state_file=None, max_finished_jobs=2)
+    jobs = [service.submit(str(tmp_path / f"{i}.mp4"), "canal") for i in range(4)]
+    for job in jobs[:3]:
+        finish(service, job, {"items": []})
+    # solo quedan los dos ultimos terminados; el que sigue en cola no se toca
+    assert [service.get_job(job.job_id) for job in jobs] == [None, jobs[1], jobs[2], jobs[3]]
+    service.job_retention = 0
+    time.sleep(0.01)
+    assert service.get_job(jobs[2].job_id) is None
+    assert service.get_job(jobs[3].job_id) is jobs[3]
+    service.cancel(jobs[3].job_id)
+    assert service.get_job(jobs[3].job_id) is None
+
+
+def test_watch_state_forgets_deleted_recordings(tmp_path) -> None:
+    watch_dir, state_file = tmp_path / "watch", tmp_path / "watch_state.json"
+    (watch_dir / "canal").mkdir(parents=True)
+    recordings = [watch_dir / "canal" / f"{name}.mp4" for name in ("a", "b")]
+    for recording in recordings:
+        recording.write_bytes(b"0" * 10)
+    service = DetectionService(watch_dir=str(watch_dir), results_dir=None, watch_state_file=str(state_file))
+    # el tamano tiene que repetirse en dos pasadas para encolar
+    service.scan_watch_folders()
+    service.scan_watch_folders()
+    for job in list(service._queue):
+        finish(service, job, {"items": []})
+    service.scan_watch_folders()
+    with open(state_file) as f:
+        assert {status["status"] for status in json.load(f).values()} == {"done"}
+    recordings[0].unlink()
+    service.scan_watch_folders()
+    with open(state_file) as f:
+        assert list(json.load(f)) == [str(recordings[1])]
+    assert service._watch_submitted == {str(recordings[1])}
@@ -0,0 +1,57 @@
+from typing import List
+
+import cv2
+import imagehash
+import numpy as np
+import pytest
+from PIL import Image
+
+from dhash_engine import DHashMatcher, compute_dhash, compute_dhashes, int_to_bits, int_to_imagehash
+from synthetic_video import CARD_TEXT, ShotGenerator, make_card
+
+SIZES = [(1280, 720), (640, 360), (320, 180)]
+NEAR_TIE = 2  # niveles de gris entre columnas vecinas de la grilla exacta
+
+
+def sample_frames(width: int, height: int) -> List[np.ndarray]:
+    shots = ShotGenerator(width, height, np.random.default_rng(0))
+    frames = [make_card(label, width, height, same) for label in CARD_TEXT for same in (False, True)]
+    for k in range(20):
+        shot = shots.new_shot(commercial=k % 2 == 0)
+        frames += [shots.frame(shot, 0), shots.frame(shot, 7)]
+    return frames
+
+
+@pytest.mark.parametrize("width,height", SIZES)
+def test_drift_from_imagehash_only_on_near_ties(width, height) -> None:
+    # la reduccion por area previa al Lanczos solo puede dar vuelta bits entre columnas casi iguales
+    exact = 0
+    frames = sample_frames(width, height)
+    for frame in frames:
+        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        reference = imagehash.dhash(image)
+        engine_hash = compute_dhash(frame)
+        distance = int_to_imagehash(engine_hash) - reference
+        assert distance <= 3
+        exact += distance == 0
+        grid = np.asarray(image.convert("L").resize((9, 8), Image.LANCZOS)).astype(np.int16)
+        flipped = int_to_bits(engine_hash) != reference.hash
+        assert (np.abs(np.diff(grid, axis=1))[flipped] <= NEAR_TIE).all()
+    assert exact >= 0.9 * len(frames)
+
+
+def test_batch_hashes_match_single() -> None:
+    frames = sample_frames(640, 360)
+    assert compute_dhashes(frames).tolist() == [compute_dhash(frame) for frame in frames]
+
+
+def test_same_design_cards_match_both_bumpers() -> None:
+    # placas del mismo diseno quedan a pocos bits: un frame de cualquiera matchea los dos bumpers
+    start, end = (compute_dhash(make_card(label, 640, 360, True)) for label in CARD_TEXT)
+    assert bin(start ^ end).count("1") < 8
+    matcher = DHashMatcher([start, end])
+    assert matcher.unique_match(start, 8) is None
+    assert matcher.is_match(end, 8)
+    end = compute_dhash(make_card("end", 640, 360))
+    distinct = DHashMatcher([compute_dhash(make_card("start", 640, 360)), end])
+    assert distinct.unique_match(end, 8) == end
@@ -0,0 +1,95 @@
+import shutil
+from typing import Any, List
+
+import cv2
+import numpy as np
+import pytest
+
+from frame_source import FFMPEG_BINARY, FFmpegFrameSource, FrameSource, open_keyframe_source
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which(FFMPEG_BINARY) is None, reason=f"{FFMPEG_BINARY} not in PATH")
+SEEK_FRAMES = [0, 1, 37, 600, 1201]
+
+
+def thumbnail(frame: Any) -> np.ndarray:
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(frame, (32, 18), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+@pytest.fixture(scope="module")
+def reference(synthetic_video) -> List[np.ndarray]:
+    # miniatura de cada frame leido en orden con OpenCV, sin seek
+    cap = cv2.VideoCapture(synthetic_video[0])
+    thumbnails = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        thumbnails.append(thumbnail(frame))
+    cap.release()
+    return thumbnails
+
+
+def assert_frame(reference: List[np.ndarray], index: int, frame: Any) -> None:
+    assert np.abs(thumbnail(frame) - reference[index]).max() <= 2, f"frame {index}"
+
+
+def read_all(source: FrameSource, reference: List[np.ndarray]) -> List[int]:
+    indices = []
+    while True:
+        ret, frame = source.read()
+        if not ret:
+            break
+        assert_frame(reference, source.frame_index, frame)
+        indices.append(source.frame_index)
+    source.release()
+    return indices
+
+
+@pytest.mark.parametrize("every", [1, 3, 25])
+def test_opencv_every(synthetic_video, reference, every) -> None:
+    indices = read_all(FrameSource(synthetic_video[0], every=every), reference)
+    assert indices == list(range(every - 1, len(reference), every))
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize("every", [1, 3, 25])
+def test_ffmpeg_every(synthetic_video, reference, every) -> None:
+    indices = read_all(FFmpegFrameSource(synthetic_video[0], every=every), reference)
+    assert indices == list(range(every - 1, len(reference), every))
+
+
+@pytest.mark.parametrize("source_class", [FrameSource, pytest.param(FFmpegFrameSource, marks=needs_ffmpeg)])
+def test_seek(synthetic_video, reference, source_class) -> None:
+    source = source_class(synthetic_video[0], every=4)
+    for start in SEEK_FRAMES:
+        source.seek(start)
+        ret, frame = source.read()
+        assert ret
+        # con every el primer frame despues del seek es el primero con (indice + 1) % every == 0
+        assert source.frame_index == start + (-(start + 1)) % 4
+        assert_frame(reference, source.frame_index, frame)
+    source.release()
+
+
+@pytest.mark.parametrize("source_class", [FrameSource, pytest.param(FFmpegFrameSource, marks=needs_ffmpeg)])
+def test_full_frame(synthetic_video, reference, source_class) -> None:
+    source = source_class(synthetic_video[0], width=90, height=40, gray=True)
+    for _ in range(10):
+        source.read()
+    for index in (9, 3, 500, 520, 100, len(reference) - 1):
+        frame = source.full_frame(index)
+        assert frame.shape == (360, 640, 3)
+        assert_frame(reference, index, frame)
+    source.release()
+
+
+@needs_ffmpeg
+def test_keyframe_indices(synthetic_video, reference) -> None:
+    source = open_keyframe_source(synthetic_video[0])
+    indices = read_all(source, reference)
+    assert indices[0] == 0 and indices == sorted(set(indices))
+    source = open_keyframe_source(synthetic_video[0])
+    source.seek(indices[len(indices) // 2])
+    assert read_all(source, reference) == indices[len(indices) // 2:]
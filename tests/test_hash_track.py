@@ -0,0 +1,38 @@
+import os
+import shutil
+
+import pytest
+
+from hash_track import HashTrackWriter, load_hash_track, rescan_video
+from tv_ad_detector import bumper_dhash_detector, process_events
+
+
+@pytest.fixture
+def video_copy(synthetic_video, tmp_path) -> str:
+    # el track se escribe al lado de la grabacion: copia propia para no compartirlo entre tests
+    video_file = str(tmp_path / os.path.basename(synthetic_video[0]))
+    shutil.copy(synthetic_video[0], video_file)
+    return video_file
+
+
+def write_track(video_file: str, truth, card_hashes, scan_mode: str):
+    hash_track = HashTrackWriter(video_file, truth["start_date"], scan_mode)
+    events = bumper_dhash_detector(video_file, card_hashes, truth["start_date"], scan_mode, 0, None, None, hash_track)
+    hash_track.save(truth["fps"], truth["frame_count"])
+    return events
+
+
+def test_rescan_matches_dense_scan(video_copy, synthetic_video, card_hashes, oracle_reader) -> None:
+    truth = synthetic_video[1]
+    events = write_track(video_copy, truth, card_hashes, "dense")
+    breaks = process_events(events, truth["start_date"], truth["seconds"])
+    assert len(breaks["items"]) == len(truth["breaks"])
+    raw_events = rescan_video(video_copy, card_hashes)
+    assert process_events(raw_events, truth["start_date"], truth["seconds"]) == breaks
+
+
+def test_coarse_track_is_not_rescanned(video_copy, synthetic_video, card_hashes, oracle_reader) -> None:
+    # el track coarse no tiene los frames entre keyframes: un bumper nuevo ahi se perderia
+    write_track(video_copy, synthetic_video[1], card_hashes, "coarse")
+    assert load_hash_track(video_copy)[1]["scan_mode"] == "coarse"
+    assert rescan_video(video_copy, card_hashes) is None
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from bench_classifier import build_boards, build_corpus, reference_classify_board, reference_flags
+from bench_suite import BOARDS
+from keyword_classifier import KeywordClassifier, damerau_levenshtein
+from utils import classification_words, classify_board
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return build_corpus(random.Random(0), 120)
+
+
+def test_flags_match_spellcheck_candidates(corpus) -> None:
+    classifier = KeywordClassifier(classification_words)
+    for word in corpus:
+        expected = reference_flags(word) or [False] * len(classification_words)
+        assert classifier.flags(word) == expected, word
+
+
+def test_classify_board_matches_reference(corpus) -> None:
+    for board in build_boards(random.Random(1), corpus, 60):
+        assert classify_board(board) == reference_classify_board(board), board
+
+
+@pytest.mark.parametrize("board,expected", BOARDS)
+def test_classify_board_known_boards(board, expected) -> None:
+    assert classify_board(board) == expected
+
+
+@pytest.mark.parametrize(
+    "a,b,distance",
+    [("inicio", "inicio", 0), ("inicio", "inico", 1), ("inicio", "iniico", 1), ("inicio", "inciio", 1), ("fin", "", 3)],
+)
+def test_damerau_levenshtein(a, b, distance) -> None:
+    assert damerau_levenshtein(a, b) == distance
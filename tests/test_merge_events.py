@@ -0,0 +1,46 @@
+from tv_ad_detector import (
+    CHUNK_OVERLAP_SECONDS,
+    bumper_dhash_detector,
+    merge_events,
+    placa_fin,
+    placa_inicio,
+    process_events,
+    split_frame_ranges,
+)
+
+
+def test_merge_events_sorts_and_dedupes_overlap() -> None:
+    first = {"items": {"2024-01-01 10:00:05": placa_inicio, "2024-01-01 10:00:50": placa_fin}}
+    second = {"items": {"2024-01-01 10:00:50": placa_fin, "2024-01-01 10:00:30": placa_inicio}}
+    merged = merge_events([second, first])
+    assert list(merged["items"].items()) == [
+        ("2024-01-01 10:00:05", placa_inicio),
+        ("2024-01-01 10:00:30", placa_inicio),
+        ("2024-01-01 10:00:50", placa_fin),
+    ]
+    assert "resume_frame" not in merged
+
+
+def test_merge_events_resumes_from_earliest_chunk() -> None:
+    merged = merge_events([{"items": {}, "resume_frame": 900}, {"items": {}}, {"items": {}, "resume_frame": 300}])
+    assert merged["resume_frame"] == 300
+
+
+def test_split_frame_ranges_cover_every_frame() -> None:
+    ranges = split_frame_ranges(1000, 3, 20)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 1000
+    for (_, previous_end), (start, _) in zip(ranges, ranges[1:]):
+        assert start == previous_end - 20
+
+
+def test_chunked_scan_matches_single_scan(synthetic_video, card_hashes, oracle_reader) -> None:
+    video_file, truth = synthetic_video
+    start_date = truth["start_date"]
+    single = bumper_dhash_detector(video_file, card_hashes, start_date, "dense")
+    overlap = int(CHUNK_OVERLAP_SECONDS * truth["fps"])
+    chunks = [
+        bumper_dhash_detector(video_file, card_hashes, start_date, "dense", start, end)
+        for start, end in split_frame_ranges(truth["frame_count"], 4, overlap)
+    ]
+    merged = merge_events(chunks)
+    assert process_events(merged, start_date, truth["seconds"]) == process_events(single, start_date, truth["seconds"])
@@ -0,0 +1,31 @@
+import shutil
+
+import pytest
+
+import metrics
+import tv_ad_detector
+from frame_source import FFMPEG_BINARY
+from tv_ad_detector import bumper_dhash_detector
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which(FFMPEG_BINARY) is None, reason=f"{FFMPEG_BINARY} not in PATH")
+
+
+@pytest.mark.parametrize(
+    "scan_mode,decode_backend",
+    [
+        ("dense", "opencv"),
+        ("threaded", "opencv"),
+        pytest.param("dense", "ffmpeg", marks=needs_ffmpeg),
+        # sin ffmpeg el modo coarse escanea todo en modo dense
+        ("coarse", "ffmpeg"),
+    ],
+)
+def test_scan_is_timed_once(
+    synthetic_video, card_hashes, oracle_reader, monkeypatch, scan_mode, decode_backend
+) -> None:
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(tv_ad_detector, "DECODE_BACKEND", decode_backend)
+    video_file, truth = synthetic_video
+    with metrics.collect(profile=False) as collected:
+        bumper_dhash_detector(video_file, card_hashes, truth["start_date"], scan_mode)
+    assert collected.snapshot["histograms"]["bumper_dhash_detector_seconds"]["count"] == 1
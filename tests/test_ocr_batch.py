@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from dhash_engine import compute_dhash
+from ocr_batch import OCRBatcher
+from ocr_cache import OCRCache
+from synthetic_video import make_card
+from tv_ad_detector import placa_fin, placa_inicio
+
+
+@pytest.fixture(scope="module")
+def frames():
+    program = np.full((360, 640, 3), 90, dtype=np.uint8)
+    return {
+        placa_inicio: make_card(placa_inicio, 640, 360, same_design=True),
+        placa_fin: make_card(placa_fin, 640, 360, same_design=True),
+        None: program,
+    }
+
+
+def run_batch(batcher, items):
+    results = {}
+    batcher.on_result = lambda key, classification, frame: results.__setitem__(key, classification)
+    for key, frame, bumper_key in items:
+        batcher.add(key, frame, bumper_key)
+    batcher.flush()
+    return results
+
+
+def test_frames_of_the_same_bumper_are_read_once(frames, oracle_reader) -> None:
+    start_key, end_key = compute_dhash(frames[placa_inicio]), compute_dhash(frames[placa_fin])
+    batcher = OCRBatcher(None, batch_size=16, max_wait=60)
+    items = [(i, frames[placa_inicio], start_key) for i in range(4)]
+    items += [(i, frames[placa_fin], end_key) for i in range(4, 7)]
+    # sin bumper unico (placas del mismo diseno) cada frame se lee aparte
+    items += [(i, frames[placa_fin], None) for i in range(7, 9)]
+    results = run_batch(batcher, items)
+    assert batcher.ocr_frames == 4 and oracle_reader.calls == 4
+    assert results == {i: placa_inicio if i < 4 else placa_fin for i in range(9)}
+
+
+def test_cached_bumpers_are_not_read(frames, oracle_reader) -> None:
+    start_key, program_key = compute_dhash(frames[placa_inicio]), compute_dhash(frames[None])
+    cache = OCRCache()
+    run_batch(OCRBatcher(None, batch_size=16, max_wait=60, ocr_cache=cache), [(0, frames[placa_inicio], start_key)])
+    batcher = OCRBatcher(None, batch_size=16, max_wait=60, ocr_cache=cache)
+    results = run_batch(batcher, [(1, frames[placa_inicio], start_key), (2, frames[None], program_key)])
+    assert results == {1: placa_inicio, 2: None}
+    # solo el frame sin placa se leyo, y no queda en la cache
+    assert batcher.ocr_frames == 1 and oracle_reader.calls == 2
+    assert cache.lookup(program_key) == (False, None)
+
+
+def test_batch_flushes_when_full(frames, oracle_reader) -> None:
+    batcher = OCRBatcher(None, batch_size=2, max_wait=60)
+    run_batch(batcher, [(i, frames[placa_fin], None) for i in range(5)])
+    assert batcher.ocr_batches == 3 and batcher.ocr_frames == 5
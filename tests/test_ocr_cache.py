@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from dhash_engine import DHashMatcher, compute_dhash
+from ocr_cache import OCRCache
+from synthetic_video import make_card
+from tv_ad_detector import DHASH_THRESHOLD, classify_frame, placa_fin, placa_inicio
+
+
+@pytest.fixture(scope="module")
+def same_design_cards():
+    return {label: make_card(label, 640, 360, same_design=True) for label in (placa_inicio, placa_fin)}
+
+
+def test_keyed_by_bumper_not_by_nearby_hash(same_design_cards) -> None:
+    start, end = (compute_dhash(card) for card in same_design_cards.values())
+    assert start != end
+    cache = OCRCache(radius=0)
+    cache.put(start, placa_inicio)
+    assert cache.lookup(start) == (True, placa_inicio)
+    # la placa de fin queda a pocos bits de la de inicio: con radio 0 no hereda su clasificacion
+    assert cache.lookup(end) == (False, None)
+    assert OCRCache(radius=8).lookup(end) == (False, None)
+
+
+def test_unreadable_frames_are_not_cached() -> None:
+    cache = OCRCache()
+    cache.put(0x1234, None)
+    assert len(cache) == 0
+    assert cache.lookup(0x1234) == (False, None)
+
+
+def test_evicts_least_recently_used() -> None:
+    cache = OCRCache(max_size=2)
+    cache.put(1, placa_inicio)
+    cache.put(2, placa_fin)
+    cache.lookup(1)
+    cache.put(3, placa_fin)
+    assert cache.lookup(2) == (False, None)
+    assert cache.lookup(1) == (True, placa_inicio)
+
+
+def test_persisted_cache_round_trip(tmp_path) -> None:
+    path = str(tmp_path / ".channel.ocr_cache.json")
+    cache = OCRCache(path=path)
+    cache.put(0xABCDEF, placa_fin)
+    cache.save()
+    assert OCRCache(path=path).lookup(0xABCDEF) == (True, placa_fin)
+    # caches con claves por dhash del frame (version 1) se descartan
+    with open(path) as f:
+        data = json.load(f)
+    data["version"] = 1
+    with open(path, "w") as f:
+        json.dump(data, f)
+    assert len(OCRCache(path=path)) == 0
+
+
+def test_same_design_frames_skip_the_cache(same_design_cards, oracle_reader) -> None:
+    # los dos bumpers matchean cualquier placa: sin bumper unico no hay clave y cada frame va a OCR
+    matcher = DHashMatcher([compute_dhash(card) for card in same_design_cards.values()])
+    cache = OCRCache()
+    for _ in range(2):
+        for label, card in same_design_cards.items():
+            bumper_key = matcher.unique_match(compute_dhash(card), DHASH_THRESHOLD)
+            assert bumper_key is None
+            assert classify_frame(card, bumper_key, cache) == label
+    assert oracle_reader.calls == 4
+    assert len(cache) == 0
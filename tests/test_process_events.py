@@ -0,0 +1,86 @@
+import random
+from datetime import timedelta
+from typing import Any, Dict, List, Union
+
+import pytest
+
+from bench_suite import break_metrics
+from break_tracker import BOARD_TIME_SEPARATION
+from tv_ad_detector import bumper_dhash_detector, placa_fin, placa_inicio, process_events
+from utils import add_seconds_to_datetime, datetime_to_string, get_end_timestamp, string_to_datetime
+
+START_DATE = "2024-01-01 10:00:00"
+
+
+def reference_process_events(
+    events: Dict[str, Any], start_time_str: str, duration: Union[int, float]
+) -> Dict[str, List[Dict[str, str]]]:
+    # process_events antes de BreakTracker
+    reduced_data: List[Dict[str, str]] = []
+    last_event_type = None
+    last_timestamp_dt = None
+    event_list = list(events["items"].items())
+    for timestamp_str, event_type in event_list:
+        current_timestamp_dt = string_to_datetime(timestamp_str)
+        if last_event_type is None and event_type == placa_fin:
+            reduced_data.append({placa_inicio: start_time_str, placa_fin: timestamp_str})
+        elif event_type != last_event_type:
+            if event_type == placa_fin:
+                reduced_data.append({placa_inicio: datetime_to_string(last_timestamp_dt), placa_fin: timestamp_str})
+        elif (current_timestamp_dt - last_timestamp_dt) > timedelta(seconds=BOARD_TIME_SEPARATION):
+            if last_event_type == placa_inicio:
+                reduced_data.append(
+                    {
+                        placa_inicio: datetime_to_string(last_timestamp_dt),
+                        placa_fin: datetime_to_string(current_timestamp_dt - timedelta(seconds=1)),
+                    }
+                )
+            else:
+                reduced_data.append(
+                    {
+                        placa_inicio: add_seconds_to_datetime(1, last_timestamp_dt),
+                        placa_fin: datetime_to_string(current_timestamp_dt),
+                    }
+                )
+        if timestamp_str == event_list[-1][0] and event_type == placa_inicio:
+            reduced_data.append({placa_inicio: timestamp_str, placa_fin: get_end_timestamp(start_time_str, duration)})
+        last_event_type = event_type
+        last_timestamp_dt = current_timestamp_dt
+    return {"items": reduced_data}
+
+
+def random_events(rng: random.Random) -> Dict[str, Any]:
+    # rafagas de placas iguales separadas por menos o por mas que BOARD_TIME_SEPARATION
+    current = string_to_datetime(START_DATE)
+    items: Dict[str, str] = {}
+    for _ in range(rng.randint(0, 12)):
+        current += timedelta(seconds=rng.choice([1, 2, 3, 30, 200]))
+        items[datetime_to_string(current)] = rng.choice([placa_inicio, placa_fin])
+    return {"items": items}
+
+
+def test_process_events_matches_reference() -> None:
+    rng = random.Random(0)
+    for _ in range(500):
+        events = random_events(rng)
+        assert process_events(events, START_DATE, 3600) == reference_process_events(events, START_DATE, 3600)
+
+
+def test_process_events_closes_open_break_at_video_end() -> None:
+    events = {"items": {"2024-01-01 10:00:10": placa_inicio}}
+    assert process_events(events, START_DATE, 60) == {
+        "items": [{placa_inicio: "2024-01-01 10:00:10", placa_fin: get_end_timestamp(START_DATE, 60)}]
+    }
+
+
+@pytest.mark.parametrize("scan_mode", ["dense", "threaded"])
+def test_detected_breaks_match_ground_truth(synthetic_video, card_hashes, oracle_reader, scan_mode) -> None:
+    video_file, truth = synthetic_video
+    events = bumper_dhash_detector(video_file, card_hashes, truth["start_date"], scan_mode)
+    assert isinstance(events, dict)
+    # las dos placas matchean los dos bumpers: solo el OCR decide cual es cual
+    assert set(events["items"].values()) == {placa_inicio, placa_fin}
+    breaks = process_events(events, truth["start_date"], truth["seconds"])
+    assert breaks == reference_process_events(events, truth["start_date"], truth["seconds"])
+    result = break_metrics(breaks, truth, tolerance=2.0, event_names=(placa_inicio, placa_fin))
+    assert (result["precision"], result["recall"]) == (1.0, 1.0)
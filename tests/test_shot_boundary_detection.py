@@ -0,0 +1,14 @@
+from scenedetect import ContentDetector
+
+from shot_boundary_detection import CONTENT_THRESHOLD, find_new_bumpers_sbd, find_scenes
+from utils import get_frame_dhash
+
+
+def test_find_new_bumpers_sbd(synthetic_video, oracle_reader) -> None:
+    # la firma de antes de discover_bumpers: imagen y dHash de la mejor placa de inicio y de fin
+    video_file, _ = synthetic_video
+    scenes_df = find_scenes(video_file, ContentDetector(threshold=CONTENT_THRESHOLD))
+    inicio_image, inicio_hash, fin_image, fin_hash = find_new_bumpers_sbd(scenes_df, video_file)
+    assert inicio_image is not None and fin_image is not None
+    assert inicio_hash == get_frame_dhash(inicio_image) and fin_hash == get_frame_dhash(fin_image)
+    assert inicio_hash != fin_hash
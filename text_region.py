@@ -0,0 +1,107 @@
+import json
+import os
+from typing import Any, List, Optional, Sequence, Tuple
+
+import cv2
+
+from config import logger, settings, to_boolean
+from utils import format_channel_name
+
+OCR_ROI_ENABLED: bool = to_boolean(str(settings.OCR_ROI_ENABLED))
+OCR_ROI_HEIGHT = int(settings.OCR_ROI_HEIGHT)
+OCR_ROI_MARGIN = float(settings.OCR_ROI_MARGIN)
+TEXT_REGION_VERSION: int = 1
+
+# caja normalizada al tamano del frame: (x0, y0, x1, y1) entre 0 y 1
+Box = Tuple[float, float, float, float]
+
+
+def text_region_path(channel: str, folder: str = settings.BUMPER_DETECTION_DIR) -> str:
+    return os.path.join(folder, f".{format_channel_name(channel)}.text_region.json")
+
+
+def detections_box(frame_shape: Sequence[int], detections: List[Any]) -> Optional[Box]:
+    # union de las cajas que devuelve readtext(detail=1): [(puntos, texto, confianza), ...]
+    height, width = frame_shape[:2]
+    xs = [point[0] for bbox, _, _ in detections for point in bbox]
+    ys = [point[1] for bbox, _, _ in detections for point in bbox]
+    if not xs or width <= 0 or height <= 0:
+        return None
+    return (
+        max(0.0, min(xs) / width),
+        max(0.0, min(ys) / height),
+        min(1.0, max(xs) / width),
+        min(1.0, max(ys) / height),
+    )
+
+
+class TextRegion:
+    # Zona del frame donde un canal pone el texto de sus placas; se aprende de las placas leidas
+    # a frame completo y solo crece (union de cajas), asi una placa nueva con otro layout la amplia
+    def __init__(self, channel: str, folder: str = settings.BUMPER_DETECTION_DIR) -> None:
+        self.channel: str = format_channel_name(channel)
+        self.folder: str = folder
+        self.path: str = text_region_path(channel, folder)
+        self.box: Optional[Box] = None
+        self.load()
+
+    @property
+    def known(self) -> bool:
+        return self.box is not None
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as region_file:
+                data = json.load(region_file)
+            if data.get("version") == TEXT_REGION_VERSION:
+                self.box = tuple(data["box"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Text region {self.path} unreadable, learning it again: {e}")
+            self.box = None
+
+    def save(self) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as region_file:
+            json.dump({"version": TEXT_REGION_VERSION, "channel": self.channel, "box": self.box}, region_file)
+        os.replace(tmp_path, self.path)
+
+    def learn(self, frame_shape: Sequence[int], detections: List[Any]) -> bool:
+        box = detections_box(frame_shape, detections)
+        if box is None:
+            return False
+        if self.box is not None:
+            box = (
+                min(self.box[0], box[0]),
+                min(self.box[1], box[1]),
+                max(self.box[2], box[2]),
+                max(self.box[3], box[3]),
+            )
+            if box == self.box:
+                return False
+        self.box = box
+        self.save()
+        logger.debug(f"Text region for {self.channel}: {self.box}")
+        return True
+
+    def crop(self, frame: Any) -> Any:
+        # recorte con margen, reducido a OCR_ROI_HEIGHT de alto (nunca se agranda)
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self.box
+        left = max(0, int((x0 - OCR_ROI_MARGIN) * width))
+        top = max(0, int((y0 - OCR_ROI_MARGIN) * height))
+        right = min(width, int((x1 + OCR_ROI_MARGIN) * width + 1))
+        bottom = min(height, int((y1 + OCR_ROI_MARGIN) * height + 1))
+        region = frame[top:bottom, left:right]
+        if region.shape[0] > OCR_ROI_HEIGHT:
+            scale = OCR_ROI_HEIGHT / region.shape[0]
+            region = cv2.resize(
+                region, (max(1, round(region.shape[1] * scale)), OCR_ROI_HEIGHT), interpolation=cv2.INTER_AREA
+            )
+        return region
+
+
+def load_text_region(channel: str, folder: str = settings.BUMPER_DETECTION_DIR) -> Optional[TextRegion]:
+    return TextRegion(channel, folder) if OCR_ROI_ENABLED else None
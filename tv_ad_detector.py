@@ -1,31 +1,59 @@
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import multiprocessing
 import os
-from typing import Any, Dict, List, Union
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import cv2
-import imagehash
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from config import logger, reader, settings, spellcheck
+import metrics
+
+from break_tracker import BreakTracker
+from bumper_index import get_indexed_bumpers_dhashes
+from bumper_tracker import load_bumper_tracker
+from checkpoint import CHECKPOINT_INTERVAL, JobCheckpoint
+from config import logger, settings, to_boolean, warm_up
+from deadline import DETECTION_TIMEOUT, Deadline
+from dhash_engine import DHASH_SIZE, PREFILTER_SCALE, DHashMatcher, HashLike, compute_dhash, hash_to_int, int_to_hex
+from frame_source import DECODE_BACKEND, open_frame_source, open_keyframe_source
+from fused_pipeline import run_fused_discovery
+from hash_track import HASH_TRACK_ENABLED, HashTrackWriter
+from ocr_batch import OCR_BATCH_SIZE, OCRBatcher, classify_frames
+from ocr_cache import OCRCache, load_channel_ocr_cache
 from shot_boundary_detection import new_bumper_detection
+from text_region import TextRegion, load_text_region
 import argparse
 from utils import (
-    add_seconds_to_datetime,
-    classify_board,
     datetime_to_string,
     get_ad_borders,
     get_end_timestamp,
-    get_frame_dhash,
     get_timestamp,
     string_to_datetime,
-    get_bumpers_dhashes,
 )
 
 DHASH_THRESHOLD = int(settings.DHASH_THRESHOLD)
-BOARD_TIME_SEPARATION = int(settings.BOARD_TIME_SEPARATION)
 MAX_CORRUPT_FRAMES = int(settings.MAX_CORRUPT_FRAMES)
 DHASH_FREQUENCY = int(settings.DHASH_FREQUENCY)
 VIDEO_END_PADDING_FRAMES = int(settings.VIDEO_END_PADDING_FRAMES)
+SCAN_MODE: str = settings.SCAN_MODE
+COARSE_MAX_GAP_SECONDS = float(settings.COARSE_MAX_GAP_SECONDS)
+REFINE_DHASH_MARGIN = int(settings.REFINE_DHASH_MARGIN)
+COARSE_PROBE_KEYFRAMES = 8  # keyframes para decidir si el GOP deja saltear algo
+DETECTION_WORKERS = int(settings.DETECTION_WORKERS)
+CHUNK_OVERLAP_SECONDS = float(settings.CHUNK_OVERLAP_SECONDS)
+OCR_CACHE_ENABLED: bool = to_boolean(str(settings.OCR_CACHE_ENABLED))
+OCR_CACHE_PERSIST: bool = to_boolean(str(settings.OCR_CACHE_PERSIST))
+FUSED_DISCOVERY: bool = to_boolean(str(settings.FUSED_DISCOVERY))
+PIPELINE_QUEUE_SIZE = int(settings.PIPELINE_QUEUE_SIZE)
+
+# miniatura que entrega el decodificador para el dhash: es la reduccion por area previa al Lanczos de compute_dhash
+DHASH_THUMB_WIDTH = (DHASH_SIZE + 1) * PREFILTER_SCALE
+DHASH_THUMB_HEIGHT = DHASH_SIZE * PREFILTER_SCALE
 
 placa_inicio: str = settings.START_EVENT_NAME
 placa_fin: str = settings.END_EVENT_NAME
@@ -34,105 +62,219 @@ placa_fin: str = settings.END_EVENT_NAME
 def process_events(
     events: Dict[str, Any], start_time_str: str, duration: Union[int, float]
 ) -> Dict[str, List[Dict[str, str]]]:
+    tracker = BreakTracker(start_time_str)
     reduced_data: List[Dict[str, str]] = []
-    last_event_type: Union[str, None] = None
-    last_timestamp_dt: Union[datetime, None] = None
-    event_list = list(events["items"].items())
-
-    for timestamp_str, event_type in event_list:
-        current_timestamp_dt = string_to_datetime(timestamp_str)
-
-        if last_event_type is None and event_type == placa_fin:
-            reduced_data.append({placa_inicio: start_time_str, placa_fin: timestamp_str})
-
-        elif event_type != last_event_type:
-            if event_type == placa_fin:
-                reduced_data.append(
-                    {
-                        placa_inicio: datetime_to_string(last_timestamp_dt),
-                        placa_fin: timestamp_str,
-                    }
-                )
+    for timestamp_str, event_type in events["items"].items():
+        reduced_data.extend(tracker.push(timestamp_str, event_type))
+    reduced_data.extend(tracker.finish(get_end_timestamp(start_time_str, duration)))
+    return {"items": reduced_data}
 
-        elif (current_timestamp_dt - last_timestamp_dt) > timedelta(seconds=BOARD_TIME_SEPARATION):
-            if last_event_type == placa_inicio:
-                reduced_data.append(
-                    {
-                        placa_inicio: datetime_to_string(last_timestamp_dt),
-                        placa_fin: datetime_to_string(current_timestamp_dt - timedelta(seconds=1)),
-                    }
-                )
-            else:
-                reduced_data.append(
-                    {
-                        placa_inicio: add_seconds_to_datetime(1, last_timestamp_dt),
-                        placa_fin: datetime_to_string(current_timestamp_dt),
-                    }
-                )
 
-        if timestamp_str == event_list[-1][0] and event_type == placa_inicio:
-            reduced_data.append(
-                {
-                    placa_inicio: timestamp_str,
-                    placa_fin: get_end_timestamp(start_time_str, duration),
-                }
-            )
+def classify_frame(
+    frame: Any,
+    bumper_key: Optional[HashLike] = None,
+    ocr_cache: Optional[OCRCache] = None,
+    text_region: Optional[TextRegion] = None,
+) -> Optional[str]:
+    # bumper_key: dhash del bumper indexado que matcheo el frame (DHashMatcher.unique_match)
+    use_cache: bool = ocr_cache is not None and bumper_key is not None
+    cached, manual_classification = ocr_cache.lookup(bumper_key) if use_cache else (False, None)
+    if not cached:
+        manual_classification = classify_frames([frame], 1, text_region)[0]
+        if use_cache:
+            ocr_cache.put(bumper_key, manual_classification)
+    return manual_classification
 
-        last_event_type = event_type
-        last_timestamp_dt = current_timestamp_dt
 
-    return {"items": reduced_data}
+def record_board_event(events: Dict[str, Any], current_time: datetime, classification: Optional[str]) -> None:
+    if classification == placa_fin or classification == placa_inicio:
+        events["items"][datetime_to_string(current_time)] = classification
 
 
-def process_frame_easyocr(
-    frame: Any,
-    current_time: datetime = datetime.now(),
-    events: Dict[str, Any] = {"items": {}},
-    update_events: bool = True,
-) -> str:
-    frame_text: List[str] = reader.readtext(frame, detail=0)
-    manual_classification: str = classify_board(frame_text)
-    if manual_classification == placa_fin or manual_classification == placa_inicio and update_events:
-        events["items"][datetime_to_string(current_time)] = manual_classification
-    return manual_classification
+def record_scan_metrics(
+    decoded: int, hashed: int, hits: int, corrupt: int, decode_seconds: float, hash_seconds: float
+) -> None:
+    metrics.inc("frames_decoded", decoded)
+    metrics.inc("frames_hashed", hashed)
+    metrics.inc("hash_hits", hits)
+    metrics.inc("corrupt_frames", corrupt)
+    metrics.inc("decode_seconds", decode_seconds)
+    metrics.inc("hash_seconds", hash_seconds)
 
 
-def check_hash_similarity(all_hashes: List[imagehash.ImageHash], found_hash: imagehash.ImageHash) -> bool:
-    for h in all_hashes:
-        if h - found_hash < DHASH_THRESHOLD:
-            return True
-    return False
+def get_coarse_max_gap(fps: float) -> int:
+    # hueco mas largo entre keyframes que el modo coarse no escanea: al menos dos keyframes caen dentro de la
+    # placa mas corta
+    seconds = min(COARSE_MAX_GAP_SECONDS, float(settings.BUMPER_TIME_WINDOW[0]) / 2)
+    return max(DHASH_FREQUENCY, int(fps * seconds))
 
 
+@metrics.timed("bumper_dhash_detector")
 def bumper_dhash_detector(
-    video_file: str, dhashes: List[imagehash.ImageHash], start_date_str: str
+    video_file: str,
+    dhashes: List[HashLike],
+    start_date_str: str,
+    scan_mode: str = SCAN_MODE,
+    start_frame: int = 0,
+    end_frame: Optional[int] = None,
+    ocr_cache: Optional[OCRCache] = None,
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[JobCheckpoint] = None,
+    resume_events: Optional[Dict[str, Any]] = None,
 ) -> Union[Dict[str, Any], str]:
+    # con el plazo vencido devuelve los eventos hasta ahi y en "resume_frame" el frame desde el que seguir
+    if scan_mode == "threaded":
+        return threaded_bumper_dhash_detector(
+            video_file,
+            dhashes,
+            start_date_str,
+            start_frame,
+            end_frame,
+            ocr_cache,
+            hash_track,
+            text_region,
+            deadline,
+            checkpoint,
+            resume_events,
+        )
+    if scan_mode == "coarse":
+        return coarse_bumper_dhash_detector(
+            video_file,
+            dhashes,
+            start_date_str,
+            start_frame,
+            end_frame,
+            ocr_cache,
+            hash_track,
+            text_region,
+            deadline,
+            checkpoint,
+            resume_events,
+        )
+    return dense_bumper_dhash_detector(
+        video_file,
+        dhashes,
+        start_date_str,
+        start_frame,
+        end_frame,
+        ocr_cache,
+        hash_track,
+        text_region,
+        deadline,
+        checkpoint,
+        resume_events,
+    )
+
+
+def dense_bumper_dhash_detector(
+    video_file: str,
+    dhashes: List[HashLike],
+    start_date_str: str,
+    start_frame: int = 0,
+    end_frame: Optional[int] = None,
+    ocr_cache: Optional[OCRCache] = None,
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[JobCheckpoint] = None,
+    resume_events: Optional[Dict[str, Any]] = None,
+) -> Union[Dict[str, Any], str]:
+    # sin timer propio: lo mide bumper_dhash_detector, y los tramos del modo coarse quedan dentro de su medicion
+    if DECODE_BACKEND == "ffmpeg":
+        return source_bumper_dhash_detector(
+            video_file,
+            dhashes,
+            start_date_str,
+            start_frame,
+            end_frame,
+            ocr_cache,
+            hash_track,
+            text_region,
+            deadline,
+            checkpoint,
+            resume_events,
+        )
     try:
-        events: Dict[str, Any] = {"items": {}}
+        events: Dict[str, Any] = {"items": dict(resume_events["items"]) if resume_events else {}}
+        matcher = DHashMatcher(dhashes)
         cap = cv2.VideoCapture(video_file)
         max_corrupt_frames: int = MAX_CORRUPT_FRAMES
-        frame_counter: int = 0
-        logger.debug(f"bumper_dhash_detector: processing video with {cap.get(cv2.CAP_PROP_FRAME_COUNT)} frames")
+        frame_counter: int = start_frame
+        if start_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        hashed: int = 0
+        hits: int = 0
+        decode_seconds: float = 0.0
+        hash_seconds: float = 0.0
+        # con seguimiento solo se lee el primer frame de cada placa, los siguientes heredan su clasificacion
+        def record(current_time: datetime, classification: Optional[str]) -> None:
+            record_board_event(events, current_time, classification)
+
+        tracker = load_bumper_tracker(matcher, record)
+        on_result = tracker.resolve if tracker is not None else record
+        batcher: Optional[OCRBatcher] = None
+        if OCR_BATCH_SIZE > 1:
+            batcher = OCRBatcher(
+                lambda current_time, classification, _: on_result(current_time, classification),
+                ocr_cache=ocr_cache,
+                text_region=text_region,
+            )
+        logger.debug(
+            f"bumper_dhash_detector: processing video with {cap.get(cv2.CAP_PROP_FRAME_COUNT)} frames "
+            f"(sampling every {DHASH_FREQUENCY} frames, from frame {start_frame})"
+        )
 
         while cap.isOpened():
-            # Captura de frames
-            ret, frame = cap.read()
+            if deadline is not None and deadline.expired():
+                events["resume_frame"] = frame_counter
+                cap.release()
+                break
+            if checkpoint is not None and checkpoint.due():
+                # lo pendiente de OCR se cierra antes: el checkpoint no puede saltear placas en cola
+                if batcher is not None:
+                    batcher.flush()
+                checkpoint.save("scan", frame_counter, events)
+            # Captura de frames: grab() sin retrieve() evita convertir los frames que no se muestrean
+            tick = metrics.clock()
+            ret = cap.grab()
             frame_counter += 1
 
-            if frame_counter >= (cap.get(cv2.CAP_PROP_FRAME_COUNT) - VIDEO_END_PADDING_FRAMES):
+            if frame_counter >= (cap.get(cv2.CAP_PROP_FRAME_COUNT) - VIDEO_END_PADDING_FRAMES) or (
+                end_frame is not None and frame_counter > end_frame
+            ):
                 cap.release()
                 break
 
+            sampled = ret and frame_counter % DHASH_FREQUENCY == 0
+            if sampled:
+                ret, frame = cap.retrieve()
+            decode_seconds += metrics.clock() - tick
+
             if ret:
-                if frame_counter % DHASH_FREQUENCY == 0:
-                    frame_hash = get_frame_dhash(frame)
-                    is_board = check_hash_similarity(dhashes, frame_hash)
-                    if is_board:
-                        process_frame_easyocr(
-                            frame,
-                            get_timestamp(cap.get(cv2.CAP_PROP_POS_MSEC), start_date_str),
-                            events,
-                        )
+                if sampled:
+                    tick = metrics.clock()
+                    frame_hash = compute_dhash(frame)
+                    hash_seconds += metrics.clock() - tick
+                    hashed += 1
+                    if hash_track is not None:
+                        hash_track.append(frame_counter, cap.get(cv2.CAP_PROP_POS_MSEC), frame_hash)
+                    distance = tracker.distance(frame_hash) if tracker is not None else matcher.min_distance(frame_hash)
+                    if distance < DHASH_THRESHOLD:
+                        hits += 1
+                        current_time = get_timestamp(cap.get(cv2.CAP_PROP_POS_MSEC), start_date_str)
+                        if tracker is not None and tracker.follow(current_time):
+                            if batcher is not None:
+                                batcher.poll()
+                        else:
+                            bumper_key = matcher.unique_match(frame_hash, DHASH_THRESHOLD)
+                            if batcher is not None:
+                                batcher.add(current_time, frame, bumper_key)
+                            else:
+                                on_result(current_time, classify_frame(frame, bumper_key, ocr_cache, text_region))
+                    elif batcher is not None:
+                        batcher.poll()
 
             else:
                 max_corrupt_frames -= 1
@@ -143,34 +285,803 @@ def bumper_dhash_detector(
                 if max_corrupt_frames == 0:
                     logger.error("Processing video file: " + video_file + " Corrupt video")
                     cap.release()
+                    record_scan_metrics(
+                        frame_counter - start_frame, hashed, hits, MAX_CORRUPT_FRAMES, decode_seconds, hash_seconds
+                    )
                     return "CORRUPT"
 
+        if batcher is not None:
+            batcher.flush()
+            logger.debug(f"bumper_dhash_detector: batched OCR {batcher.stats()}")
+        if tracker is not None:
+            tracker.record_metrics()
+            logger.debug(f"bumper_dhash_detector: bumper tracking {tracker.stats()}")
+        record_scan_metrics(
+            frame_counter - start_frame,
+            hashed,
+            hits,
+            MAX_CORRUPT_FRAMES - max_corrupt_frames,
+            decode_seconds,
+            hash_seconds,
+        )
+
+    except Exception as e:
+        logger.error("Processing video file: " + video_file + " Error: " + str(e))
+        return "ERROR"
+    if ocr_cache is not None:
+        logger.debug(f"bumper_dhash_detector: OCR cache {ocr_cache.stats()}")
+    return events
+
+
+def source_bumper_dhash_detector(
+    video_file: str,
+    dhashes: List[HashLike],
+    start_date_str: str,
+    start_frame: int = 0,
+    end_frame: Optional[int] = None,
+    ocr_cache: Optional[OCRCache] = None,
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[JobCheckpoint] = None,
+    resume_events: Optional[Dict[str, Any]] = None,
+) -> Union[Dict[str, Any], str]:
+    # Modo dense sobre un FrameSource: con ffmpeg llegan solo miniaturas grises de uno de cada DHASH_FREQUENCY
+    # frames y el frame completo se decodifica aparte, solo para las placas que van a OCR
+    try:
+        events: Dict[str, Any] = {"items": dict(resume_events["items"]) if resume_events else {}}
+        matcher = DHashMatcher(dhashes)
+        source = open_frame_source(
+            video_file, DHASH_THUMB_WIDTH, DHASH_THUMB_HEIGHT, gray=True, every=DHASH_FREQUENCY
+        )
+        last_frame: int = source.frame_count - VIDEO_END_PADDING_FRAMES
+        if start_frame > 0:
+            source.seek(start_frame)
+        # con seguimiento solo se lee el primer frame de cada placa, los siguientes heredan su clasificacion
+        def record(current_time: datetime, classification: Optional[str]) -> None:
+            record_board_event(events, current_time, classification)
+
+        tracker = load_bumper_tracker(matcher, record)
+        on_result = tracker.resolve if tracker is not None else record
+        batcher: Optional[OCRBatcher] = None
+        if OCR_BATCH_SIZE > 1:
+            batcher = OCRBatcher(
+                lambda current_time, classification, _: on_result(current_time, classification),
+                ocr_cache=ocr_cache,
+                text_region=text_region,
+            )
+        logger.debug(f"source_bumper_dhash_detector: {type(source).__name__} from frame {start_frame}")
+        hashed: int = 0
+        hits: int = 0
+        decode_seconds: float = 0.0
+        hash_seconds: float = 0.0
+        frame_counter: int = start_frame
+
+        while True:
+            if deadline is not None and deadline.expired():
+                events["resume_frame"] = frame_counter
+                break
+            if checkpoint is not None and checkpoint.due():
+                if batcher is not None:
+                    batcher.flush()
+                checkpoint.save("scan", frame_counter, events)
+            tick = metrics.clock()
+            ret, thumbnail = source.read()
+            decode_seconds += metrics.clock() - tick
+            if not ret:
+                break
+            frame_counter = source.frame_index + 1
+            if frame_counter >= last_frame or (end_frame is not None and frame_counter > end_frame):
+                break
+            tick = metrics.clock()
+            frame_hash = compute_dhash(thumbnail)
+            hash_seconds += metrics.clock() - tick
+            hashed += 1
+            if hash_track is not None:
+                hash_track.append(frame_counter, source.position_msec, frame_hash)
+            distance = tracker.distance(frame_hash) if tracker is not None else matcher.min_distance(frame_hash)
+            if distance < DHASH_THRESHOLD:
+                hits += 1
+                current_time = get_timestamp(source.position_msec, start_date_str)
+                if tracker is not None and tracker.follow(current_time):
+                    # placa ya seguida: ni siquiera se decodifica el frame completo
+                    if batcher is not None:
+                        batcher.poll()
+                    continue
+                frame = source.full_frame(source.frame_index)
+                if frame is None:
+                    if tracker is not None:
+                        tracker.resolve(current_time, None)
+                    continue
+                bumper_key = matcher.unique_match(frame_hash, DHASH_THRESHOLD)
+                if batcher is not None:
+                    batcher.add(current_time, frame, bumper_key)
+                else:
+                    on_result(current_time, classify_frame(frame, bumper_key, ocr_cache, text_region))
+            elif batcher is not None:
+                batcher.poll()
+        source.release()
+
+        if batcher is not None:
+            batcher.flush()
+            logger.debug(f"source_bumper_dhash_detector: batched OCR {batcher.stats()}")
+        if tracker is not None:
+            tracker.record_metrics()
+            logger.debug(f"source_bumper_dhash_detector: bumper tracking {tracker.stats()}")
+        # con every > 1 el decodificador descarta los frames no muestreados: se cuentan los recorridos
+        record_scan_metrics(
+            max(0, source.frame_index + 1 - start_frame), hashed, hits, 0, decode_seconds, hash_seconds
+        )
+
     except Exception as e:
         logger.error("Processing video file: " + video_file + " Error: " + str(e))
         return "ERROR"
     return events
 
 
+def coarse_bumper_dhash_detector(
+    video_file: str,
+    dhashes: List[HashLike],
+    start_date_str: str,
+    start_frame: int = 0,
+    end_frame: Optional[int] = None,
+    ocr_cache: Optional[OCRCache] = None,
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[JobCheckpoint] = None,
+    resume_events: Optional[Dict[str, Any]] = None,
+) -> Union[Dict[str, Any], str]:
+    # Modo coarse: ffmpeg decodifica y se hashean solo los keyframes. Se escanean en modo dense los tramos entre
+    # los keyframes vecinos de uno a menos de DHASH_THRESHOLD + REFINE_DHASH_MARGIN de un bumper y los huecos
+    # entre keyframes mas largos que get_coarse_max_gap. Los tramos usan la misma grilla que el modo dense, asi
+    # que los eventos coinciden; lo que se ahorra es decodificar el resto del video
+    events: Dict[str, Any] = {"items": dict(resume_events["items"]) if resume_events else {}}
+
+    def scan(window_start: int, window_end: Optional[int]) -> Union[Dict[str, Any], str]:
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save("scan", window_start, events)
+        return dense_bumper_dhash_detector(
+            video_file,
+            dhashes,
+            start_date_str,
+            window_start,
+            window_end,
+            ocr_cache,
+            hash_track,
+            text_region,
+            deadline,
+            checkpoint,
+            events,
+        )
+
+    source = open_keyframe_source(video_file, DHASH_THUMB_WIDTH, DHASH_THUMB_HEIGHT, gray=True)
+    if source is None:
+        logger.warning(f"coarse scan needs ffmpeg to decode only keyframes, scanning {video_file} densely")
+        return scan(start_frame, end_frame)
+    try:
+        matcher = DHashMatcher(dhashes)
+        max_gap: int = get_coarse_max_gap(source.fps)
+        last_frame: int = source.frame_count - VIDEO_END_PADDING_FRAMES
+        if end_frame is not None:
+            last_frame = min(last_frame, end_frame)
+        if start_frame > 0:
+            source.seek(start_frame)
+        previous: int = start_frame  # frame_counter del keyframe anterior
+        previous_near: bool = False
+        window_start: Optional[int] = None  # tramo abierto: se escanea cuando aparece un keyframe lejano
+        keyframes: int = 0
+        long_gaps: int = 0
+        decode_seconds: float = 0.0
+        hash_seconds: float = 0.0
+        while True:
+            if deadline is not None and deadline.expired():
+                events["resume_frame"] = window_start if window_start is not None else previous
+                break
+            tick = metrics.clock()
+            ret, thumbnail = source.read()
+            decode_seconds += metrics.clock() - tick
+            frame_counter = source.frame_index + 1
+            if not ret or frame_counter >= last_frame:
+                break
+            tick = metrics.clock()
+            frame_hash = compute_dhash(thumbnail)
+            hash_seconds += metrics.clock() - tick
+            keyframes += 1
+            if hash_track is not None:
+                hash_track.append(frame_counter, source.position_msec, frame_hash)
+            near = matcher.min_distance(frame_hash) < DHASH_THRESHOLD + REFINE_DHASH_MARGIN
+            long_gap = frame_counter - previous > max_gap
+            long_gaps += long_gap
+            if near or previous_near or long_gap:
+                if window_start is None:
+                    window_start = previous
+            elif window_start is not None:
+                result = scan(window_start, previous)
+                if type(result) is str or "resume_frame" in result:
+                    source.release()
+                    return result
+                events, window_start = result, None
+            previous, previous_near = frame_counter, near
+            if keyframes == COARSE_PROBE_KEYFRAMES and long_gaps > keyframes // 2:
+                # GOP mas largo que la placa mas corta: los keyframes no alcanzan para saltear nada
+                logger.warning(f"coarse scan: keyframes of {video_file} are too sparse, scanning densely")
+                window_start = start_frame if window_start is None else window_start
+                previous_near = True
+                break
+        source.release()
+        record_scan_metrics(keyframes, keyframes, 0, 0, decode_seconds, hash_seconds)
+        metrics.inc("coarse_keyframes", keyframes)
+    except Exception as e:
+        logger.error("Processing video file: " + video_file + " Error: " + str(e))
+        return "ERROR"
+    if "resume_frame" in events:
+        return events
+    if previous_near or last_frame - previous > max_gap:
+        window_start = previous if window_start is None else window_start
+    return scan(window_start, end_frame) if window_start is not None else events
+
+
+def _put(stage_queue: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    # la cola acotada frena a la etapa anterior (backpressure); si otra etapa fallo se deja de esperar
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(stage_queue: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return stage_queue.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+def threaded_bumper_dhash_detector(
+    video_file: str,
+    dhashes: List[HashLike],
+    start_date_str: str,
+    start_frame: int = 0,
+    end_frame: Optional[int] = None,
+    ocr_cache: Optional[OCRCache] = None,
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[JobCheckpoint] = None,
+    resume_events: Optional[Dict[str, Any]] = None,
+) -> Union[Dict[str, Any], str]:
+    # Modo dense en tres etapas que se solapan: un hilo decodifica, otro calcula el dhash y deja pasar solo los
+    # matches, y este hilo los lee con OCR. OpenCV, ffmpeg y torch sueltan el GIL mientras trabajan; las colas
+    # de PIPELINE_QUEUE_SIZE frames frenan a la etapa mas rapida y acotan la memoria
+    try:
+        events: Dict[str, Any] = {"items": dict(resume_events["items"]) if resume_events else {}}
+        matcher = DHashMatcher(dhashes)
+        source = open_frame_source(
+            video_file, DHASH_THUMB_WIDTH, DHASH_THUMB_HEIGHT, gray=True, every=DHASH_FREQUENCY
+        )
+        last_frame: int = source.frame_count - VIDEO_END_PADDING_FRAMES
+        if start_frame > 0:
+            source.seek(start_frame)
+        frames: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        matches: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        stop = threading.Event()
+        errors: List[Exception] = []
+        # los eventos y el seguimiento los tocan la etapa de decodificacion (resume_frame), la de dhash (frames
+        # seguidos) y la de OCR (resultados)
+        lock = threading.Lock()
+        busy: Dict[str, float] = {"decode": 0.0, "hash": 0.0, "ocr": 0.0}
+        counts: Dict[str, int] = {"hashed": 0, "hits": 0}
+
+        def record(current_time: datetime, classification: Optional[str]) -> None:
+            record_board_event(events, current_time, classification)
+
+        tracker = load_bumper_tracker(matcher, record)
+
+        def on_result(current_time: datetime, classification: Optional[str], _: Any = None) -> None:
+            with lock:
+                if tracker is not None:
+                    tracker.resolve(current_time, classification)
+                else:
+                    record(current_time, classification)
+
+        def decode() -> None:
+            try:
+                frame_counter = start_frame
+                while True:
+                    if deadline is not None and deadline.expired():
+                        # lo ya encolado se termina de procesar: se sigue despues del ultimo frame decodificado
+                        with lock:
+                            events["resume_frame"] = frame_counter
+                        break
+                    tick = metrics.clock()
+                    ret, frame = source.read()
+                    busy["decode"] += metrics.clock() - tick
+                    if not ret:
+                        break
+                    frame_counter = source.frame_index + 1
+                    if frame_counter >= last_frame or (end_frame is not None and frame_counter > end_frame):
+                        break
+                    if source.reuses_buffer:
+                        frame = frame.copy()
+                    if not _put(frames, (frame_counter, source.frame_index, source.position_msec, frame), stop):
+                        return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                _put(frames, None, stop)
+
+        def hash_frames() -> None:
+            next_checkpoint = time.monotonic() + CHECKPOINT_INTERVAL
+            try:
+                while True:
+                    item = _get(frames, stop)
+                    if item is None:
+                        break
+                    frame_counter, frame_index, position_msec, thumbnail = item
+                    tick = metrics.clock()
+                    frame_hash = compute_dhash(thumbnail)
+                    busy["hash"] += metrics.clock() - tick
+                    counts["hashed"] += 1
+                    if hash_track is not None:
+                        hash_track.append(frame_counter, position_msec, frame_hash)
+                    with lock:
+                        if tracker is not None:
+                            hit = tracker.distance(frame_hash) < DHASH_THRESHOLD
+                        else:
+                            hit = matcher.min_distance(frame_hash) < DHASH_THRESHOLD
+                        if hit:
+                            current_time = get_timestamp(position_msec, start_date_str)
+                            followed = tracker is not None and tracker.follow(current_time)
+                    if hit:
+                        counts["hits"] += 1
+                        if not followed:
+                            frame = source.full_frame(frame_index) if source.scaled else thumbnail
+                            bumper_key = matcher.unique_match(frame_hash, DHASH_THRESHOLD)
+                            if frame is None:
+                                on_result(current_time, None)
+                            elif not _put(matches, (frame_counter, current_time, frame, bumper_key), stop):
+                                return
+                    if checkpoint is not None and time.monotonic() >= next_checkpoint:
+                        # marca sin frame: todo lo anterior a frame_counter ya esta en los eventos o en la cola
+                        next_checkpoint = time.monotonic() + CHECKPOINT_INTERVAL
+                        if not _put(matches, (frame_counter, None, None, None), stop):
+                            return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                _put(matches, None, stop)
+
+        batcher: Optional[OCRBatcher] = None
+        if OCR_BATCH_SIZE > 1:
+            batcher = OCRBatcher(on_result, ocr_cache=ocr_cache, text_region=text_region)
+        logger.debug(f"threaded_bumper_dhash_detector: {type(source).__name__} from frame {start_frame}")
+        stages = [
+            threading.Thread(target=decode, name="scan-decode", daemon=True),
+            threading.Thread(target=hash_frames, name="scan-hash", daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+        try:
+            while True:
+                try:
+                    item = matches.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():
+                        break
+                    if batcher is not None:
+                        batcher.poll()
+                    continue
+                if item is None:
+                    break
+                frame_counter, current_time, frame, bumper_key = item
+                tick = metrics.clock()
+                if current_time is None:
+                    if batcher is not None:
+                        batcher.flush()
+                    with lock:
+                        checkpoint.save("scan", frame_counter, {"items": dict(sorted(events["items"].items()))})
+                elif batcher is not None:
+                    batcher.add(current_time, frame, bumper_key)
+                else:
+                    on_result(current_time, classify_frame(frame, bumper_key, ocr_cache, text_region))
+                busy["ocr"] += metrics.clock() - tick
+            tick = metrics.clock()
+            if batcher is not None:
+                batcher.flush()
+            busy["ocr"] += metrics.clock() - tick
+        finally:
+            stop.set()
+            for stage in stages:
+                stage.join()
+            source.release()
+        if errors:
+            raise errors[0]
+
+        # los frames seguidos y los resultados de OCR llegan desde hilos distintos: process_events los quiere en orden
+        events["items"] = dict(sorted(events["items"].items()))
+        if batcher is not None:
+            logger.debug(f"threaded_bumper_dhash_detector: batched OCR {batcher.stats()}")
+        if tracker is not None:
+            tracker.record_metrics()
+            logger.debug(f"threaded_bumper_dhash_detector: bumper tracking {tracker.stats()}")
+        logger.debug(
+            "threaded_bumper_dhash_detector: busy seconds "
+            + ", ".join(f"{stage} {seconds:.2f}" for stage, seconds in busy.items())
+        )
+        record_scan_metrics(
+            max(0, source.frame_index + 1 - start_frame),
+            counts["hashed"],
+            counts["hits"],
+            0,
+            busy["decode"],
+            busy["hash"],
+        )
+
+    except Exception as e:
+        logger.error("Processing video file: " + video_file + " Error: " + str(e))
+        return "ERROR"
+    return events
+
+
+def split_frame_ranges(frame_count: int, chunks: int, overlap_frames: int) -> List[Tuple[int, int]]:
+    chunk_length = -(-frame_count // chunks)
+    ranges: List[Tuple[int, int]] = []
+    for start in range(0, frame_count, chunk_length):
+        # cada tramo arranca un poco antes para cubrir imprecisiones del seek
+        ranges.append((max(0, start - overlap_frames), min(frame_count, start + chunk_length)))
+    return ranges
+
+
+def merge_events(chunk_events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged: Dict[str, str] = {}
+    for events in chunk_events:
+        merged.update(events["items"])
+    # process_events recorre los eventos en orden de insercion
+    merged_events: Dict[str, Any] = {"items": dict(sorted(merged.items()))}
+    # tramos cortados por el plazo: se reanuda desde el mas atrasado (lo ya escaneado despues se repite)
+    resume_frames = [events["resume_frame"] for events in chunk_events if "resume_frame" in events]
+    if resume_frames:
+        merged_events["resume_frame"] = min(resume_frames)
+    return merged_events
+
+
+def init_detection_worker() -> None:
+    # el lector OCR se carga una sola vez por proceso, antes de recibir tramos
+    cv2.setNumThreads(1)
+    warm_up()
+
+
+def _detect_chunk(
+    video_file: str,
+    dhashes: List[str],
+    start_date_str: str,
+    scan_mode: str,
+    start_frame: int,
+    end_frame: int,
+    ocr_cache: Optional[OCRCache],
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+) -> Tuple[Union[Dict[str, Any], str], Optional[OCRCache], Optional[HashTrackWriter], Optional[Dict[str, Any]]]:
+    if ocr_cache is not None:
+        ocr_cache.reset_stats()
+    with metrics.collect(profile=False) as collected:
+        result = bumper_dhash_detector(
+            video_file,
+            dhashes,
+            start_date_str,
+            scan_mode,
+            start_frame,
+            end_frame,
+            ocr_cache,
+            hash_track,
+            text_region,
+            deadline,
+        )
+    # el cache, el track y las metricas del worker vuelven al proceso padre para no perder lo aprendido
+    return result, ocr_cache, hash_track, collected.snapshot
+
+
+def parallel_bumper_dhash_detector(
+    video_file: str,
+    dhashes: List[HashLike],
+    start_date_str: str,
+    workers: int = DETECTION_WORKERS,
+    scan_mode: str = SCAN_MODE,
+    ocr_cache: Optional[OCRCache] = None,
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[JobCheckpoint] = None,
+    start_frame: int = 0,
+    resume_events: Optional[Dict[str, Any]] = None,
+) -> Union[Dict[str, Any], str]:
+    cap = cv2.VideoCapture(video_file)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    if workers <= 1 or frame_count <= start_frame:
+        return bumper_dhash_detector(
+            video_file,
+            dhashes,
+            start_date_str,
+            scan_mode,
+            start_frame,
+            ocr_cache=ocr_cache,
+            hash_track=hash_track,
+            text_region=text_region,
+            deadline=deadline,
+            checkpoint=checkpoint,
+            resume_events=resume_events,
+        )
+
+    overlap_frames = int(CHUNK_OVERLAP_SECONDS * fps)
+    # los tramos en paralelo no guardan checkpoints periodicos: solo el del plazo, con el tramo mas atrasado
+    ranges = [
+        (start_frame + start, start_frame + end)
+        for start, end in split_frame_ranges(frame_count - start_frame, workers, overlap_frames)
+    ]
+    hex_hashes = [int_to_hex(hash_to_int(dhash)) for dhash in dhashes]
+    logger.debug(f"parallel_bumper_dhash_detector: {len(ranges)} chunks over {workers} workers")
+
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_detection_worker
+    ) as pool:
+        futures = [
+            pool.submit(
+                _detect_chunk,
+                video_file,
+                hex_hashes,
+                start_date_str,
+                scan_mode,
+                start,
+                end,
+                ocr_cache,
+                hash_track,
+                text_region,
+                deadline,
+            )
+            for start, end in ranges
+        ]
+        chunk_results = [resume_events] if resume_events else []
+        for future in futures:
+            result, chunk_cache, chunk_track, chunk_metrics = future.result()
+            chunk_results.append(result)
+            metrics.merge(chunk_metrics)
+            if ocr_cache is not None:
+                ocr_cache.merge(chunk_cache)
+            if hash_track is not None:
+                hash_track.merge(chunk_track)
+
+    for result in chunk_results:
+        if type(result) is str:
+            return result
+    return merge_events(chunk_results)
+
+
+def detect_raw_events(
+    video_file: str,
+    dhashes: List[HashLike],
+    start_date_str: str,
+    scan_mode: str,
+    workers: int,
+    ocr_cache: Optional[OCRCache] = None,
+    hash_track: Optional[HashTrackWriter] = None,
+    text_region: Optional[TextRegion] = None,
+    deadline: Optional[Deadline] = None,
+    checkpoint: Optional[JobCheckpoint] = None,
+    start_frame: int = 0,
+    resume_events: Optional[Dict[str, Any]] = None,
+) -> Union[Dict[str, Any], str]:
+    if workers > 1:
+        raw_events = parallel_bumper_dhash_detector(
+            video_file,
+            dhashes,
+            start_date_str,
+            workers,
+            scan_mode,
+            ocr_cache,
+            hash_track,
+            text_region,
+            deadline,
+            checkpoint,
+            start_frame,
+            resume_events,
+        )
+    else:
+        raw_events = bumper_dhash_detector(
+            video_file,
+            dhashes,
+            start_date_str,
+            scan_mode,
+            start_frame,
+            ocr_cache=ocr_cache,
+            hash_track=hash_track,
+            text_region=text_region,
+            deadline=deadline,
+            checkpoint=checkpoint,
+            resume_events=resume_events,
+        )
+    if ocr_cache is not None:
+        ocr_cache.save()
+    # un escaneo cortado o reanudado deja el track incompleto: no se guarda
+    complete = type(raw_events) is not str and "resume_frame" not in raw_events and start_frame == 0
+    if hash_track is not None and complete:
+        cap = cv2.VideoCapture(video_file)
+        hash_track.save(cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        cap.release()
+    return raw_events
+
+
+def get_hash_track(video_file: str, start_date_str: str, scan_mode: str) -> Optional[HashTrackWriter]:
+    return HashTrackWriter(video_file, start_date_str, scan_mode) if HASH_TRACK_ENABLED else None
+
+
+def get_ocr_cache(channel: str) -> Optional[OCRCache]:
+    if not OCR_CACHE_ENABLED:
+        return None
+    return load_channel_ocr_cache(channel) if OCR_CACHE_PERSIST else OCRCache()
+
+
+def terminated_result(
+    items: List[Dict[str, str]], checkpoint: JobCheckpoint, deadline: Deadline, checkpoint_file: Optional[str]
+) -> Dict[str, Any]:
+    # resultado de toda corrida cortada por plazo o cancelacion, sea en el descubrimiento o en el escaneo;
+    # sin etapa guardada (descubrimiento fusionado) la proxima corrida empieza de cero
+    stage: str = checkpoint.stage or "discovery"
+    logger.warning(
+        f"{checkpoint.video_file}: {deadline.reason} in the {stage} stage at frame {checkpoint.frame}, "
+        f"{len(items)} breaks so far"
+    )
+    return {
+        "items": items,
+        "status": "TERMINATED",
+        "reason": deadline.reason,
+        "stage": stage,
+        "resume_frame": checkpoint.frame,
+        "checkpoint": checkpoint_file,
+    }
+
+
+def terminated_events(
+    raw_events: Dict[str, Any], start_date_str: str, checkpoint: JobCheckpoint, deadline: Deadline
+) -> Dict[str, Any]:
+    # plazo vencido o cancelado en el escaneo: las tandas ya cerradas y el checkpoint desde el que sigue
+    resume_frame: int = raw_events.pop("resume_frame")
+    # si el corte se vio en los procesos de los tramos, aca tambien queda registrado el motivo
+    deadline.expired()
+    checkpoint_file = checkpoint.save("scan", resume_frame, raw_events)
+    tracker = BreakTracker(start_date_str)
+    reduced_data: List[Dict[str, str]] = []
+    for timestamp_str, event_type in raw_events["items"].items():
+        reduced_data.extend(tracker.push(timestamp_str, event_type))
+    return terminated_result(reduced_data, checkpoint, deadline, checkpoint_file)
+
+
+def terminated_discovery(checkpoint: JobCheckpoint, deadline: Deadline) -> Dict[str, Any]:
+    # new_bumper_detection ya dejo guardada la etapa alcanzada; el descubrimiento fusionado no guarda nada
+    deadline.expired()
+    checkpoint_file = checkpoint.path if checkpoint.enabled and checkpoint.stage is not None else None
+    return terminated_result([], checkpoint, deadline, checkpoint_file)
+
+
+@metrics.timed("placa_detector")
 def placa_detector(
-    video_file: str, duration: Union[int, float], dhashes: List[str], start_date_str: str, channel: str
+    video_file: str,
+    duration: Union[int, float],
+    dhashes: List[str],
+    start_date_str: str,
+    channel: str,
+    scan_mode: str = SCAN_MODE,
+    workers: int = DETECTION_WORKERS,
+    deadline: Optional[Deadline] = None,
+) -> Union[Dict[str, Any], str]:
+    # cada grabacion tiene su plazo (DETECTION_TIMEOUT); si se corta, la proxima corrida sigue desde el checkpoint
+    deadline = deadline if deadline is not None else Deadline()
+    checkpoint = JobCheckpoint(video_file, channel, start_date_str)
+    result = run_placa_detector(
+        video_file, duration, dhashes, start_date_str, channel, scan_mode, workers, deadline, checkpoint
+    )
+    if type(result) is dict and "status" not in result:
+        checkpoint.clear()
+    return result
+
+
+def run_placa_detector(
+    video_file: str,
+    duration: Union[int, float],
+    dhashes: List[str],
+    start_date_str: str,
+    channel: str,
+    scan_mode: str,
+    workers: int,
+    deadline: Deadline,
+    checkpoint: JobCheckpoint,
 ) -> Union[Dict[str, Any], str]:
     try:
-        dhashes
+        ocr_cache: Optional[OCRCache] = get_ocr_cache(channel)
+        # zona de texto de las placas del canal: se aprende en el descubrimiento o en la primera lectura completa
+        text_region: Optional[TextRegion] = load_text_region(channel)
         has_run_sbd: bool = False
         original_dhashes_length: int = len(dhashes)
-        if original_dhashes_length == 0:
+        start_frame: int = 0
+        resume_events: Optional[Dict[str, Any]] = None
+        if checkpoint.stage == "scan":
+            # los bumpers ya estaban descubiertos: se sigue escaneando desde el frame guardado, con sus eventos
+            logger.info(f"Resuming {video_file} for Channel: {channel} from frame {checkpoint.frame}")
+            dhashes = get_indexed_bumpers_dhashes(channel)
+            start_frame, resume_events = checkpoint.frame, checkpoint.events
+            # el fallback con shot boundary solo se saltea si el descubrimiento ya habia corrido
+            has_run_sbd = checkpoint.discovered
+        elif checkpoint.stage is not None:
+            logger.info(f"Resuming bumper discovery for Channel: {channel} ({checkpoint.stage} stage)")
+            sbd_result = new_bumper_detection(video_file, channel, text_region, deadline, checkpoint)
+            if sbd_result == "TERMINATED":
+                return terminated_discovery(checkpoint, deadline)
+            dhashes = get_indexed_bumpers_dhashes(channel)
+            if len(dhashes) == 0:
+                logger.error("No Bumpers available for detection for: " + video_file + " Channel: " + channel)
+                return "ERROR"
+            has_run_sbd = checkpoint.discovered = True
+        elif original_dhashes_length == 0 and FUSED_DISCOVERY:
+            logger.info(f"No Bumpers available for Channel: {channel} running fused bumper discovery")
+            raw_events, _ = run_fused_discovery(
+                video_file,
+                channel,
+                start_date_str,
+                ocr_cache,
+                get_hash_track(video_file, start_date_str, "dense"),
+                text_region,
+                deadline,
+            )
+            if ocr_cache is not None:
+                ocr_cache.save()
+            if raw_events == "TERMINATED":
+                return terminated_discovery(checkpoint, deadline)
+            if type(raw_events) is str:
+                return raw_events
+            if len(get_indexed_bumpers_dhashes(channel)) == 0:
+                logger.error("No Bumpers available for detection for: " + video_file + " Channel: " + channel)
+                return "ERROR"
+            if "resume_frame" in raw_events:
+                checkpoint.discovered = True
+                return terminated_events(raw_events, start_date_str, checkpoint, deadline)
+            return process_events(raw_events, start_date_str, duration)
+        elif original_dhashes_length == 0:
             logger.info(f"No Bumpers available for Channel: {channel} running bumper discovery")
-            sbd_result = new_bumper_detection(video_file, channel)
+            sbd_result = new_bumper_detection(video_file, channel, text_region, deadline, checkpoint)
             if sbd_result == "TERMINATED":
-                return sbd_result
-            dhashes = [imagehash.hex_to_hash(dhash) for dhash in get_bumpers_dhashes(channel)] or []
+                return terminated_discovery(checkpoint, deadline)
+            dhashes = get_indexed_bumpers_dhashes(channel)
             if len(dhashes) == 0:
                 logger.error("No Bumpers available for detection for: " + video_file + " Channel: " + channel)
                 return "ERROR"
-            has_run_sbd = True
-        raw_events = bumper_dhash_detector(video_file, dhashes, start_date_str)
+            has_run_sbd = checkpoint.discovered = True
+        raw_events = detect_raw_events(
+            video_file,
+            dhashes,
+            start_date_str,
+            scan_mode,
+            workers,
+            ocr_cache,
+            get_hash_track(video_file, start_date_str, scan_mode),
+            text_region,
+            deadline,
+            checkpoint,
+            start_frame,
+            resume_events,
+        )
         if type(raw_events) is str:
             return raw_events
+        if "resume_frame" in raw_events:
+            return terminated_events(raw_events, start_date_str, checkpoint, deadline)
         events = process_events(raw_events, start_date_str, duration)
 
         # Si process_events devuelve una lista vacia se corre el shot boundary
@@ -179,26 +1090,60 @@ def placa_detector(
         min_hour = settings.TV_SCHEDULES_SBD[0]
         max_hour = settings.TV_SCHEDULES_SBD[1]
 
+        if len(events["items"]) == 0 and min_hour < video_hour < max_hour and not has_run_sbd and FUSED_DISCOVERY:
+            fused_events, saved = run_fused_discovery(
+                video_file,
+                channel,
+                start_date_str,
+                ocr_cache,
+                get_hash_track(video_file, start_date_str, "dense"),
+                text_region,
+                deadline,
+            )
+            if ocr_cache is not None:
+                ocr_cache.save()
+            if fused_events == "TERMINATED":
+                return terminated_discovery(checkpoint, deadline)
+            if type(fused_events) is str:
+                return fused_events
+            if saved and "resume_frame" in fused_events:
+                checkpoint.discovered = True
+                return terminated_events(fused_events, start_date_str, checkpoint, deadline)
+            return process_events(fused_events, start_date_str, duration) if saved else events
         if len(events["items"]) == 0 and min_hour < video_hour < max_hour and not has_run_sbd:
-            sbd_result = new_bumper_detection(video_file, channel)
+            sbd_result = new_bumper_detection(video_file, channel, text_region, deadline, checkpoint)
             if sbd_result == "TERMINATED":
-                return sbd_result
-            dhashes = [imagehash.hex_to_hash(dhash) for dhash in get_bumpers_dhashes(channel)] or []
+                return terminated_discovery(checkpoint, deadline)
+            checkpoint.discovered = True
+            dhashes = get_indexed_bumpers_dhashes(channel)
 
             if len(dhashes) == original_dhashes_length:
                 return events
 
-            raw_events = bumper_dhash_detector(video_file, dhashes, start_date_str)
+            raw_events = detect_raw_events(
+                video_file,
+                dhashes,
+                start_date_str,
+                scan_mode,
+                workers,
+                ocr_cache,
+                get_hash_track(video_file, start_date_str, scan_mode),
+                text_region,
+                deadline,
+                checkpoint,
+            )
             if type(raw_events) is str:
                 return raw_events
+            if "resume_frame" in raw_events:
+                return terminated_events(raw_events, start_date_str, checkpoint, deadline)
             events = process_events(raw_events, start_date_str, duration)
         return events
 
     except Exception as e:
         logger.error("Processing video file: " + video_file + " Error: " + str(e))
         return "ERROR"
-    
-    
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="TV Ad Detector")
@@ -211,10 +1156,36 @@ if __name__ == "__main__":
         help="Start date of the video in 'YYYY-MM-DD HH:MM:SS' format (default: today at 00:00:00)",
     )
     parser.add_argument("--duration", type=int, help="Duration of the video in seconds")
+    parser.add_argument(
+        "--scan_mode",
+        type=str,
+        default=SCAN_MODE,
+        choices=["dense", "coarse", "threaded"],
+        help="dense hashes one in every DHASH_FREQUENCY frames, coarse hashes keyframes and scans densely only "
+        "around the ones near a bumper, threaded is dense with decoding, hashing and OCR overlapped in threads",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DETECTION_WORKERS,
+        help="Number of processes scanning time ranges of the video in parallel",
+    )
+    parser.add_argument("--metrics_out", type=str, help="Write stage timers and counters of this run as JSON")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DETECTION_TIMEOUT,
+        help="Seconds before the job stops with partial results and a checkpoint to resume from, 0 disables. "
+        "Defaults to DETECTION_TIMEOUT with CHECKPOINT_ENABLED=true and to 0 without checkpoints",
+    )
     args = parser.parse_args()
+    if args.metrics_out:
+        # tambien para los procesos de los tramos, que leen la configuracion al arrancar
+        os.environ["METRICS_ENABLED"] = "true"
+        metrics.METRICS_ENABLED = True
 
     # Example usage: get bumpers dhashes and video duration
-    dhashes = get_bumpers_dhashes(args.channel_name)
+    dhashes = get_indexed_bumpers_dhashes(args.channel_name)
     cap = cv2.VideoCapture(args.video_file)
     fps = cap.get(cv2.CAP_PROP_FPS)
     frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
@@ -230,11 +1201,18 @@ if __name__ == "__main__":
     if not os.path.exists(settings.BUMPER_DETECTION_DIR):
         os.makedirs(settings.BUMPER_DETECTION_DIR)
         
-    result = placa_detector(
-        args.video_file,
-        duration,
-        dhashes,
-        args.start_date,
-        args.channel_name,
-    )
-    print(result)
\ No newline at end of file
+    with metrics.collect() as collected:
+        result = placa_detector(
+            args.video_file,
+            duration,
+            dhashes,
+            args.start_date,
+            args.channel_name,
+            args.scan_mode,
+            args.workers,
+            Deadline(args.timeout),
+        )
+    print(result)
+    if args.metrics_out:
+        with open(args.metrics_out, "w") as f:
+            json.dump(collected.snapshot, f, indent=2)
\ No newline at end of file
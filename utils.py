@@ -5,9 +5,11 @@ from typing import List as TypingList, Tuple, Optional
 
 import cv2
 import imagehash
-from PIL import Image
 
-from config import settings, spellcheck
+import metrics
+from config import settings
+from dhash_engine import dhash_bits
+from keyword_classifier import KeywordClassifier
 
 
 def datetime_to_string(dt: datetime) -> str:
@@ -51,8 +53,7 @@ def add_seconds_to_datetime(seconds: int, date_time: datetime) -> str:
 
 
 def get_frame_dhash(frame) -> imagehash.ImageHash:
-    img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    return imagehash.dhash(Image.fromarray(img))
+    return imagehash.ImageHash(dhash_bits(frame))
 
 
 def get_bumpers_dhashes(channel: str, folder: str = settings.BUMPER_DETECTION_DIR) -> TypingList[imagehash.ImageHash]:
@@ -75,16 +76,17 @@ classification_words: TypingList[set] = [
 
 OCR_WORD_LIMIT: int = int(settings.OCR_WORD_LIMIT)
 
+keyword_classifier = KeywordClassifier(classification_words)
 
+
+@metrics.timed("classify_board")
 def classify_board(ocr: TypingList[str]) -> Optional[str]:
     to_return = [False, False, False, False, False, False, False]
     if count_words_in_ocr(ocr) <= OCR_WORD_LIMIT:
         for line in ocr:
             for word in line.split():
-                candidates = spellcheck.candidates(word.lower())
-                if candidates is not None:
-                    flag_vec = [not candidates.isdisjoint(words) for words in classification_words]
-                    to_return = [to_return[i] or flag for i, flag in enumerate(flag_vec)]
+                flag_vec = keyword_classifier.flags(word.lower())
+                to_return = [to_return[i] or flag for i, flag in enumerate(flag_vec)]
     if to_return == [False, True, True]:
         return settings.END_EVENT_NAME
     if to_return == [True, False, True]: